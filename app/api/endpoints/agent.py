@@ -1,19 +1,30 @@
 import asyncio
 import os  # Added for robust path resolution
+import zlib
+from config import settings
 from services.agent_service import AgentService
+from services import analytics_rollups, message_store
+from services.analytics_cache import analytics_cache
+from services.execution_context import AgentPoolSaturatedError, ExecutionContext, relay_until_disconnected
 from services.rag_service import FAISSRAGService
 from models.run_history import Message as DBMessage, ChatSession
 from utils.helpers import make_serializable
+from utils.message_capture import create_assistant_message, create_user_message, save_messages_to_db
+from utils.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+from utils.sse_encoder import sse_encoder
 from datetime import datetime
 from pydantic import BaseModel
 from langchain_core.messages import AIMessage, HumanMessage
 from fastapi.responses import StreamingResponse
-from fastapi import APIRouter, Header, Request, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, Header, Query, Request, Response, HTTPException, UploadFile, File, Form
 from uuid import uuid4
-from typing import Annotated, Any, List, Optional, Union
+from typing import Annotated, Any, AsyncIterator, List, Literal, Optional, Union
 
 router = APIRouter()
 
+# Page size of /chats when only a cursor is given
+DEFAULT_CHAT_PAGE_SIZE = 50
+
 # Singleton RAG service instance (in-memory for now)
 rag_service = FAISSRAGService()
 
@@ -38,6 +49,10 @@ class RunResponse(BaseModel):
 class StreamRequest(BaseModel):
     prompt: str
     chat_id: Optional[str] = None
+    # "tokens" streams `delta` events as the LLM generates instead of whole replies
+    stream_mode: Literal["updates", "tokens"] = "updates"
+    # Set to false to always run the agent for this chat instead of replaying cached replies
+    use_cache: bool = True
 
 
 class Tool(BaseModel):
@@ -62,7 +77,8 @@ class ChatMessageResponse(BaseModel):
     role: str
     content: str
     timestamp: datetime
-    metadata: dict[str, Any]
+    # Left out of compact responses
+    metadata: Optional[dict[str, Any]] = None
 
 
 @router.post("/run", response_model=RunResponse)
@@ -71,39 +87,29 @@ async def run_agent(request: Request, query: RunRequest, user_id: Annotated[str
         raise HTTPException(status_code=400, detail="Missing user_id header")
 
     agent_service: AgentService = request.app.state.agent_service
-    agent_service.set_user_id(user_id)
+    # /run keeps one thread per user, stored as one chat with the same id
+    context = ExecutionContext(
+        user_id=user_id, chat_id=user_id, config={"configurable": {"thread_id": user_id}})
+
+    try:
+        await agent_service.run_pool.acquire()
+    except AgentPoolSaturatedError as e:
+        raise HTTPException(status_code=503, detail=str(e))
 
     try:
-        result = await agent_service.run(query.message)
+        result = await agent_service.run(query.message, context=context)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        agent_service.run_pool.release()
 
     messages: List[AIMessage] = result.get("messages", [])
 
-    # Convert messages to list of dicts for storage
-    message_dicts = [
-        {"role": msg.type, "content": msg.content}
-        for msg in messages
-    ]
-
-    # Try to find existing session
-    existing_session = await ChatSession.find_one({"session_id": user_id})
-
-    if existing_session:
-        # Append new messages to existing session
-        existing_session.messages.extend(message_dicts)
-        existing_session.timestamp = datetime.utcnow()
-        await existing_session.save()
-    else:
-        # Create new session document
-        run_doc = ChatSession(
-            messages=message_dicts,
-            agent_name=agent_service.agent_name,
-            data={"query": query.message},
-            timestamp=datetime.utcnow(),
-            session_id=user_id
-        )
-        await run_doc.insert()
+    # Append the exchange to the user's /run chat, created by the first run
+    context.captured_messages = [create_user_message(query.message)]
+    if messages:
+        context.captured_messages.append(create_assistant_message({"content": messages[-1].content}))
+    await save_messages_to_db(context, query.message, agent_service.agent_name, create_missing=True)
 
     return {"response": messages[-1].content if messages else ""}
 
@@ -119,16 +125,28 @@ async def stream_agent(
         raise HTTPException(status_code=400, detail="Missing user_id header")
 
     agent_service: AgentService = request.app.state.agent_service
-    agent_service.set_user_id(user_id)
+    context = ExecutionContext(
+        user_id=user_id, chat_id=query.chat_id, use_cache=query.use_cache)
+
+    # Admission happens before the response starts so a saturated worker can answer 503
+    try:
+        await agent_service.run_pool.acquire()
+    except AgentPoolSaturatedError as e:
+        raise HTTPException(status_code=503, detail=str(e))
 
     try:
         print("Setting up streaming response")
         # Create human message for the agent
         human_message = HumanMessage(content=query.prompt)
 
-        # Use the updated agent_service.stream method with chat_id for message capture
+        # The run's slot is released by the pool once the stream finishes; a client
+        # disconnect cancels the run (graph and tool calls) instead of letting it finish
         response = StreamingResponse(
-            agent_service.stream(human_message, chat_id=query.chat_id),
+            relay_until_disconnected(
+                agent_service.run_pool.hold(
+                    agent_service.stream(human_message, context, stream_mode=query.stream_mode)),
+                request.is_disconnected,
+            ),
             media_type="text/event-stream"
         )
         response.headers["Cache-Control"] = "no-cache"
@@ -139,58 +157,166 @@ async def stream_agent(
         return response
 
     except Exception as e:
+        agent_service.run_pool.release()
         error_msg = f"Error in stream setup: {str(e)}"
         print(error_msg)
         raise HTTPException(status_code=500, detail=error_msg)
 
 
 @router.get("/chats")
-async def list_chats(user_id: Annotated[str | None, Header()] = None) -> List[ChatSessionResponse]:
-    """Get all chat sessions for a user"""
+async def list_chats(
+    response: Response,
+    user_id: Annotated[str | None, Header()] = None,
+    limit: Optional[int] = Query(None, ge=1, le=200),
+    cursor: Optional[str] = None,
+) -> List[ChatSessionResponse]:
+    """
+    Get the user's chat sessions, most recently updated first.
+
+    Only the list fields are read (messages stay in their buckets). Without `limit` and
+    `cursor` all chats are returned, as the sidebar expects. With either, one page of
+    `limit` chats (default 50) is returned; when there are more, the cursor of the next
+    page is in the X-Next-Cursor header, to pass back as `cursor`.
+    """
     if not user_id:
         raise HTTPException(status_code=400, detail="Missing user_id header")
 
-    # Find all active chat sessions for the user, sorted by updated_at
-    sessions = await ChatSession.find(
-        {"user_id": user_id, "is_active": True},
-        sort=[("updated_at", -1)]
-    ).to_list()
+    query: dict[str, Any] = {"user_id": user_id, "is_active": True}
+    if cursor:
+        try:
+            after = decode_cursor(cursor)
+            query["$or"] = [
+                {"updated_at": {"$lt": after["updated_at"]}},
+                {"updated_at": after["updated_at"], "_id": {"$lt": after["_id"]}},
+            ]
+        except (ValueError, KeyError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    # Keyset page over the (user_id, is_active, updated_at, _id) index; one extra row tells if there is more
+    paged = limit is not None or cursor is not None
+    limit = limit or DEFAULT_CHAT_PAGE_SIZE
+    sessions = await ChatSession.get_motor_collection().find(
+        query,
+        {"chat_id": 1, "title": 1, "created_at": 1, "updated_at": 1, "last_message.content": 1},
+        sort=[("updated_at", -1), ("_id", -1)],
+        limit=limit + 1 if paged else 0,
+    ).to_list(length=None)
+
+    if paged and len(sessions) > limit:
+        sessions = sessions[:limit]
+        last = sessions[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(
+            {"updated_at": last["updated_at"], "_id": last["_id"]})
 
     return [
         ChatSessionResponse(
-            chat_id=session.chat_id,
-            title=session.title,
-            last_message=session.messages[-1].content if session.messages else None,
-            created_at=session.created_at,
-            updated_at=session.updated_at
+            chat_id=session["chat_id"],
+            title=session["title"],
+            last_message=(session.get("last_message") or {}).get("content"),
+            created_at=session["created_at"],
+            updated_at=session["updated_at"]
         ) for session in sessions
     ]
 
 
-@router.get("/chats/{chat_id}")
-async def get_chat(chat_id: str, user_id: Annotated[str | None, Header()] = None) -> List[ChatMessageResponse]:
-    """Get all messages in a chat session"""
+async def _resolve_message_cursor(chat_id: str, cursor: str, after: bool) -> Optional[int]:
+    """
+    Turn a before/after cursor (a message_id or an ISO timestamp) into a range bound:
+    the index of the first message after the cursor, or of the cursor message itself
+    for `before`. None means past the last message.
+    """
+    try:
+        timestamp = datetime.fromisoformat(cursor)
+    except ValueError:
+        index = await message_store.find_message_index(chat_id, cursor)
+        if index is None:
+            raise HTTPException(status_code=400, detail=f"Unknown message_id cursor: {cursor}")
+        return index + 1 if after else index
+    return await message_store.first_index_since(chat_id, timestamp, inclusive=not after)
+
+
+@router.get("/chats/{chat_id}", response_model_exclude_unset=True)
+async def get_chat(
+    chat_id: str,
+    response: Response,
+    user_id: Annotated[str | None, Header()] = None,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    compact: bool = False,
+) -> List[ChatMessageResponse]:
+    """
+    Get messages of a chat session, oldest first.
+
+    Without parameters the whole transcript is returned. `before`/`after` (a message_id
+    or an ISO timestamp) and `limit` select a page: the `limit` messages right before
+    `before` (the latest ones when neither is given), or right after `after`. Only the
+    buckets covering the page are read. When more messages lie beyond the page in the
+    paging direction, X-Next-Cursor holds the message_id to continue from. `compact`
+    leaves out message metadata.
+    """
     if not user_id:
         raise HTTPException(status_code=400, detail="Missing user_id header")
 
     # Find the chat session
-    session = await ChatSession.find_one({"chat_id": chat_id, "user_id": user_id})
+    session = await ChatSession.get_motor_collection().find_one(
+        {"chat_id": chat_id, "user_id": user_id}, {"_id": 0, "message_count": 1})
     if not session:
         raise HTTPException(status_code=404, detail="Chat session not found")
 
+    total = session.get("message_count") or 0
+    start, end = 0, total
+    if after:
+        start = await _resolve_message_cursor(chat_id, after, after=True)
+        start = total if start is None else start
+    if before:
+        bound = await _resolve_message_cursor(chat_id, before, after=False)
+        end = min(end, total if bound is None else bound)
+    if limit:
+        if after:
+            end = min(end, start + limit)
+        else:
+            start = max(start, end - limit)
+
+    fields = ["message_id", "role", "content", "timestamp"] + ([] if compact else ["metadata"])
+    messages = await message_store.read_messages(chat_id, start, end, fields=fields)
+    if limit and messages:
+        more = end < total if after else start > 0
+        if more:
+            response.headers[NEXT_CURSOR_HEADER] = messages[-1 if after else 0]["message_id"]
+
     return [
         ChatMessageResponse(
-            message_id=msg.message_id,
-            role=msg.role,
-            content=msg.content,
-            timestamp=msg.timestamp,
-            metadata=msg.metadata
-        ) for msg in session.messages
+            message_id=msg["message_id"],
+            role=msg["role"],
+            content=msg["content"],
+            timestamp=msg["timestamp"],
+        ) if compact else ChatMessageResponse(
+            message_id=msg["message_id"],
+            role=msg["role"],
+            content=msg["content"],
+            timestamp=msg["timestamp"],
+            metadata=msg.get("metadata", {})
+        ) for msg in messages
     ]
 
 
+@router.get("/chats/{chat_id}/state")
+async def get_chat_state(request: Request, chat_id: str, user_id: Annotated[str | None, Header()] = None):
+    """Get the full agent state of a chat (the stream's complete event only carries deltas)"""
+    if not user_id:
+        raise HTTPException(status_code=400, detail="Missing user_id header")
+
+    if not await ChatSession.find_one({"chat_id": chat_id, "user_id": user_id}):
+        raise HTTPException(status_code=404, detail="Chat session not found")
+
+    agent_service: AgentService = request.app.state.agent_service
+    context = ExecutionContext(user_id=user_id, chat_id=chat_id)
+    return await agent_service.get_state_snapshot(context)
+
+
 @router.delete("/chats/{chat_id}")
-async def delete_chat(chat_id: str, user_id: Annotated[str | None, Header()] = None):
+async def delete_chat(request: Request, chat_id: str, user_id: Annotated[str | None, Header()] = None):
     """Delete a chat session"""
     if not user_id:
         raise HTTPException(status_code=400, detail="Missing user_id header")
@@ -200,14 +326,88 @@ async def delete_chat(chat_id: str, user_id: Annotated[str | None, Header()] = N
     if not session:
         raise HTTPException(status_code=404, detail="Chat session not found")
 
+    messages = await message_store.read_messages(chat_id, fields=["timestamp", "role"])
     await session.delete()
+    await message_store.delete_messages(chat_id)
+
+    # Stop counting the chat and its messages in the analytics
+    try:
+        await analytics_rollups.record_chat_deleted(user_id, session.created_at, [
+            {**message, "timestamp": message.get("timestamp") or session.updated_at} for message in messages])
+    except Exception as e:
+        print(f"Error updating analytics rollups: {e}")
+    analytics_cache.invalidate(user_id)
+
+    # Drop the agent checkpoint of this chat as well
+    agent_service: AgentService = request.app.state.agent_service
+    await agent_service.checkpointer.adelete_thread(chat_id)
     return {"status": "success"}
 
 
-@router.get("/history", response_model=List[ChatSession])
-async def get_history():
-    """Get all chat history"""
-    return await ChatSession.find({"is_active": True}).sort([("updated_at", -1)]).to_list()
+async def _export_history(query: dict[str, Any], include_messages: bool, compress: bool) -> AsyncIterator[bytes]:
+    """Yield NDJSON lines (optionally gzipped) for the sessions matching `query`, in _id order."""
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    cursor = ChatSession.get_motor_collection().find(
+        query, {"revision_id": 0}, sort=[("_id", 1)], batch_size=settings.HISTORY_EXPORT_BATCH_SIZE)
+    exported = 0
+    async for session in cursor:
+        # Every line carries the cursor to resume the export right after it
+        session["cursor"] = encode_cursor({"_id": session.pop("_id")})
+        if include_messages:
+            session["messages"] = await message_store.read_messages(session["chat_id"])
+        line = (sse_encoder.dumps(session) + "\n").encode("utf-8")
+        exported += 1
+        if compressor is None:
+            yield line
+            continue
+        data = compressor.compress(line)
+        if exported % settings.HISTORY_EXPORT_BATCH_SIZE == 0:
+            data += compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    if compressor is not None:
+        yield compressor.flush()
+
+
+@router.get("/history")
+async def get_history(
+    user_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    include_messages: bool = True,
+    compress: bool = Query(False, alias="gzip"),
+):
+    """
+    Export active chat sessions as NDJSON, one session per line.
+
+    Sessions are streamed from a batched Mongo cursor in insertion order, so memory use
+    does not grow with the collection. Filters: `user_id`, and `since`/`until` on
+    `updated_at`. Each line has a `cursor`; pass the last one received to resume an
+    interrupted export. `gzip=true` compresses the stream.
+    """
+    query: dict[str, Any] = {"is_active": True}
+    if user_id:
+        query["user_id"] = user_id
+    if since or until:
+        query["updated_at"] = {
+            **({"$gte": since} if since else {}),
+            **({"$lt": until} if until else {}),
+        }
+    if cursor:
+        try:
+            query["_id"] = {"$gt": decode_cursor(cursor)["_id"]}
+        except (ValueError, KeyError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(
+        _export_history(query, include_messages, compress),
+        media_type="application/x-ndjson",
+        headers=headers,
+    )
 
 
 @router.get("/get-available-tools", response_model=GetToolsResponse)
@@ -228,6 +428,13 @@ async def get_tools(
     return {"tools": tools}
 
 
+@router.get("/runtime-stats")
+async def get_runtime_stats(request: Request):
+    """Return runtime counters (run pool usage, caches, queues) for this worker."""
+    agent_service: AgentService = request.app.state.agent_service
+    return agent_service.get_runtime_stats()
+
+
 @router.post("/chats", response_model=ChatSessionResponse)
 async def create_chat(request: CreateChatRequest) -> ChatSessionResponse:
     """Create a new chat session."""
@@ -240,12 +447,11 @@ async def create_chat(request: CreateChatRequest) -> ChatSessionResponse:
         raise HTTPException(status_code=400, detail="User ID is required")
 
     try:
-        # Create new chat session with empty messages
+        # Create new chat session; its messages are stored in buckets as they arrive
         chat_id = str(uuid4())
         chat_session = ChatSession(
             chat_id=chat_id,
             title="New Chat",
-            messages=[],
             agent_name="Converge",  # Default agent name
             user_id=user_id,
             created_at=datetime.utcnow(),
@@ -253,6 +459,11 @@ async def create_chat(request: CreateChatRequest) -> ChatSessionResponse:
         )
         await chat_session.insert()
         print(f"Created new chat session with ID: {chat_id}")
+        try:
+            await analytics_rollups.record_chat_created(user_id, chat_session.created_at)
+        except Exception as e:
+            print(f"Error updating analytics rollups: {e}")
+        analytics_cache.invalidate(user_id)
 
         # Construct a valid response
         response = ChatSessionResponse(
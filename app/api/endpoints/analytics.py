@@ -1,11 +1,15 @@
 import asyncio
-from fastapi import APIRouter, Header, HTTPException
-from typing import Annotated, List, Dict, Any, Optional
+import json
+from fastapi import APIRouter, Header, HTTPException, Request, Response
+from fastapi.encoders import jsonable_encoder
+from typing import Annotated, Awaitable, Callable, Hashable, List, Dict, Any, Optional
 from pydantic import BaseModel
 from datetime import datetime, timedelta
-from models.run_history import ChatSession, Message
+from models.analytics import AnalyticsRollup
+from models.run_history import ChatSession
+from services.analytics_cache import analytics_cache, etag_matches
+from services.analytics_rollups import day_of
 from pymongo import DESCENDING
-import random
 
 router = APIRouter()
 
@@ -24,57 +28,80 @@ class AnalyticsSummary(BaseModel):
     chat_trend: List[Dict[str, Any]]
     message_types: Dict[str, int]
 
+async def _cached_response(
+    request: Request,
+    user_id: str,
+    endpoint: str,
+    params: Hashable,
+    compute: Callable[[], Awaitable[Any]],
+) -> Response:
+    """
+    Serve an analytics response from `analytics_cache`, computing it on a miss, and
+    answer 304 when the client's If-None-Match already has this version.
+    """
+    entry = analytics_cache.get(user_id, endpoint, params)
+    if entry is None:
+        generation = analytics_cache.generation(user_id)
+        body = json.dumps(jsonable_encoder(await compute())).encode("utf-8")
+        entry = analytics_cache.put(user_id, endpoint, params, body, generation)
+
+    headers = {"ETag": entry.etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), entry.etag):
+        analytics_cache.record_not_modified()
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
 @router.get("/summary", response_model=AnalyticsSummary)
 async def get_analytics_summary(
+    request: Request,
     time_range: TimeRange = TimeRange(),
     user_id: Annotated[str | None, Header()] = None
 ):
-    """Get analytics summary for the dashboard"""
+    """Get analytics summary for the dashboard (cached briefly; supports If-None-Match)"""
     if not user_id:
         raise HTTPException(status_code=400, detail="Missing user_id header")
-    
+
+    return await _cached_response(
+        request, user_id, "summary", time_range.days,
+        lambda: _compute_analytics_summary(user_id, time_range.days))
+
+
+async def _compute_analytics_summary(user_id: str, days: int) -> AnalyticsSummary:
     # Calculate date range
     end_date = datetime.utcnow()
-    start_date = end_date - timedelta(days=time_range.days)
-    
-    # Query all chats for this user within the time range
-    query = {
-        "user_id": user_id,
-        "created_at": {"$gte": start_date, "$lte": end_date}
-    }
-    
-    # Get chat sessions
-    # Make sure to await the find and sort operations
-    chat_cursor = ChatSession.find(query).sort([("created_at", DESCENDING)])
-    all_chats = await chat_cursor.to_list()
-    
-    # Get all messages for these chats
-    total_messages = 0
-    user_messages = 0
-    ai_messages = 0
-    message_dates = {}
+    start_date = end_date - timedelta(days=days)
     
-    for chat in all_chats:
-        # Safely handle message counting
-        if hasattr(chat, 'messages') and chat.messages:
-            total_messages += len(chat.messages)
-            
-            for msg in chat.messages:
-                # Count message types
-                if isinstance(msg, dict):
-                    if msg.get("role") == "human":
-                        user_messages += 1
-                    elif msg.get("role") == "assistant":
-                        ai_messages += 1
-                    
-                    # Group by date for trend chart
-                    msg_date = msg.get("timestamp", chat.created_at)
-                    if not isinstance(msg_date, datetime) and chat.created_at:
-                        msg_date = chat.created_at
-                        
-                    if isinstance(msg_date, datetime):
-                        date_key = msg_date.strftime("%Y-%m-%d")
-                        message_dates[date_key] = message_dates.get(date_key, 0) + 1
+    # Daily rollups of the range: at most one small document per day
+    rollup_cursor = AnalyticsRollup.get_motor_collection().find(
+        {"user_id": user_id, "date": {"$gte": day_of(start_date), "$lte": end_date}},
+        {"_id": 0, "date": 1, "chats_created": 1, "messages": 1, "messages_by_role": 1},
+    )
+
+    # Recent activity (last 5 chat sessions)
+    recent_cursor = ChatSession.get_motor_collection().find(
+        {"user_id": user_id, "created_at": {"$gte": start_date, "$lte": end_date}},
+        {"_id": 0, "chat_id": 1, "title": 1, "updated_at": 1, "message_count": 1, "last_message.role": 1},
+        sort=[("created_at", DESCENDING)],
+        limit=5,
+    )
+
+    rollups, recent_chats = await asyncio.gather(rollup_cursor.to_list(length=None), recent_cursor.to_list(length=5))
+    total_chats = sum(r.get("chats_created", 0) for r in rollups)
+    total_messages = sum(r.get("messages", 0) for r in rollups)
+    user_messages = sum(r.get("messages_by_role", {}).get("user", 0) for r in rollups)
+    ai_messages = sum(r.get("messages_by_role", {}).get("assistant", 0) for r in rollups)
+    message_dates = {r["date"].strftime("%Y-%m-%d"): r.get("messages", 0) for r in rollups}
+    recent_activity = [
+        {
+            "id": chat["chat_id"],
+            "time": chat.get("updated_at"),
+            "title": chat.get("title") or "Untitled Chat",
+            "message_count": chat.get("message_count", 0),
+            "last_message_type": (chat.get("last_message") or {}).get("role"),
+            "status": "completed" if chat.get("message_count", 0) > 0 else "started"
+        } for chat in recent_chats
+    ]
     
     # Prepare chat trend data (last 7 days)
     chat_trend = []
@@ -86,43 +113,15 @@ async def get_analytics_summary(
         })
     chat_trend.reverse()
     
-    # Recent activity (last 5 chat sessions)
-    recent_activity = []
-    for chat in all_chats[:5]:
-        try:
-            # Get the last message from each chat
-            last_message = None
-            message_count = 0
-            
-            if hasattr(chat, 'messages') and chat.messages and len(chat.messages) > 0:
-                message_count = len(chat.messages)
-                last_message = chat.messages[-1] if message_count > 0 else None
-            
-            # Handle cases where chat_id or other fields might be missing
-            chat_id = getattr(chat, 'chat_id', str(random.randint(1000, 9999)))
-            title = getattr(chat, 'title', 'Untitled Chat')
-            updated_at = getattr(chat, 'updated_at', datetime.utcnow())
-            
-            recent_activity.append({
-                "id": chat_id,
-                "time": updated_at,
-                "title": title,
-                "message_count": message_count,
-                "last_message_type": last_message.get("role") if isinstance(last_message, dict) else None,
-                "status": "completed" if message_count > 0 else "started"
-            })
-        except Exception as e:
-            print(f"Error processing chat for recent activity: {e}")
-    
     # Calculate stats
-    avg_messages = total_messages / len(all_chats) if all_chats else 0
+    avg_messages = total_messages / total_chats if total_chats else 0
     
     # For demo purposes, we'll simulate these metrics
     # In a real app, you'd calculate these from actual user data
     completion_rate = (ai_messages / user_messages) * 100 if user_messages > 0 else 0
     
     return AnalyticsSummary(
-        total_chats=len(all_chats),
+        total_chats=total_chats,
         total_messages=total_messages,
         avg_messages_per_chat=round(avg_messages, 1),
         active_users=1,  # This would be calculated across all users in a real app
@@ -137,28 +136,32 @@ async def get_analytics_summary(
 
 @router.get("/chat-distribution")
 async def get_chat_distribution(
+    request: Request,
     user_id: Annotated[str | None, Header()] = None
 ):
-    """Get chat distribution data for charts"""
+    """Get chat distribution data for charts (cached briefly; supports If-None-Match)"""
     if not user_id:
         raise HTTPException(status_code=400, detail="Missing user_id header")
-    
-    # Get all chat sessions for this user
-    # Make sure to await the find operation
-    chat_cursor = ChatSession.find({"user_id": user_id})
-    chats = await chat_cursor.to_list()
+
+    return await _cached_response(
+        request, user_id, "chat-distribution", None, lambda: _compute_chat_distribution(user_id))
+
+
+async def _compute_chat_distribution(user_id: str) -> Dict[str, Any]:
+    # Chats created per hour come from the rollups; every rollup day adds its chats to its weekday
+    rollups = await AnalyticsRollup.get_motor_collection().find(
+        {"user_id": user_id},
+        {"_id": 0, "weekday": 1, "chats_created": 1, "chat_hours": 1},
+    ).to_list(length=None)
     
     # Distribution by hour of day
     hour_distribution = {str(i): 0 for i in range(24)}
     day_distribution = {str(i): 0 for i in range(7)}  # 0=Monday, 6=Sunday
     
-    for chat in chats:
-        if chat.created_at:
-            hour = chat.created_at.hour
-            hour_distribution[str(hour)] += 1
-            
-            day = chat.created_at.weekday()
-            day_distribution[str(day)] += 1
+    for rollup in rollups:
+        for hour, count in (rollup.get("chat_hours") or {}).items():
+            hour_distribution[hour] += count
+        day_distribution[str(rollup["weekday"])] += rollup.get("chats_created", 0)
     
     return {
         "hour_distribution": [
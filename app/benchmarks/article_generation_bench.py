@@ -0,0 +1,110 @@
+"""
+Benchmark: concurrent `generate_article` calls against a local stand-in model.
+
+The stand-in replaces the article model through `set_article_llm`. It streams a
+`ResponseFormat` as growing partial dicts, like the real structured-output model, over
+`--latency` seconds. Publishing goes through the publish queue, with the file write
+replaced by a blocking sleep of `--publish-ms`. The benchmark reports the wall time of
+`--calls` concurrent generations, the spread of per-call latencies, and the longest
+event-loop stall measured by a 10ms heartbeat. A blocking model client or publish
+shows up as a stall.
+
+Run from the app directory:
+    python -m benchmarks.article_generation_bench [--calls N] [--latency SECONDS] [--publish-ms MS]
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from langchain_core.runnables import RunnableGenerator
+from langchain_core.utils.json import parse_partial_json
+
+import services.publish_queue as publish_queue_module
+from services.publish_queue import publish_queue
+from services.tools.tools import generate_article, set_article_llm
+
+STEPS = 40
+
+
+def stand_in_response(slug: str) -> str:
+    return json.dumps({"article": {
+        "title": f"Benchmark article {slug}",
+        "summary": "A stand-in article used to measure concurrent generation.",
+        "content": "\n".join(f"## Section {i}\n" + "Body text of the section. " * 20 for i in range(8)),
+        "slug": slug,
+        "description": "Stand-in article",
+        "keywords": ["benchmark", "articles"],
+        "tags": ["benchmark", "stand-in"],
+        "categories": ["testing", "performance"],
+    }})
+
+
+def stand_in_model(latency: float) -> RunnableGenerator:
+    """Streams the JSON of a response in STEPS chunks over `latency` seconds, as partial dicts."""
+    async def stream(prompts):
+        prompt = None
+        async for prompt in prompts:
+            pass
+        raw = stand_in_response(f"bench-{abs(hash(str(prompt))) % 10 ** 8}")
+        step = len(raw) // STEPS + 1
+        for end in range(step, len(raw) + step, step):
+            await asyncio.sleep(latency / STEPS)
+            partial = parse_partial_json(raw[:end])
+            if partial:
+                yield partial
+    return RunnableGenerator(stream)
+
+
+async def run(calls: int, latency: float, publish_ms: float) -> None:
+    def blocking_publish(content_dir, article):
+        time.sleep(publish_ms / 1000)
+        return f"https://blog.example/posts/{article['slug']}"
+
+    publish_queue_module.publish_article = blocking_publish
+    publish_queue.batch_window = 0.05
+    set_article_llm(stand_in_model(latency))
+
+    max_stall = 0.0
+
+    async def heartbeat():
+        nonlocal max_stall
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(0.01)
+            max_stall = max(max_stall, time.perf_counter() - started - 0.01)
+
+    async def one(i: int) -> float:
+        started = time.perf_counter()
+        await generate_article.ainvoke({
+            "name": "generate_article",
+            "args": {"context": f"benchmark context {i}", "allow_duplicate": True},
+            "id": f"call-{i}",
+            "type": "tool_call",
+        })
+        return time.perf_counter() - started
+
+    monitor = asyncio.create_task(heartbeat())
+    started = time.perf_counter()
+    latencies = sorted(await asyncio.gather(*(one(i) for i in range(calls))))
+    wall = time.perf_counter() - started
+    monitor.cancel()
+    await publish_queue.aclose()
+
+    print(f"{calls} concurrent generations, stand-in latency {latency:.2f}s, publish {publish_ms:.0f}ms")
+    print(f"  wall time        {wall:8.2f} s   (sequential would be >= {calls * latency:.1f} s)")
+    print(f"  per call p50     {statistics.median(latencies):8.2f} s")
+    print(f"  per call max     {latencies[-1]:8.2f} s")
+    print(f"  max loop stall   {max_stall * 1000:8.1f} ms")
+    print(f"  publish batches  {publish_queue.stats()['batches']:8d}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=1.0)
+    parser.add_argument("--publish-ms", type=float, default=5)
+    args = parser.parse_args()
+    asyncio.run(run(args.calls, args.latency, args.publish_ms))
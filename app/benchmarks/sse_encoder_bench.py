@@ -0,0 +1,93 @@
+"""
+Micro-benchmark: SSEEncoder vs make_serializable + json.dumps.
+
+Encodes a set of recorded `stream_mode="updates"` chunks (agent reasoning with tool
+calls, a large search tool result, an article tool result and a final answer) with
+both the previous helper pipeline and the new encoder.
+
+Run from the app directory:
+    python -m benchmarks.sse_encoder_bench [iterations]
+"""
+
+import json
+import sys
+import timeit
+
+from langchain_core.messages import AIMessage, ToolMessage
+
+from utils.helpers import make_serializable
+from utils.sse_encoder import SSEEncoder
+
+
+def recorded_chunks():
+    search_results = {
+        "query": "latest AI coding assistants",
+        "results": [
+            {
+                "title": f"Result {i}",
+                "url": f"https://example.com/articles/{i}",
+                "content": "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 40,
+                "score": 0.9 - i / 100,
+                "raw_content": None,
+            }
+            for i in range(8)
+        ],
+        "response_time": 1.42,
+    }
+    tool_call = {
+        "id": "call_1",
+        "type": "function",
+        "function": {"name": "tavily_search", "arguments": json.dumps({"query": "latest AI coding assistants"})},
+    }
+    return [
+        {"agent": {"messages": [AIMessage(
+            content="",
+            additional_kwargs={"tool_calls": [tool_call]},
+            tool_calls=[{"name": "tavily_search", "args": {"query": "latest AI coding assistants"}, "id": "call_1"}],
+            response_metadata={"token_usage": {"completion_tokens": 21, "prompt_tokens": 812, "total_tokens": 833},
+                               "model_name": "gpt-4o-mini", "finish_reason": "tool_calls"},
+            id="run-1",
+        )]}},
+        {"tools": {"messages": [ToolMessage(
+            content=json.dumps(search_results),
+            name="tavily_search",
+            tool_call_id="call_1",
+            artifact=search_results,
+            id="tool-1",
+        )]}},
+        {"tools": {
+            "messages": [ToolMessage(content="Your article has been published at https://blog.sleebit.com/posts/ai-coding",
+                                     tool_call_id="call_2", id="tool-2")],
+            "articles": [{"title": "AI coding", "slug": "ai-coding", "content": "## Heading\n" + "Body text. " * 800,
+                          "keywords": ["ai", "coding"], "tags": ["ai"], "categories": ["tech"]}],
+        }},
+        {"agent": {"messages": [AIMessage(
+            content="Here is what I found about the latest AI coding assistants. " * 30,
+            response_metadata={"token_usage": {"completion_tokens": 512, "prompt_tokens": 2048, "total_tokens": 2560},
+                               "model_name": "gpt-4o-mini", "finish_reason": "stop"},
+            id="run-2",
+        )]}},
+    ]
+
+
+def legacy(chunk):
+    return f"data: {json.dumps({'type': 'chunk', 'data': make_serializable(chunk)})}\n\n"
+
+
+def main(iterations: int = 2000):
+    chunks = recorded_chunks()
+    candidates = {
+        "make_serializable + json.dumps": legacy,
+        "SSEEncoder (json)": lambda chunk, enc=SSEEncoder(use_orjson=False): enc.encode("chunk", enc.to_jsonable(chunk)),
+        "SSEEncoder (orjson)": lambda chunk, enc=SSEEncoder(): enc.encode("chunk", enc.to_jsonable(chunk)),
+    }
+    baseline = None
+    for name, encode in candidates.items():
+        seconds = timeit.timeit(lambda: [encode(c) for c in chunks], number=iterations)
+        per_chunk_us = seconds / (iterations * len(chunks)) * 1e6
+        baseline = baseline or per_chunk_us
+        print(f"{name:<34} {per_chunk_us:9.1f} us/chunk  ({baseline / per_chunk_us:4.1f}x)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -1,3 +1,5 @@
+from typing import Dict
+
 from pydantic_settings import BaseSettings
 
 
@@ -14,6 +16,77 @@ class Settings(BaseSettings):
     TWITTER_USER_AGENT: str
     SCRAPER_API_KEY: str
 
+    # Agent run pool (per worker)
+    AGENT_MAX_CONCURRENT_RUNS: int = 32
+    AGENT_MAX_WAITING_RUNS: int = 64
+    AGENT_ADMISSION_TIMEOUT_SECONDS: float = 10.0
+
+    # Agent checkpointer: in-memory hot tier bounds and cold store ("mongo" or "none")
+    CHECKPOINT_MAX_THREADS: int = 512
+    CHECKPOINT_TTL_SECONDS: float = 1800
+    CHECKPOINT_COLD_STORE: str = "mongo"
+
+    # Chat history hydrated into the agent when a thread has no checkpoint
+    HISTORY_WINDOW_MESSAGES: int = 40
+    HISTORY_TOKEN_BUDGET: int = 6000
+
+    # Rolling chat summarization
+    SUMMARY_TRIGGER_TOKENS: int = 4000
+    SUMMARY_KEEP_RECENT_MESSAGES: int = 10
+
+    # Agent response cache (opt-in, replies are reused per user); the semantic tier embeds prompts with OpenAI
+    RESPONSE_CACHE_ENABLED: bool = False
+    RESPONSE_CACHE_MAX_ENTRIES: int = 1024
+    RESPONSE_CACHE_TTL_SECONDS: float = 900
+    RESPONSE_CACHE_SEMANTIC: bool = False
+    RESPONSE_CACHE_SIMILARITY: float = 0.95
+
+    # MCP server process pool (per worker); servers start on first tool use
+    MCP_WORKERS_PER_SERVER: int = 2
+    MCP_MAX_CALLS_PER_WORKER: int = 1
+    MCP_CALL_TIMEOUT_SECONDS: float = 60.0
+    MCP_START_TIMEOUT_SECONDS: float = 30.0
+    MCP_HEALTH_CHECK_INTERVAL_SECONDS: float = 30.0
+    MCP_PING_TIMEOUT_SECONDS: float = 5.0
+
+    # Tool calls of one agent step run concurrently; TOOL_TIMEOUTS overrides per-tool timeouts as JSON
+    AGENT_MAX_PARALLEL_TOOLS: int = 4
+    TOOL_TIMEOUT_SECONDS: float = 60.0
+    TOOL_TIMEOUTS: Dict[str, float] = {}
+
+    # Tool result cache; TOOL_CACHE_TTLS overrides per-tool TTLs as JSON, e.g. {"tavily_search": 300}
+    TOOL_CACHE_ENABLED: bool = True
+    TOOL_CACHE_MAX_ENTRIES: int = 512
+    TOOL_CACHE_MAX_BYTES: int = 32 * 1024 * 1024
+    TOOL_CACHE_DISK_DIR: str = ""
+    TOOL_CACHE_TTLS: Dict[str, float] = {}
+
+    # Chat message persistence: "buffered" (write-behind) or "sync" (awaited per turn)
+    MESSAGE_WRITE_MODE: str = "buffered"
+    MESSAGE_WRITE_MAX_BATCH: int = 200
+    MESSAGE_WRITE_FLUSH_INTERVAL_SECONDS: float = 0.5
+
+    # Sessions fetched per Mongo round trip by the streaming /history export
+    HISTORY_EXPORT_BATCH_SIZE: int = 200
+
+    # Analytics response cache (invalidated when a user's chats change; TTL 0 disables it)
+    ANALYTICS_CACHE_TTL_SECONDS: float = 30.0
+    ANALYTICS_CACHE_MAX_ENTRIES: int = 1024
+
+    # Shared article-generation LLM client (HTTP connections kept open across calls)
+    ARTICLE_LLM_MAX_CONNECTIONS: int = 16
+    ARTICLE_LLM_TIMEOUT_SECONDS: float = 150.0
+
+    # Blog publishing: articles are written in batches with one site build per batch.
+    # BLOG_BUILD_COMMAND (e.g. "docker exec hugo_builder hugo") runs after each batch; empty relies on the Hugo watcher
+    BLOG_PUBLISH_BATCH_WINDOW_SECONDS: float = 2.0
+    BLOG_PUBLISH_MAX_BATCH: int = 20
+    BLOG_BUILD_COMMAND: str = ""
+    BLOG_BUILD_TIMEOUT_SECONDS: float = 120.0
+
+    # Near-duplicate check of generate_article: share of the context's words an existing post must cover (0 disables)
+    ARTICLE_DUPLICATE_THRESHOLD: float = 0.6
+
     class Config:
         env_file = ".env"
 
@@ -1,3 +1,7 @@
+import time
+_IMPORTS_STARTED = time.perf_counter()
+
+import asyncio
 from signal import signal, SIGINT, SIGTERM
 import sys
 from fastapi import FastAPI
@@ -9,27 +13,49 @@ from services.agent_service import AgentService
 from config import settings
 from motor.motor_asyncio import AsyncIOMotorClient
 from beanie import init_beanie
-from models.run_history import Message, ChatSession
+from models.run_history import Message, ChatSession, MessageBucket
+from models.analytics import AnalyticsRollup
+from models.checkpoint import AgentCheckpoint
 from scheduler import init_scheduler
+from services.message_queue import message_write_queue
+from services.publish_queue import publish_queue
+from utils.pagination import NEXT_CURSOR_HEADER
+from utils.startup_timer import startup_timer
 
+startup_timer.origin = _IMPORTS_STARTED
+startup_timer.record("imports", _IMPORTS_STARTED, time.perf_counter())
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    app.state.agent_service = AgentService()
 
+async def init_database():
     client = AsyncIOMotorClient(settings.MONGODB_URL)
-    await init_beanie(database=client[settings.MONGODB_DB], document_models=[Message, ChatSession])
+    await init_beanie(database=client[settings.MONGODB_DB], document_models=[Message, ChatSession, MessageBucket, AgentCheckpoint, AnalyticsRollup])
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    with startup_timer.phase("agent_service"):
+        app.state.agent_service = AgentService()
 
     print("FastAPI app initialized")
 
     try:
-        await app.state.agent_service.initialize()
-        init_scheduler()
+        # Mongo/Beanie and the agent (MCP tool schemas, graph) do not depend on each other
+        await asyncio.gather(
+            startup_timer.run("mongo", init_database()),
+            startup_timer.run("agent", app.state.agent_service.initialize()),
+        )
+        with startup_timer.phase("scheduler"):
+            init_scheduler()
+        startup_timer.mark_ready()
+        startup_timer.print_report()
         yield
     except Exception as e:
         print(f"Error during app startup: {e}")
     finally:
         print("Shutting down services...")
+        # Pending chat messages go first so the summarizer drain sees them
+        await message_write_queue.aclose()
+        await publish_queue.aclose()
         await app.state.agent_service.shutdown()
         print("Shutdown complete")
 
@@ -42,6 +68,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 app.include_router(agent_router, prefix="/api")
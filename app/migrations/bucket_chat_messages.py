@@ -0,0 +1,99 @@
+"""
+Migration: move messages embedded in `ChatSession.messages` into `MessageBucket`s.
+
+For every session that still has an embedded `messages` array, the messages are
+numbered, written to buckets of `BUCKET_SIZE`, and the array is replaced by the
+denormalized `message_count` (and `reserved_count`), `role_counts` and `last_message`.
+Messages that were already appended to buckets for that chat (by a newer app version)
+are kept after the embedded ones. Bucket writes are idempotent, and a rerun skips
+bucket messages that are copies of the embedded ones, so an interrupted run can be
+restarted.
+
+Stop the app while it runs. Run from the app directory:
+    python -m migrations.bucket_chat_messages [--dry-run]
+"""
+
+import asyncio
+import sys
+from collections import Counter
+from typing import Any, Dict, List
+
+from beanie import init_beanie
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from config import settings
+from models.run_history import ChatSession, MessageBucket
+from services import message_store
+from services.message_store import BUCKET_SIZE
+
+
+async def migrate_session(session: Dict[str, Any], dry_run: bool = False) -> int:
+    """Move one session's embedded messages to buckets; returns the number of messages."""
+    chat_id = session["chat_id"]
+    messages: List[Dict[str, Any]] = list(session.get("messages") or [])
+    # Appends made after the upgrade were numbered from 0 and go after the legacy ones.
+    # Buckets written by an interrupted run of this migration also hold copies of the
+    # embedded messages; those are not carried over a second time.
+    embedded_ids = {message.get("message_id") for message in messages}
+    messages += [
+        message for message in await message_store.read_messages(chat_id)
+        if message.get("message_id") not in embedded_ids
+    ]
+    if dry_run:
+        return len(messages)
+
+    buckets = MessageBucket.get_motor_collection()
+    for seq in range(0, (len(messages) + BUCKET_SIZE - 1) // BUCKET_SIZE):
+        chunk = [
+            {**message, "index": seq * BUCKET_SIZE + offset}
+            for offset, message in enumerate(messages[seq * BUCKET_SIZE:(seq + 1) * BUCKET_SIZE])
+        ]
+        await buckets.replace_one(
+            {"chat_id": chat_id, "seq": seq},
+            {
+                "chat_id": chat_id,
+                "user_id": session.get("user_id"),
+                "seq": seq,
+                "messages": chunk,
+                "message_count": len(chunk),
+                "created_at": chunk[0].get("timestamp") or session.get("created_at"),
+                "updated_at": chunk[-1].get("timestamp") or session.get("updated_at"),
+            },
+            upsert=True,
+        )
+    await buckets.delete_many(
+        {"chat_id": chat_id, "seq": {"$gte": (len(messages) + BUCKET_SIZE - 1) // BUCKET_SIZE}})
+
+    await ChatSession.get_motor_collection().update_one(
+        {"_id": session["_id"]},
+        {
+            "$set": {
+                "message_count": len(messages),
+                "reserved_count": len(messages),
+                "role_counts": dict(Counter(m.get("role", "unknown") for m in messages)),
+                "last_message": messages[-1] if messages else None,
+            },
+            "$unset": {"messages": ""},
+        },
+    )
+    return len(messages)
+
+
+async def main(dry_run: bool = False) -> None:
+    client = AsyncIOMotorClient(settings.MONGODB_URL)
+    await init_beanie(database=client[settings.MONGODB_DB], document_models=[ChatSession, MessageBucket])
+
+    sessions = migrated = 0
+    cursor = ChatSession.get_motor_collection().find({"messages": {"$exists": True}})
+    async for session in cursor:
+        migrated += await migrate_session(session, dry_run=dry_run)
+        sessions += 1
+        if sessions % 100 == 0:
+            print(f"{sessions} sessions, {migrated} messages")
+
+    action = "Would migrate" if dry_run else "Migrated"
+    print(f"{action} {migrated} messages of {sessions} chat sessions")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(dry_run="--dry-run" in sys.argv[1:]))
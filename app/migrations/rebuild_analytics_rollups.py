@@ -0,0 +1,35 @@
+"""
+Backfill or rebuild the analytics rollups from chat sessions and message buckets.
+
+The rollups are otherwise maintained incrementally as chats and messages are written;
+run this once after deploying them, or whenever they have drifted (e.g. after a failed
+rollup write). Run it while the app is idle. Run from the app directory:
+    python -m migrations.rebuild_analytics_rollups [--user USER_ID]
+"""
+
+import asyncio
+import sys
+from typing import Optional
+
+from beanie import init_beanie
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from config import settings
+from models.analytics import AnalyticsRollup
+from models.run_history import ChatSession, MessageBucket
+from services import analytics_rollups
+
+
+async def main(user_id: Optional[str] = None) -> None:
+    client = AsyncIOMotorClient(settings.MONGODB_URL)
+    await init_beanie(
+        database=client[settings.MONGODB_DB], document_models=[ChatSession, MessageBucket, AnalyticsRollup])
+
+    written = await analytics_rollups.rebuild(user_id)
+    scope = f"user {user_id}" if user_id else "all users"
+    print(f"Rebuilt {written} daily analytics rollups for {scope}")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    asyncio.run(main(args[args.index("--user") + 1] if "--user" in args else None))
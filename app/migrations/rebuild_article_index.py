@@ -0,0 +1,33 @@
+"""
+Rebuild the near-duplicate article index from the posts on disk.
+
+The index is otherwise updated as articles are published, and rebuilt automatically
+when its file is missing; run this after editing, adding or removing posts by hand.
+Run from the app directory:
+    python -m migrations.rebuild_article_index [--content-dir DIR]
+"""
+
+import os
+import sys
+import time
+
+from services.article_index import get_article_index
+
+# Where publish_article writes posts (see utils.helpers)
+DEFAULT_CONTENT_DIR = "/converge/blog/content"
+
+
+def main(content_dir: str) -> None:
+    started = time.perf_counter()
+    index = get_article_index(content_dir)
+    indexed = index.rebuild()
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    print(f"Indexed {indexed} posts from {content_dir} into {index.path} in {elapsed_ms:.0f}ms")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    content_dir = args[args.index("--content-dir") + 1] if "--content-dir" in args else DEFAULT_CONTENT_DIR
+    if not os.path.isdir(content_dir):
+        sys.exit(f"Content directory not found: {content_dir}")
+    main(content_dir)
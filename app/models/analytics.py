@@ -0,0 +1,25 @@
+from datetime import datetime
+from beanie import Document
+from pydantic import Field
+from pymongo import ASCENDING, IndexModel
+
+
+class AnalyticsRollup(Document):
+    """Per-user daily activity counters, kept current with `$inc` as chats and messages are written."""
+    user_id: str
+    # Midnight (UTC) of the day the counters belong to
+    date: datetime
+    # 0 = Monday, like datetime.weekday()
+    weekday: int
+    chats_created: int = 0
+    messages: int = 0
+    messages_by_role: dict[str, int] = Field(default_factory=dict)
+    # Chats created per hour of day ("0".."23")
+    chat_hours: dict[str, int] = Field(default_factory=dict)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+    class Settings:
+        name = "analytics_rollups"
+        indexes = [
+            IndexModel([("user_id", ASCENDING), ("date", ASCENDING)], unique=True),
+        ]
@@ -0,0 +1,26 @@
+from datetime import datetime
+from typing import Any, Optional
+from beanie import Document
+from pydantic import Field
+from pymongo import ASCENDING, IndexModel
+
+
+class AgentCheckpoint(Document):
+    """Latest LangGraph checkpoint of a thread (cold tier of the agent checkpointer)."""
+    thread_id: str
+    checkpoint_ns: str = ""
+    checkpoint_id: str
+    parent_checkpoint_id: Optional[str] = None
+    checkpoint_type: str
+    checkpoint: bytes
+    metadata_type: str
+    metadata: bytes
+    writes: list[dict[str, Any]] = Field(default_factory=list)
+    parent_sends: list[dict[str, Any]] = Field(default_factory=list)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+    class Settings:
+        name = "agent_checkpoints"
+        indexes = [
+            IndexModel([("thread_id", ASCENDING), ("checkpoint_ns", ASCENDING)], unique=True),
+        ]
@@ -2,6 +2,7 @@ from typing import Any, Optional
 from beanie import Document, Indexed
 from datetime import datetime
 from pydantic import Field
+from pymongo import ASCENDING, DESCENDING, IndexModel
 from uuid import uuid4
 
 class Message(Document):
@@ -10,23 +11,58 @@ class Message(Document):
     metadata: dict[str, Any] = Field(default_factory=dict)
     timestamp: datetime = Field(default_factory=datetime.utcnow)
     message_id: str = Field(default_factory=lambda: str(uuid4()))
+    # Position of the message in its chat, assigned when it is stored in a bucket
+    index: Optional[int] = None
 
     class Settings:
         name = "messages"
 
+class MessageBucket(Document):
+    """Up to `BUCKET_SIZE` consecutive messages of a chat; bucket `seq` holds indexes seq*BUCKET_SIZE onwards."""
+    chat_id: str
+    user_id: str
+    seq: int
+    messages: list[Message] = Field(default_factory=list)
+    message_count: int = 0
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+    class Settings:
+        name = "message_buckets"
+        indexes = [
+            IndexModel([("chat_id", ASCENDING), ("seq", ASCENDING)], unique=True),
+            # Resolving message_id cursors of paginated chat reads
+            IndexModel([("chat_id", ASCENDING), ("messages.message_id", ASCENDING)]),
+        ]
+
 class ChatSession(Document):
     chat_id: Indexed(str) = Field(default_factory=lambda: str(uuid4()))
     title: str
-    messages: list[Message]
     agent_name: str
     user_id: Indexed(str)
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     metadata: dict[str, Any] = Field(default_factory=dict)
     is_active: bool = True
+    # Messages live in `MessageBucket`s; the session only keeps counters and the latest one.
+    # Indexes are reserved before the messages are stored and counted in message_count after
+    message_count: int = 0
+    reserved_count: int = 0
+    role_counts: dict[str, int] = Field(default_factory=dict)
+    last_message: Optional[Message] = None
+    # Rolling summary of messages[:summary_message_count], maintained in the background
+    summary: Optional[str] = None
+    summary_message_count: int = 0
+    summary_updated_at: Optional[datetime] = None
 
     class Settings:
         name = "chat_sessions"
+        indexes = [
+            # Keyset pagination of a user's chat list (`_id` breaks updated_at ties)
+            IndexModel([("user_id", ASCENDING), ("is_active", ASCENDING), ("updated_at", DESCENDING), ("_id", DESCENDING)]),
+            # Date-range queries of the analytics endpoints
+            IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)]),
+        ]
 
     class Config:
         # Index chat_id and user_id for faster lookups
@@ -2,8 +2,9 @@
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 from uuid import uuid4
-from models.run_history import Message, ChatSession
+from models.run_history import Message
 from services.agent_service import AgentService
+from services.message_queue import MessageWriteQueue, message_write_queue
 from datetime import datetime
 
 scheduler = AsyncIOScheduler()
@@ -40,16 +41,14 @@ async def scheduled_task():
             )
         )
 
-    # Create a chat session for this scheduled task
-    chat_session = ChatSession(
-        chat_id=str(uuid4()),
+    # Create a chat session for this scheduled task with its messages
+    create = MessageWriteQueue.new_chat_fields(
         title="Scheduled Task: AI Tech Article",
-        messages=messages,
         agent_name=agent_service.agent_name,
-        user_id="system",  # Use system as the user for scheduled tasks
         metadata={"task_type": "scheduled_article_generation"}
     )
-    await chat_session.insert()
+    # Use system as the user for scheduled tasks
+    await message_write_queue.append(str(uuid4()), "system", messages, create=create)
     print(f"Scheduled task executed and saved at {datetime.utcnow()}")
 
 
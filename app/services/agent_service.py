@@ -1,25 +1,41 @@
+import asyncio
+from collections import Counter
+from contextlib import asynccontextmanager
 from datetime import datetime
+import json
 import os
 import traceback
-from typing import Annotated, Any, AsyncGenerator, Dict, List, Optional
+from typing import Annotated, Any, AsyncGenerator, AsyncIterator, Dict, List, Optional, Set
 from uuid import uuid4
-from langchain_core.messages import AnyMessage, AIMessage, HumanMessage
+from langchain_core.messages import AnyMessage, AIMessage, AIMessageChunk, HumanMessage, ToolMessage
 from langgraph.graph.message import add_messages
 from operator import add
 from langchain_openai import ChatOpenAI
 from langchain_community.tools import BraveSearch
 from langchain_tavily import TavilySearch
-from langgraph.checkpoint.memory import MemorySaver
 from langgraph.prebuilt import create_react_agent
 from langchain_core.output_parsers import PydanticOutputParser
-from langchain_mcp_adapters.client import MultiServerMCPClient
 from langgraph.prebuilt.chat_agent_executor import AgentState
 from pydantic import BaseModel
 from services.tools.tools import generate_article
 from config import settings
 from models.run_history import Message as DBMessage, ChatSession
-from utils.helpers import error_handler, extract_json_from_string, extract_tool_names, make_serializable, publish_article, sse_format
-from utils.message_capture import create_user_message, create_assistant_message, save_messages_to_db, get_chat_messages
+from utils.helpers import blog_content_dir, error_handler, extract_json_from_string, extract_tool_names, sse_format
+from utils.sse_encoder import sse_encoder
+from utils.startup_timer import startup_timer
+from utils.tokens import count_message_tokens, count_tokens
+from utils.message_capture import HistoryWindow, create_user_message, create_assistant_message, save_messages_to_db, get_chat_messages
+from services.checkpointer import MongoCheckpointStore, TieredCheckpointSaver
+from services.execution_context import AgentRunPool, ExecutionContext, RunCancellationStats
+from services.analytics_cache import analytics_cache
+from services.article_stream import ARTICLE_DELTA
+from services.mcp_pool import MCPProcessPool
+from services.message_queue import message_write_queue
+from services.publish_queue import publish_queue
+from services.response_cache import CachedResponse, ResponseCache, SemanticPromptIndex, history_hash
+from services.summarizer import ConversationSummarizer
+from services.tool_cache import ToolResultCache, build_policies
+from services.tool_node import TimedToolNode
 
 # Define some color codes for print statements
 COLORS = {
@@ -54,8 +70,14 @@ class AgentService:
         """
 
         self.agent_name = "Converge AI Assistant"
+        # How much stored history is loaded into a thread that has no checkpoint
+        self.history_window = HistoryWindow(
+            max_messages=settings.HISTORY_WINDOW_MESSAGES,
+            token_budget=settings.HISTORY_TOKEN_BUDGET,
+        )
         self.llm = ChatOpenAI(
-            api_key=settings.OPENAI_API_KEY, model="gpt-4o-mini", temperature=0.7, streaming=True)
+            api_key=settings.OPENAI_API_KEY, model="gpt-4o-mini", temperature=0.7, streaming=True,
+            stream_usage=True)
 
         # Always resolve MCP server paths relative to this file to work in both local and Docker environments
         # Updated for new Docker WORKDIR: /converge
@@ -76,6 +98,8 @@ class AgentService:
                 "command": "node",
                 "args": [os.path.join(MCP_SERVERS_BASE, "sequential/dist/index.js")],
                 "transport": "stdio",
+                # Keeps the thought history in process, so calls must reach the same process
+                "workers": 1,
                 "env": {
                     **os.environ,
                     "NODE_PATH": os.path.join(MCP_SERVERS_BASE, "sequential", "node_modules")
@@ -95,25 +119,81 @@ class AgentService:
 
         self.mcp_config = filtered_config
         self.agent = None
-        self.mcp_client = None
+        self.tool_node = None
+
+        # Servers are spawned on first tool use; tool schemas come from the manifest
+        self.mcp_pool = MCPProcessPool(
+            self.mcp_config,
+            workers_per_server=settings.MCP_WORKERS_PER_SERVER,
+            max_calls_per_worker=settings.MCP_MAX_CALLS_PER_WORKER,
+            call_timeout=settings.MCP_CALL_TIMEOUT_SECONDS,
+            start_timeout=settings.MCP_START_TIMEOUT_SECONDS,
+            health_interval=settings.MCP_HEALTH_CHECK_INTERVAL_SECONDS,
+            ping_timeout=settings.MCP_PING_TIMEOUT_SECONDS,
+            manifest_path=os.path.join(MCP_SERVERS_BASE, ".tool-manifest.json"),
+        )
+
+        # Bounds concurrent runs on this worker; per-run state lives on ExecutionContext
+        self.run_pool = AgentRunPool(
+            max_concurrent=settings.AGENT_MAX_CONCURRENT_RUNS,
+            max_waiting=settings.AGENT_MAX_WAITING_RUNS,
+            admission_timeout=settings.AGENT_ADMISSION_TIMEOUT_SECONDS,
+        )
+        self.cancellations = RunCancellationStats()
+
+        # Bounded in memory, persisted to Mongo so warm chats survive evictions and restarts
+        self.checkpointer = TieredCheckpointSaver(
+            max_threads=settings.CHECKPOINT_MAX_THREADS,
+            ttl_seconds=settings.CHECKPOINT_TTL_SECONDS,
+            cold_store=MongoCheckpointStore() if settings.CHECKPOINT_COLD_STORE == "mongo" else None,
+        )
+
+        # Compacts long chats in the background once their messages are written; dropping
+        # the checkpoint makes the next turn re-seed the thread with summary + recent tail
+        self.summarizer = ConversationSummarizer(
+            trigger_tokens=settings.SUMMARY_TRIGGER_TOKENS,
+            keep_recent=settings.SUMMARY_KEEP_RECENT_MESSAGES,
+            on_compacted=self._drop_compacted_thread,
+        )
+        message_write_queue.add_listener(self.summarizer.schedule)
+        # Turns running per thread, and compacted threads whose checkpoint is dropped
+        # once their last running turn ends
+        self._active_runs: Counter = Counter()
+        self._compacted_threads: Set[str] = set()
+
+        self.response_cache = ResponseCache(
+            max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.RESPONSE_CACHE_TTL_SECONDS,
+            semantic_index=SemanticPromptIndex(
+                similarity_threshold=settings.RESPONSE_CACHE_SIMILARITY) if settings.RESPONSE_CACHE_SEMANTIC else None,
+        ) if settings.RESPONSE_CACHE_ENABLED else None
+
+        # Shared across users and scheduled runs; only tools with a cache policy are wrapped
+        self.tool_cache = ToolResultCache(
+            policies=build_policies(settings.TOOL_CACHE_TTLS),
+            max_entries=settings.TOOL_CACHE_MAX_ENTRIES,
+            max_bytes=settings.TOOL_CACHE_MAX_BYTES,
+            disk_dir=settings.TOOL_CACHE_DISK_DIR or None,
+        ) if settings.TOOL_CACHE_ENABLED else None
 
     @error_handler
     async def initialize(self):
         """
         Initialize the agent service.
 
-        This method creates the MultiServerMCPClient and waits for the tools to be available.
+        This method loads the MCP tool schemas and builds the agent. MCP servers are only
+        spawned here if their schemas are not in the tool manifest yet.
         """
         print(f"{COLORS['BLUE']}Initializing agent service{COLORS['RESET']}")
-        memory = MemorySaver()
-        self.mcp_client = MultiServerMCPClient(self.mcp_config)
         try:
-            await self.mcp_client.__aenter__()
+            with startup_timer.phase("agent.mcp_tools"):
+                tools = await self.mcp_pool.get_tools()
+            self.mcp_pool.start_health_checks()
             print(
-                f"{COLORS['GREEN']}MCP client initialized successfully{COLORS['RESET']}")
+                f"{COLORS['GREEN']}MCP pool initialized with {len(tools)} tools{COLORS['RESET']}")
         except Exception as e:
             print(
-                f"{COLORS['RED']}Error entering MCP client context: {e}{COLORS['RESET']}")
+                f"{COLORS['RED']}Error initializing MCP pool: {e}{COLORS['RESET']}")
             raise
 
         # Create the output parser and get JSON instructions.
@@ -143,8 +223,6 @@ Please analyze the following user query and proceed with your task:
             Current Time: {datetime.now().strftime("%H:%M:%S")}
         """
 
-        tools = self.mcp_client.get_tools()
-
         # Custom Tools
         # search_tool = BraveSearch.from_api_key(
         #     api_key=settings.BRAVE_SEARCH_API_KEY, search_kwargs={"count": 3})
@@ -157,33 +235,112 @@ Please analyze the following user query and proceed with your task:
 
         tools.extend([search_tool, article_generator_tool])
 
-        self.tools = tools
+        if self.tool_cache:
+            tools = self.tool_cache.wrap_tools(tools)
 
-        self.agent = create_react_agent(
-            state_schema=State,
-            prompt=prompt,
-            model=self.llm,
-            tools=tools,
-            checkpointer=memory,
-        )
+        self.tools = tools
+        self.tool_node = TimedToolNode(
+            tools, timeouts=settings.TOOL_TIMEOUTS, default_timeout=settings.TOOL_TIMEOUT_SECONDS)
+
+        with startup_timer.phase("agent.graph"):
+            # v2 runs each tool call of a step as its own task, so they execute concurrently
+            # (capped by max_concurrency in the run config) and stream back one by one
+            self.agent = create_react_agent(
+                state_schema=State,
+                prompt=prompt,
+                model=self.llm,
+                tools=self.tool_node,
+                checkpointer=self.checkpointer,
+                version="v2",
+            )
         # output_parser=output_parser
 
-    @error_handler
-    def set_user_id(self, user_id):
-        self.user_id = user_id
-
     @error_handler
     def get_tools(self):
         return self.tools
 
     @error_handler
-    async def stream(self, message: HumanMessage, chat_id: str = None) -> AsyncGenerator[Dict[str, Any], None]:
-        """Stream responses from the agent and capture messages for database storage"""
+    def get_runtime_stats(self) -> Dict[str, Any]:
+        """Return counters describing the runtime state of this worker."""
+        return {
+            "run_pool": self.run_pool.stats(),
+            "cancellations": self.cancellations.stats(),
+            "checkpointer": self.checkpointer.stats(),
+            "summarizer": self.summarizer.stats(),
+            "response_cache": self.response_cache.stats() if self.response_cache else None,
+            "mcp_pool": self.mcp_pool.stats(),
+            "message_writes": message_write_queue.stats(),
+            "publishing": publish_queue.stats(),
+            "analytics_cache": analytics_cache.stats(),
+            "tool_cache": self.tool_cache.stats() if self.tool_cache else None,
+            "tool_timeouts": self.tool_node.timed_out if self.tool_node else 0,
+            "startup": startup_timer.report(),
+        }
+
+    @asynccontextmanager
+    async def _running(self, thread_id: str) -> AsyncIterator[None]:
+        """Track a turn running on a thread, so compaction does not drop its checkpoint under it."""
+        self._active_runs[thread_id] += 1
+        try:
+            yield
+        finally:
+            self._active_runs[thread_id] -= 1
+            if not self._active_runs[thread_id]:
+                del self._active_runs[thread_id]
+                if thread_id in self._compacted_threads:
+                    self._compacted_threads.discard(thread_id)
+                    await asyncio.shield(self._reset_thread(thread_id))
+
+    async def _drop_compacted_thread(self, chat_id: str) -> None:
+        """
+        Drop the checkpoint of a chat that was just compacted. A turn still running on it
+        would write back the full history when it ends, so it is dropped after that turn.
+        """
+        if self._active_runs[chat_id]:
+            self._compacted_threads.add(chat_id)
+        else:
+            await self._reset_thread(chat_id)
+
+    async def _reset_thread(self, thread_id: str) -> None:
+        # The next turn re-seeds the thread from storage, which must hold every message first
+        try:
+            await message_write_queue.flush()
+            await self.checkpointer.adelete_thread(thread_id)
+        except Exception as e:
+            print(
+                f"{COLORS['RED']}Error dropping compacted thread {thread_id}: {e}{COLORS['RESET']}")
+
+    @error_handler
+    async def stream(self, message: HumanMessage, context: ExecutionContext, stream_mode: str = "updates") -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Stream responses from the agent and capture messages for database storage.
+
+        Args:
+            message: The user message
+            context: The execution context of this run (user, chat_id, config, capture buffer)
+            stream_mode: "updates" sends each agent reply as one `chunk` event once the node
+                finishes; "tokens" sends `delta` events as the LLM produces tokens instead.
+                Tool-call, tool-result and `article_delta` (partial article) events are
+                sent in both modes.
+
+        If the run is cancelled (the client went away), the graph and its running tool
+        calls are cancelled with it and the partial transcript is still saved.
+        """
+        async with self._running(context.thread_id):
+            events = self._stream(message, context, stream_mode)
+            try:
+                async for event in events:
+                    yield event
+            finally:
+                # Passes a client disconnect (GeneratorExit) on to the stream right away
+                await events.aclose()
+
+    async def _stream(self, message: HumanMessage, context: ExecutionContext, stream_mode: str) -> AsyncGenerator[Dict[str, Any], None]:
+        token_stream = stream_mode == "tokens"
         print(
             f"{COLORS['CYAN']}Streaming response for message: {message.content[:30]}...{COLORS['RESET']}")
 
-        # For message capture
-        all_messages = []
+        chat_id = context.chat_id
 
         try:
             # Initialize agent if not already initialized
@@ -192,31 +349,34 @@ Please analyze the following user query and proceed with your task:
                     f"{COLORS['YELLOW']}Agent not initialized, initializing now{COLORS['RESET']}")
                 await self.initialize()
 
-            # Create config with thread_id (using chat_id)
-            config = {"configurable": {
-                "thread_id": chat_id}} if chat_id else {}
+            config = context.config
 
             # Create and capture user message
             user_db_message = create_user_message(message.content)
-            all_messages.append(user_db_message)
+            context.capture(user_db_message)
 
             # Prepare initial state and inputs
             # Clearing previously generated article in agent state, if any
             state_values = {}
             inputs = {"messages": [("user", message.content)]}
+            # Token deltas of the agent reply in progress, kept for a partial transcript
+            partial_reply: List[str] = []
 
             # Stream responses
             try:
                 # Check if agent state exists and messages are empty
-                current_state = self.agent.get_state(config)
+                current_state = await self.agent.aget_state(config)
+                previous_values = current_state.values
                 if not current_state.values.get('messages', []) and chat_id:
                     # Load chat history if available
-                    agent_messages, result = await get_chat_messages(chat_id, self.user_id)
+                    agent_messages, result = await get_chat_messages(chat_id, context.user_id, self.history_window)
 
                     if result["success"]:
                         print(
                             f"{COLORS['GREEN']}Loaded {result['message_count']} messages from chat_id: {chat_id}{COLORS['RESET']}")
                         state_values["messages"] = agent_messages
+                        # Hydrated history is part of this turn's delta
+                        previous_values = {}
                     elif result["error"]:
                         print(
                             f"{COLORS['RED']}Error loading messages: {result['error']}{COLORS['RESET']}")
@@ -224,14 +384,43 @@ Please analyze the following user query and proceed with your task:
                         print(
                             f"{COLORS['YELLOW']}No existing messages found for chat_id: {chat_id}{COLORS['RESET']}")
 
+                # Replay a cached reply to the same prompt in the same context, if any
+                history_key = history_hash(
+                    state_values.get("messages") or current_state.values.get("messages", []))
+                cached = await self._get_cached_response(message.content, history_key, context)
+                if cached is not None:
+                    print(
+                        f"{COLORS['GREEN']}Response cache hit for chat_id: {chat_id}{COLORS['RESET']}")
+                    state_values["messages"] = list(state_values.get("messages", [])) + [
+                        ("user", message.content), ("assistant", cached.content)]
+
                 # Update agent state
-                self.agent.update_state(config, values=state_values)
+                await self.agent.aupdate_state(config, values=state_values)
 
-                # Start streaming
-                stream_generator = self.agent.astream(
-                    inputs, config, stream_mode="updates")
-                async for chunk in stream_generator:
-                    chunk = make_serializable(chunk)
+                # Start streaming: node updates plus what tools write to the custom stream
+                # (partial articles); token mode adds LangGraph's messages stream
+                if cached is not None:
+                    stream_generator = self._replay_cached_response(cached, token_stream)
+                else:
+                    stream_generator = self.agent.astream(
+                        inputs, self._run_config(context),
+                        stream_mode=["updates", "custom", "messages"] if token_stream else ["updates", "custom"])
+                async for mode, chunk in stream_generator:
+                    if mode == "messages":
+                        message_chunk, chunk_metadata = chunk
+                        # Only tokens of the agent's own replies; tool nodes may run LLMs too
+                        if (chunk_metadata.get("langgraph_node") == "agent"
+                                and isinstance(message_chunk, AIMessageChunk)
+                                and message_chunk.content):
+                            partial_reply.append(message_chunk.content)
+                            yield sse_format("delta", message_chunk.content)
+                        continue
+                    if mode == "custom":
+                        if isinstance(chunk, dict) and ARTICLE_DELTA in chunk:
+                            yield sse_format(ARTICLE_DELTA, chunk[ARTICLE_DELTA])
+                        continue
+
+                    chunk = sse_encoder.to_jsonable(chunk)
 
                     if "output" in chunk:
                         # Capture output message
@@ -243,7 +432,7 @@ Please analyze the following user query and proceed with your task:
                                     "timestamp": datetime.utcnow().isoformat()
                                 }
                             })
-                            all_messages.append(assistant_message)
+                            context.capture(assistant_message)
                         except Exception as msg_error:
                             print(
                                 f"{COLORS['RED']}Error creating output message: {msg_error}{COLORS['RESET']}")
@@ -251,6 +440,9 @@ Please analyze the following user query and proceed with your task:
                         yield sse_format("output", {'output': chunk['output'], 'existing_state': existing_state})
                     elif "agent" in chunk:
                         # Handle agent reasoning/tool calls
+                        partial_reply.clear()
+                        if cached is None:
+                            context.tokens_used += self._message_tokens(chunk["agent"].get("messages", [])[-1])
                         tool_names = extract_tool_names(chunk["agent"])
                         if tool_names:
                             yield sse_format("tool_calls", tool_names)
@@ -269,12 +461,14 @@ Please analyze the following user query and proceed with your task:
                                         "timestamp": datetime.utcnow().isoformat()
                                     }
                                 })
-                                all_messages.append(assistant_message)
+                                context.capture(assistant_message)
                             except Exception as msg_error:
                                 print(
                                     f"{COLORS['RED']}Error creating agent message: {msg_error}{COLORS['RESET']}")
 
-                        yield sse_format("chunk", content)
+                        # In token mode the content already went out as deltas
+                        if not token_stream:
+                            yield sse_format("chunk", content)
 
                     else:
                         if 'tools' in chunk:
@@ -282,15 +476,18 @@ Please analyze the following user query and proceed with your task:
                         else:
                             yield sse_format("chunk", chunk)
 
+            except asyncio.CancelledError:
+                print(
+                    f"{COLORS['YELLOW']}Run cancelled, client disconnected{COLORS['RESET']}")
+                await asyncio.shield(self._save_cancelled_run(context, message, "".join(partial_reply)))
+                raise
             except GeneratorExit:
                 print(
                     f"{COLORS['YELLOW']}Stream closed by client{COLORS['RESET']}")
                 # Try to save messages even if client disconnected
                 await save_messages_to_db(
-                    user_id=self.user_id,  # Use the class variable user_id
-                    chat_id=chat_id,
+                    context=context,
                     prompt=message.content,
-                    messages=all_messages,
                     agent_name=self.agent_name
                 )
                 return
@@ -299,11 +496,13 @@ Please analyze the following user query and proceed with your task:
                     f"{COLORS['RED']}Error during stream generation: {stream_error}{COLORS['RESET']}")
                 raise
 
-            # Send completion message
+            # Send completion message with only what changed during this turn
             try:
-                existing_state = self.agent.get_state(config).values
-                existing_state = make_serializable(existing_state)
-                yield sse_format("complete", existing_state)
+                final_state = await self.agent.aget_state(config)
+                yield sse_format("complete", self._state_delta(previous_values, final_state))
+                if cached is None:
+                    self.cancellations.record_completed(context.tokens_used)
+                    await self._store_cached_response(message.content, history_key, context, final_state.values)
             except Exception as state_error:
                 print(
                     f"{COLORS['RED']}Error getting/sending state: {state_error}{COLORS['RESET']}")
@@ -311,10 +510,8 @@ Please analyze the following user query and proceed with your task:
             # Save messages to database at the end of the stream
             try:
                 await save_messages_to_db(
-                    user_id=self.user_id,  # Use the class variable user_id
-                    chat_id=chat_id,
+                    context=context,
                     prompt=message.content,
-                    messages=all_messages,
                     agent_name=self.agent_name
                 )
             except Exception as db_error:
@@ -327,8 +524,139 @@ Please analyze the following user query and proceed with your task:
             error_msg = f"Error in stream processing: {str(e)}"
             yield sse_format("error", error_msg)
 
+    @staticmethod
+    def _message_tokens(message: Dict[str, Any]) -> int:
+        """Tokens of one serialized agent message: reported usage, else an estimate of its output."""
+        usage = message.get("usage_metadata") or {}
+        if usage.get("total_tokens"):
+            return usage["total_tokens"]
+        tool_calls = message.get("tool_calls") or []
+        return count_message_tokens(message.get("content") or "") + (
+            count_tokens(json.dumps(tool_calls, default=str)) if tool_calls else 0)
+
+    async def _save_cancelled_run(self, context: ExecutionContext, message: HumanMessage, partial_reply: str) -> None:
+        """Persist what a cancelled run produced so far and count the tokens it saved."""
+        if partial_reply:
+            context.tokens_used += count_tokens(partial_reply)
+            context.capture(create_assistant_message({
+                "content": partial_reply,
+                "metadata": {
+                    "role": "assistant",
+                    "type": "partial",
+                    "cancelled": True,
+                    "timestamp": datetime.utcnow().isoformat()
+                }
+            }))
+        saved = self.cancellations.record_cancelled(context.tokens_used)
+        print(
+            f"{COLORS['YELLOW']}Cancelled run {context.run_id} after ~{context.tokens_used} tokens, ~{saved} saved{COLORS['RESET']}")
+        try:
+            await self._close_pending_tool_calls(context.config)
+        except Exception as state_error:
+            print(
+                f"{COLORS['RED']}Error closing tool calls of cancelled run: {state_error}{COLORS['RESET']}")
+        try:
+            await save_messages_to_db(
+                context=context,
+                prompt=message.content,
+                agent_name=self.agent_name
+            )
+        except Exception as db_error:
+            print(
+                f"{COLORS['RED']}Error saving messages of cancelled run: {db_error}{COLORS['RESET']}")
+
+    async def _close_pending_tool_calls(self, config: Dict[str, Any]) -> None:
+        """
+        Answer tool calls a cancelled step left open, so the next turn on the thread is
+        not rejected for tool calls without tool messages.
+        """
+        messages = (await self.agent.aget_state(config)).values.get("messages", [])
+        for index in range(len(messages) - 1, -1, -1):
+            if isinstance(messages[index], AIMessage):
+                break
+        else:
+            return
+        answered = {m.tool_call_id for m in messages[index + 1:] if isinstance(m, ToolMessage)}
+        missing = [call for call in messages[index].tool_calls if call["id"] not in answered]
+        if missing:
+            await self.agent.aupdate_state(config, {"messages": [
+                ToolMessage(
+                    content="Cancelled: the user left before this tool finished.",
+                    name=call["name"],
+                    tool_call_id=call["id"],
+                    status="error",
+                ) for call in missing
+            ]}, as_node="tools")
+
+    @staticmethod
+    def _run_config(context: ExecutionContext) -> Dict[str, Any]:
+        """Config for executing the graph: the thread config plus the tool parallelism cap."""
+        return {**context.config, "max_concurrency": settings.AGENT_MAX_PARALLEL_TOOLS}
+
+    async def _get_cached_response(self, prompt: str, history_key: str, context: ExecutionContext) -> Optional[CachedResponse]:
+        if self.response_cache is None or not context.use_cache:
+            return None
+        return await self.response_cache.aget(prompt, history_key, context.user_id)
+
+    async def _store_cached_response(self, prompt: str, history_key: str, context: ExecutionContext, values: Dict[str, Any]) -> None:
+        """
+        Cache the final reply of a completed turn. Only plain answers are cached: a turn
+        that called tools (searched, generated or published an article) must run again.
+        """
+        if self.response_cache is None or not context.use_cache:
+            return
+        messages = values.get("messages", [])
+        # This turn's messages start at its prompt, the last human message
+        start = next((i for i in range(len(messages) - 1, -1, -1) if isinstance(messages[i], HumanMessage)), -1)
+        turn = messages[start + 1:]
+        if any(isinstance(m, ToolMessage) or (isinstance(m, AIMessage) and m.tool_calls) for m in turn):
+            return
+        last = turn[-1] if turn else None
+        if isinstance(last, AIMessage) and last.content:
+            await self.response_cache.aset(prompt, history_key, context.user_id, CachedResponse(content=last.content))
+
+    @staticmethod
+    async def _replay_cached_response(cached: CachedResponse, token_stream: bool) -> AsyncGenerator[Any, None]:
+        """Yield a cached reply in the same (mode, chunk) shape `agent.astream` produces."""
+        reply = AIMessage(content=cached.content, response_metadata={"cached": True})
+        if token_stream:
+            yield ("messages", (AIMessageChunk(content=cached.content), {"langgraph_node": "agent"}))
+        yield ("updates", {"agent": {"messages": [reply]}})
+
+    @staticmethod
+    def _state_version(state) -> Optional[str]:
+        return (state.config or {}).get("configurable", {}).get("checkpoint_id")
+
+    def _state_delta(self, previous_values: Dict[str, Any], state) -> Dict[str, Any]:
+        """
+        Build the `complete` event payload: the messages and articles added during this
+        turn plus the state version, so its size does not grow with the chat length.
+        """
+        values = state.values
+        known_ids = {m.id for m in previous_values.get("messages", [])}
+        previous_articles = previous_values.get("articles", [])
+        messages = values.get("messages", [])
+        return {
+            "version": self._state_version(state),
+            "message_count": len(messages),
+            "messages": sse_encoder.to_jsonable([m for m in messages if m.id not in known_ids]),
+            "articles": sse_encoder.to_jsonable(
+                [a for a in values.get("articles", []) if a not in previous_articles]),
+        }
+
+    @error_handler
+    async def get_state_snapshot(self, context: ExecutionContext) -> Dict[str, Any]:
+        """Return the full agent state of a thread, for clients that need more than the deltas."""
+        if not self.agent:
+            await self.initialize()
+        state = await self.agent.aget_state(context.config)
+        return {
+            "version": self._state_version(state),
+            "values": sse_encoder.to_jsonable(state.values),
+        }
+
     @error_handler
-    async def run(self, messages: list, chat_id: str = None) -> dict:
+    async def run(self, messages: list, context: Optional[ExecutionContext] = None) -> dict:
         """
         Run the agent with the given messages.
 
@@ -337,13 +665,23 @@ Please analyze the following user query and proceed with your task:
 
         Args:
             messages: The user message as a string or list
-            chat_id: Optional chat ID to load history from
+            context: Execution context of this run; the chat_id on it is used to load history
+                into a thread that has none.
+                Defaults to a context for the "system" user (scheduled runs).
         """
         if not self.agent:
             await self.initialize()
 
+        if context is None:
+            context = ExecutionContext(user_id="system")
+        async with self._running(context.thread_id):
+            return await self._run(messages, context)
+
+    async def _run(self, messages: list, context: ExecutionContext) -> dict:
+        chat_id = context.chat_id
+
         # Prepare configuration
-        config = {"configurable": {"thread_id": self.user_id}}
+        config = context.config
         state_values = {"article": {}}
 
         # Handle input messages formatting
@@ -357,11 +695,12 @@ Please analyze the following user query and proceed with your task:
 
         inputs = {"messages": [("user", user_input)]}
 
-        # Load chat history if available
-        if chat_id:
+        # Load chat history if available and the thread has none (e.g. after an eviction)
+        current_messages = (await self.agent.aget_state(config)).values.get("messages", [])
+        if chat_id and not current_messages:
             try:
                 # Try to get chat history
-                agent_messages, result = await get_chat_messages(chat_id, self.user_id)
+                agent_messages, result = await get_chat_messages(chat_id, context.user_id, self.history_window)
                 if result["success"] and agent_messages:
                     print(
                         f"{COLORS['GREEN']}Run: Loaded {result['message_count']} messages for context from chat_id: {chat_id}{COLORS['RESET']}")
@@ -370,15 +709,25 @@ Please analyze the following user query and proceed with your task:
                 print(
                     f"{COLORS['RED']}Run: Error loading messages: {str(e)}{COLORS['RESET']}")
 
-        # Update state and run agent
-        self.agent.update_state(config, values=state_values)
-        result = await self.agent.ainvoke(inputs, config)
+        history_key = history_hash(state_values.get("messages") or current_messages)
+        cached = await self._get_cached_response(user_input, history_key, context)
+        if cached is not None:
+            # Record the cached exchange on the thread instead of invoking the agent
+            state_values["messages"] = list(state_values.get("messages", [])) + [
+                ("user", user_input), ("assistant", cached.content)]
+            await self.agent.aupdate_state(config, values=state_values)
+            result = dict((await self.agent.aget_state(config)).values)
+        else:
+            # Update state and run agent
+            await self.agent.aupdate_state(config, values=state_values)
+            result = await self.agent.ainvoke(inputs, self._run_config(context))
+            await self._store_cached_response(user_input, history_key, context, result)
 
         # Check if the output contains an article block
         response_text = result.get("response", "")
         res = extract_json_from_string(response_text)
         if res:
-            articleSlug = await publish_article(self.CONTENT_DIR, res)
+            articleSlug = await publish_queue.publish(blog_content_dir(), res)
             result["articleSlug"] = articleSlug
         return result
 
@@ -388,40 +737,17 @@ Please analyze the following user query and proceed with your task:
         print(
             f"{COLORS['MAGENTA']}Shutting down agent service{COLORS['RESET']}")
 
-        if self.mcp_client:
-            try:
-                # Instead of using __aexit__ directly, use a safer approach
-                # Set the client to None before attempting to exit
-                client = self.mcp_client
-                self.mcp_client = None
-
-                # Use a safer exit approach
-                try:
-                    await client.__aexit__(None, None, None)
-                    print(
-                        f"{COLORS['GREEN']}MCP client shutdown successfully{COLORS['RESET']}")
-                except RuntimeError as re:
-                    if "Attempted to exit cancel scope in a different task" in str(re):
-                        # Just let it go - the event loop will clean up the resources
-                        print(
-                            f"{COLORS['YELLOW']}Handled cancel scope issue gracefully{COLORS['RESET']}")
-                    else:
-                        print(
-                            f"{COLORS['RED']}Unexpected RuntimeError during shutdown: {re}{COLORS['RESET']}")
-                except Exception as inner_e:
-                    print(
-                        f"{COLORS['RED']}Inner exception during shutdown: {inner_e}{COLORS['RESET']}")
+        try:
+            await self.summarizer.drain()
+            await self.checkpointer.aflush()
+        except Exception as e:
+            print(
+                f"{COLORS['RED']}Error flushing checkpoints: {e}{COLORS['RESET']}")
 
-            except RuntimeError as e:
-                if "Attempted to exit cancel scope in a different task" in str(e):
-                    print(
-                        f"{COLORS['YELLOW']}Ignoring expected cancel scope task error{COLORS['RESET']}")
-                else:
-                    print(
-                        f"{COLORS['RED']}Error during shutdown: {e}{COLORS['RESET']}")
-            except Exception as e:
-                print(
-                    f"{COLORS['RED']}Exception during shutdown: {e}{COLORS['RESET']}")
-        else:
+        try:
+            await self.mcp_pool.aclose()
+            print(
+                f"{COLORS['GREEN']}MCP pool shutdown successfully{COLORS['RESET']}")
+        except Exception as e:
             print(
-                f"{COLORS['BLUE']}No MCP client to shutdown{COLORS['RESET']}")
+                f"{COLORS['RED']}Exception during shutdown: {e}{COLORS['RESET']}")
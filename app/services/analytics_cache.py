@@ -0,0 +1,113 @@
+"""
+analytics_cache.py
+------------------
+Short-lived cache of analytics responses.
+
+The dashboard polls the analytics endpoints while it is open, and the numbers only
+change when the user's chats do. `AnalyticsCache` keeps the serialized response body
+per (user_id, endpoint, parameters) with an ETag:
+
+- entries live for `ttl_seconds` in an LRU bounded by entry count;
+- writers call `invalidate(user_id)` whenever that user's chats or messages change,
+  which drops the user's entries and bumps a per-user generation, so a response
+  computed before the write is never stored after it;
+- the ETag is a hash of the body, so a client revalidating with If-None-Match gets a
+  304 whenever the data is unchanged, even after the entry was recomputed.
+
+The cache is per process; with several workers a write only invalidates the worker
+that handled it, and the others catch up within the TTL.
+"""
+
+import hashlib
+import time
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from config import settings
+
+
+@dataclass
+class CachedAnalytics:
+    body: bytes
+    etag: str
+    expires_at: float
+
+
+def make_etag(body: bytes) -> str:
+    return f'"{hashlib.sha1(body).hexdigest()}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header covers `etag` (weak comparison, as for GET)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+class AnalyticsCache:
+    """
+    Per-user analytics response cache.
+
+    Args:
+        max_entries: Maximum number of cached responses
+        ttl_seconds: Lifetime of a cached response (0 disables caching; ETags still work)
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 30.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple[str, str, Hashable], CachedAnalytics]" = OrderedDict()
+        self._generations: Dict[str, int] = defaultdict(int)
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "invalidations": 0, "evictions": 0, "not_modified": 0}
+
+    def get(self, user_id: str, endpoint: str, params: Hashable) -> Optional[CachedAnalytics]:
+        key = (user_id, endpoint, params)
+        entry = self._entries.get(key)
+        if entry is None or entry.expires_at <= time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self._stats["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self._stats["hits"] += 1
+        return entry
+
+    def generation(self, user_id: str) -> int:
+        """Token to pass to `put`; it changes whenever the user's data is invalidated."""
+        return self._generations[user_id]
+
+    def put(self, user_id: str, endpoint: str, params: Hashable, body: bytes, generation: int) -> CachedAnalytics:
+        """Store a response computed at `generation`; stale ones are returned but not kept."""
+        entry = CachedAnalytics(body=body, etag=make_etag(body), expires_at=time.monotonic() + self.ttl_seconds)
+        if self.ttl_seconds <= 0 or generation != self._generations[user_id]:
+            return entry
+        self._entries[(user_id, endpoint, params)] = entry
+        self._entries.move_to_end((user_id, endpoint, params))
+        self._stats["stores"] += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+        return entry
+
+    def invalidate(self, user_id: str) -> None:
+        """Forget everything cached for this user."""
+        self._generations[user_id] += 1
+        self._stats["invalidations"] += 1
+        for key in [key for key in self._entries if key[0] == user_id]:
+            del self._entries[key]
+
+    def record_not_modified(self) -> None:
+        self._stats["not_modified"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, "entries": len(self._entries)}
+
+
+# Shared by the analytics endpoints and the writers that invalidate them
+analytics_cache = AnalyticsCache(
+    max_entries=settings.ANALYTICS_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.ANALYTICS_CACHE_TTL_SECONDS,
+)
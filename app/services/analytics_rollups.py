@@ -0,0 +1,147 @@
+"""
+analytics_rollups.py
+--------------------
+Incrementally maintained analytics counters.
+
+Every chat creation and every persisted batch of messages adds to one
+`AnalyticsRollup` document per (user, day) with an upserting `$inc`, so the analytics
+endpoints read a few small documents instead of scanning sessions and messages.
+Writers call `RollupBatch` (the message write queue, once per flush) or
+`record_chat_created` (chats created without messages); deleting a chat takes it and
+its messages back out with `record_chat_deleted`. `rebuild()` recomputes the counters
+from the stored chats and messages, for the initial backfill or after drift.
+"""
+
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from models.analytics import AnalyticsRollup
+from models.run_history import ChatSession, MessageBucket
+
+
+def day_of(timestamp: datetime) -> datetime:
+    return datetime(timestamp.year, timestamp.month, timestamp.day)
+
+
+class RollupBatch:
+    """Counter increments (or, with delta=-1, decrements) collected from one write, applied as one bulk `$inc`."""
+
+    def __init__(self):
+        self._incs: Dict[Tuple[str, datetime], Counter] = defaultdict(Counter)
+
+    def add_chat(self, user_id: str, created_at: datetime, delta: int = 1) -> None:
+        incs = self._incs[(user_id, day_of(created_at))]
+        incs["chats_created"] += delta
+        incs[f"chat_hours.{created_at.hour}"] += delta
+
+    def add_messages(self, user_id: str, messages: Iterable[Dict[str, Any]], delta: int = 1) -> None:
+        for message in messages:
+            timestamp = message.get("timestamp") or datetime.utcnow()
+            incs = self._incs[(user_id, day_of(timestamp))]
+            incs["messages"] += delta
+            incs[f"messages_by_role.{message.get('role', 'unknown')}"] += delta
+
+    def to_updates(self) -> List[UpdateOne]:
+        now = datetime.utcnow()
+        return [
+            UpdateOne(
+                {"user_id": user_id, "date": day},
+                {
+                    "$inc": dict(incs),
+                    "$set": {"updated_at": now},
+                    "$setOnInsert": {"weekday": day.weekday()},
+                },
+                upsert=True,
+            )
+            for (user_id, day), incs in self._incs.items()
+        ]
+
+    async def apply(self) -> None:
+        updates = self.to_updates()
+        if updates:
+            await AnalyticsRollup.get_motor_collection().bulk_write(updates, ordered=False)
+
+
+async def record_chat_created(user_id: str, created_at: Optional[datetime] = None) -> None:
+    batch = RollupBatch()
+    batch.add_chat(user_id, created_at or datetime.utcnow())
+    await batch.apply()
+
+
+async def record_chat_deleted(user_id: str, created_at: datetime, messages: Iterable[Dict[str, Any]]) -> None:
+    """Take a deleted chat and its messages (with `timestamp` and `role`) out of the rollups."""
+    batch = RollupBatch()
+    batch.add_chat(user_id, created_at, delta=-1)
+    batch.add_messages(user_id, messages, delta=-1)
+    await batch.apply()
+
+
+async def rebuild(user_id: Optional[str] = None) -> int:
+    """
+    Recompute the rollups (of one user, or all of them) from chat sessions and message
+    buckets; returns the number of rollup documents written. Chats and messages without
+    a timestamp are counted on the day their session or bucket was last updated, as the
+    write path counts them on the day they are written. All documents are computed
+    before the old ones are replaced. Writes that land while it runs may be counted
+    twice or not at all, so run it when the app is idle.
+    """
+    match: Dict[str, Any] = {"user_id": user_id} if user_id else {}
+    docs: Dict[Tuple[str, datetime], Dict[str, Any]] = {}
+
+    def doc_for(uid: str, day: datetime) -> Dict[str, Any]:
+        key = (uid, day)
+        if key not in docs:
+            docs[key] = {
+                "user_id": uid, "date": day, "weekday": day.weekday(), "chats_created": 0,
+                "messages": 0, "messages_by_role": {}, "chat_hours": {}, "updated_at": datetime.utcnow(),
+            }
+        return docs[key]
+
+    chats = ChatSession.get_motor_collection().aggregate([
+        {"$match": match},
+        {"$group": {
+            "_id": {
+                "user_id": "$user_id",
+                "date": {"$dateToString": {"format": "%Y-%m-%d", "date": {"$ifNull": ["$created_at", "$updated_at"]}}},
+                "hour": {"$hour": {"$ifNull": ["$created_at", "$updated_at"]}},
+            },
+            "count": {"$sum": 1},
+        }},
+    ])
+    async for row in chats:
+        key = row["_id"]
+        if not key.get("date"):
+            continue
+        doc = doc_for(key["user_id"], datetime.strptime(key["date"], "%Y-%m-%d"))
+        doc["chats_created"] += row["count"]
+        doc["chat_hours"][str(key["hour"])] = doc["chat_hours"].get(str(key["hour"]), 0) + row["count"]
+
+    messages = MessageBucket.get_motor_collection().aggregate([
+        {"$match": match},
+        {"$unwind": "$messages"},
+        {"$group": {
+            "_id": {
+                "user_id": "$user_id",
+                "date": {"$dateToString": {"format": "%Y-%m-%d", "date": {"$ifNull": ["$messages.timestamp", "$updated_at"]}}},
+                "role": "$messages.role",
+            },
+            "count": {"$sum": 1},
+        }},
+    ])
+    async for row in messages:
+        key = row["_id"]
+        if not key.get("date"):
+            continue
+        doc = doc_for(key["user_id"], datetime.strptime(key["date"], "%Y-%m-%d"))
+        role = key.get("role") or "unknown"
+        doc["messages"] += row["count"]
+        doc["messages_by_role"][role] = doc["messages_by_role"].get(role, 0) + row["count"]
+
+    collection = AnalyticsRollup.get_motor_collection()
+    await collection.delete_many(match)
+    if docs:
+        await collection.insert_many(list(docs.values()), ordered=False)
+    return len(docs)
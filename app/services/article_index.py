@@ -0,0 +1,215 @@
+"""
+article_index.py
+----------------
+Near-duplicate detection for generated articles.
+
+Scheduled runs and user requests often ask for articles on topics the blog already
+covers, and each one costs a full generation. `ArticleIndex` keeps the content words of
+every published post (`Posts/<slug>/index.md`), so `generate_article` can check its
+context against them before calling the LLM:
+
+- words are stored as 32-bit hashes, and an inverted index maps each hash to the posts
+  containing it;
+- a context is much shorter than an article, so matches are scored by containment
+  (the share of the context's content words that the article contains), counted
+  exactly through the inverted index. A MinHash estimate of it is too noisy for a
+  short context against a long post: a few shared words often scored above 0.6;
+- a lookup only touches the posts sharing a word with the context, a few milliseconds
+  at most for thousands of posts.
+
+`publish_article` adds every written post. The index is saved next to the posts as a
+dotfile (ignored by Hugo) and rebuilt from the posts on disk when missing; rebuild it
+explicitly with `python -m migrations.rebuild_article_index`.
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from dataclasses import dataclass
+from glob import glob
+from typing import Dict, List, Optional, Set
+
+import numpy as np
+
+from config import settings
+
+INDEX_FILE = ".article_index.json"
+# Bumped when the stored format changes; older index files are rebuilt
+INDEX_VERSION = 2
+
+_WORD = re.compile(r"[a-z0-9][a-z0-9+#.-]*[a-z0-9+#]|[a-z0-9]")
+_FRONT_MATTER = re.compile(r"\A---\n(.*?)\n---\n", re.DOTALL)
+_TITLE = re.compile(r'^title:\s*"?(.*?)"?\s*$', re.MULTILINE)
+
+STOP_WORDS = frozenset("""
+a about above after again all also an and any are as at be because been before being below
+between both but by can could did do does doing down during each few for from further had
+has have having he her here hers him his how i if in into is it its itself just me more most
+my no nor not now of off on once only or other our out over own same she should so some
+such than that the their them then there these they this those through to too under until
+up very was we were what when where which while who whom why will with would you your
+title slug date lastmod description summary keywords tags categories
+""".split())
+
+
+def content_words(text: str) -> List[str]:
+    """Distinct content words of a text (lowercased, stop words and 1-2 letter words dropped)."""
+    words = set(_WORD.findall(text.lower()))
+    return [word for word in words if len(word) > 2 and word not in STOP_WORDS]
+
+
+def word_hashes(words: List[str]) -> np.ndarray:
+    """Sorted 32-bit hashes of a word set."""
+    hashes = {int.from_bytes(hashlib.blake2b(word.encode(), digest_size=4).digest(), "little") for word in words}
+    return np.array(sorted(hashes), dtype=np.uint32)
+
+
+@dataclass
+class SimilarArticle:
+    slug: str
+    title: str
+    link: str
+    # Share of the query's content words that the article contains
+    score: float
+
+
+class ArticleIndex:
+    """
+    Word index of the posts under one content directory.
+
+    Args:
+        content_dir: Hugo content directory holding `Posts/<slug>/index.md`
+        threshold: Minimum containment score for `find_similar` to report a match
+    """
+
+    def __init__(self, content_dir: str, threshold: float = 0.6):
+        self.content_dir = content_dir
+        self.threshold = threshold
+        self.path = os.path.join(content_dir, INDEX_FILE)
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._slugs: List[str] = []
+        self._meta: Dict[str, Dict[str, str]] = {}
+        self._hashes: List[np.ndarray] = []
+        # Word hash -> rows (in `_slugs`) of the posts containing it
+        self._postings: Dict[int, Set[int]] = {}
+
+    def find_similar(self, text: str) -> Optional[SimilarArticle]:
+        """The published article covering most of `text`, if it reaches the threshold."""
+        hashes = word_hashes(content_words(text))
+        self._ensure_loaded()
+        with self._lock:
+            if not len(hashes) or not self._slugs:
+                return None
+            rows = [row for h in hashes.tolist() for row in self._postings.get(h, ())]
+            if not rows:
+                return None
+            # Exact containment of the query: |Q & A| / |Q|
+            containment = np.bincount(rows, minlength=len(self._slugs)) / len(hashes)
+            best = int(np.argmax(containment))
+            score = float(containment[best])
+            if score < self.threshold:
+                return None
+            slug = self._slugs[best]
+            return SimilarArticle(slug=slug, score=round(score, 3), **self._meta[slug])
+
+    def add(self, slug: str, title: str, link: str, text: str, save: bool = True) -> None:
+        """Index (or re-index) a published post."""
+        hashes = word_hashes(content_words(text))
+        self._ensure_loaded()
+        with self._lock:
+            self._set(slug, title, link, hashes)
+            if save:
+                self._save()
+
+    def rebuild(self) -> int:
+        """Re-index every post on disk and save the index; returns the number of posts."""
+        with self._lock:
+            self._slugs, self._meta, self._hashes, self._postings = [], {}, [], {}
+            for path in sorted(glob(os.path.join(self.content_dir, "Posts", "*", "index.md"))):
+                slug = os.path.basename(os.path.dirname(path)).lower()
+                with open(path, encoding="utf-8") as f:
+                    text = f.read()
+                front_matter = _FRONT_MATTER.match(text)
+                title = _TITLE.search(front_matter.group(1)) if front_matter else None
+                self._set(slug, title.group(1) if title else slug, post_link(slug), word_hashes(content_words(text)))
+            self._loaded = True
+            self._save()
+            return len(self._slugs)
+
+    def _set(self, slug: str, title: str, link: str, hashes: np.ndarray) -> None:
+        if slug in self._meta:
+            row = self._slugs.index(slug)
+            for h in self._hashes[row].tolist():
+                self._postings[h].discard(row)
+            self._hashes[row] = hashes
+        else:
+            row = len(self._slugs)
+            self._slugs.append(slug)
+            self._hashes.append(hashes)
+        for h in hashes.tolist():
+            self._postings.setdefault(h, set()).add(row)
+        self._meta[slug] = {"title": title, "link": link}
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != INDEX_VERSION:
+                raise ValueError(f"index format {data.get('version')} is not {INDEX_VERSION}")
+        except FileNotFoundError:
+            data = None
+        except Exception as e:
+            print(f"Rebuilding article index {self.path}: {e}")
+            data = None
+        if data is None:
+            self.rebuild()
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            for slug, post in data.get("posts", {}).items():
+                self._set(slug, post["title"], post["link"], np.array(post["words"], dtype=np.uint32))
+            self._loaded = True
+
+    def _save(self) -> None:
+        """Write the index atomically; called with the lock held."""
+        data = {
+            "version": INDEX_VERSION,
+            "posts": {
+                slug: {**self._meta[slug], "words": hashes.tolist()}
+                for slug, hashes in zip(self._slugs, self._hashes)
+            },
+        }
+        os.makedirs(self.content_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=INDEX_FILE + ".", suffix=".tmp", dir=self.content_dir)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+def post_link(slug: str) -> str:
+    return f"https://blog.sleebit.com/posts/{slug.lower()}"
+
+
+_indexes: Dict[str, ArticleIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_article_index(content_dir: str) -> ArticleIndex:
+    """The shared index of a content directory (one per directory and process)."""
+    content_dir = os.path.abspath(content_dir)
+    with _indexes_lock:
+        if content_dir not in _indexes:
+            _indexes[content_dir] = ArticleIndex(content_dir, threshold=settings.ARTICLE_DUPLICATE_THRESHOLD)
+        return _indexes[content_dir]
@@ -0,0 +1,113 @@
+"""
+article_stream.py
+-----------------
+Incremental article output for `generate_article`.
+
+The article model streams its structured output as a growing JSON object, so a
+partial article is available long before the whole response is. `ArticleDeltas`
+turns the successive partial objects into `article_delta` events:
+
+- `title` and `summary` are sent as text deltas as soon as they grow;
+- `content` is sent one markdown section at a time (a section ends where the next
+  heading starts), so the client never renders half a code block or table row;
+  the last section is sent by `finish()` once the article is complete.
+
+The events go out through LangGraph's `custom` stream, which `AgentService.stream()`
+forwards as SSE. Outside a graph run (e.g. the tool invoked directly) they are dropped.
+"""
+
+import re
+from typing import Any, Callable, Dict, List, Optional
+
+from langgraph.config import get_stream_writer
+from pydantic import BaseModel
+
+# Key of article deltas in the custom stream, also their SSE event name
+ARTICLE_DELTA = "article_delta"
+
+TEXT_FIELDS = ("title", "summary")
+
+# A markdown heading at the start of a line, or a code fence (whose `#` lines are not headings)
+_HEADING_OR_FENCE = re.compile(r"(?<=\n)#{1,6} |^```", re.MULTILINE)
+
+
+def section_starts(text: str) -> List[int]:
+    """Offsets of the markdown headings in `text` that start a section (not in code blocks)."""
+    starts, in_code = [], False
+    for match in _HEADING_OR_FENCE.finditer(text):
+        if match.group().startswith("`"):
+            in_code = not in_code
+        elif not in_code:
+            starts.append(match.start())
+    return starts
+
+
+def as_dict(value: Any) -> Dict[str, Any]:
+    """A partial structured output as a dict, whether the model yields dicts or models."""
+    if isinstance(value, BaseModel):
+        return value.model_dump(exclude_unset=True)
+    return value if isinstance(value, dict) else {}
+
+
+def article_stream_writer() -> Callable[[Any], None]:
+    """Writer for the running graph's custom stream, or a no-op outside a graph run."""
+    try:
+        return get_stream_writer()
+    except RuntimeError:
+        return lambda chunk: None
+
+
+class ArticleDeltas:
+    """
+    Tracks what of one article has been sent and produces the next events.
+
+    Args:
+        tool_call_id: Tool call generating the article, so clients can tell
+            concurrent articles apart
+    """
+
+    def __init__(self, tool_call_id: Optional[str] = None):
+        self.tool_call_id = tool_call_id
+        self._sent: Dict[str, int] = {}
+        self._section = 0
+
+    def update(self, partial: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Events for what `partial` (the article so far) adds to what was already sent."""
+        events = []
+        for field in TEXT_FIELDS:
+            text = partial.get(field)
+            if isinstance(text, str) and len(text) > self._sent.get(field, 0):
+                events.append(self._event(field, text[self._sent.get(field, 0):]))
+                self._sent[field] = len(text)
+
+        content = partial.get("content")
+        if isinstance(content, str):
+            # Everything before the last heading is made of complete sections
+            starts = section_starts(content)
+            events.extend(self._content_until(content, starts[-1] if starts else 0))
+        return events
+
+    def finish(self, article: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Events for the rest of the finished article."""
+        events = self.update({field: article.get(field) for field in TEXT_FIELDS})
+        content = article.get("content")
+        if isinstance(content, str):
+            events.extend(self._content_until(content, len(content)))
+        return events
+
+    def _content_until(self, content: str, end: int) -> List[Dict[str, Any]]:
+        start = self._sent.get("content", 0)
+        if end <= start:
+            return []
+        self._sent["content"] = end
+        events = []
+        bounds = [start] + [offset for offset in section_starts(content[:end]) if offset > start] + [end]
+        for section_start, section_end in zip(bounds, bounds[1:]):
+            event = self._event("content", content[section_start:section_end])
+            event["section"] = self._section
+            self._section += 1
+            events.append(event)
+        return events
+
+    def _event(self, field: str, delta: str) -> Dict[str, Any]:
+        return {"tool_call_id": self.tool_call_id, "field": field, "delta": delta}
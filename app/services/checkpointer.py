@@ -0,0 +1,525 @@
+"""
+checkpointer.py
+---------------
+Bounded, evicting and persistent LangGraph checkpointer for the agent.
+
+`TieredCheckpointSaver` replaces `MemorySaver`, which kept the full message state of
+every thread in RAM forever and lost it on restart. It keeps two tiers:
+
+- a hot tier in memory, bounded by thread count (LRU) and idle time (TTL), holding
+  only the latest checkpoint of each thread in compressed form;
+- an optional cold tier in Mongo (`AgentCheckpoint`), written behind the hot tier and
+  read back on a hot miss, so warm chats survive evictions and restarts without
+  rehydrating history from `ChatSession`.
+
+The agent never time-travels, so only the latest checkpoint per thread is retained.
+The sync methods only see the hot tier; the agent uses the async API (`aget_state`,
+`aupdate_state`, `astream`) which also consults the cold tier.
+"""
+
+import asyncio
+import time
+import zlib
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.checkpoint.serde.types import TASKS
+
+from models.checkpoint import AgentCheckpoint
+
+# Serialized payloads above this size are zlib-compressed
+COMPRESSION_THRESHOLD_BYTES = 1024
+ZLIB_SUFFIX = "+zlib"
+
+ThreadKey = Tuple[str, str]  # (thread_id, checkpoint_ns)
+TypedBlob = Tuple[str, bytes]
+
+
+@dataclass
+class CheckpointRecord:
+    """Latest checkpoint of one thread/namespace, kept in serialized form."""
+    thread_id: str
+    checkpoint_ns: str
+    checkpoint_id: str
+    parent_checkpoint_id: Optional[str]
+    checkpoint: TypedBlob
+    metadata: TypedBlob
+    # (task_id, idx) -> (task_id, channel, value, task_path)
+    writes: Dict[Tuple[str, int], Tuple[str, str, TypedBlob, str]] = field(default_factory=dict)
+    # TASKS writes of the parent checkpoint, already sorted
+    parent_sends: List[TypedBlob] = field(default_factory=list)
+    last_access: float = field(default_factory=time.monotonic)
+
+
+class MongoCheckpointStore:
+    """Cold tier: one `AgentCheckpoint` document per thread/namespace."""
+
+    async def load(self, key: ThreadKey) -> Optional[CheckpointRecord]:
+        doc = await AgentCheckpoint.find_one(
+            {"thread_id": key[0], "checkpoint_ns": key[1]})
+        if not doc:
+            return None
+        return CheckpointRecord(
+            thread_id=doc.thread_id,
+            checkpoint_ns=doc.checkpoint_ns,
+            checkpoint_id=doc.checkpoint_id,
+            parent_checkpoint_id=doc.parent_checkpoint_id,
+            checkpoint=(doc.checkpoint_type, doc.checkpoint),
+            metadata=(doc.metadata_type, doc.metadata),
+            writes={
+                (w["task_id"], w["idx"]): (w["task_id"], w["channel"], (w["type"], w["value"]), w["task_path"])
+                for w in doc.writes
+            },
+            parent_sends=[(s["type"], s["value"]) for s in doc.parent_sends],
+        )
+
+    async def save(self, record: CheckpointRecord) -> None:
+        writes = [
+            {"task_id": task_id, "idx": idx, "channel": channel,
+             "type": value[0], "value": value[1], "task_path": task_path}
+            for (_, idx), (task_id, channel, value, task_path) in record.writes.items()
+        ]
+        await AgentCheckpoint.get_motor_collection().update_one(
+            {"thread_id": record.thread_id, "checkpoint_ns": record.checkpoint_ns},
+            {"$set": {
+                "checkpoint_id": record.checkpoint_id,
+                "parent_checkpoint_id": record.parent_checkpoint_id,
+                "checkpoint_type": record.checkpoint[0],
+                "checkpoint": record.checkpoint[1],
+                "metadata_type": record.metadata[0],
+                "metadata": record.metadata[1],
+                "writes": writes,
+                "parent_sends": [{"type": t, "value": v} for t, v in record.parent_sends],
+                "updated_at": datetime.utcnow(),
+            }},
+            upsert=True,
+        )
+
+    async def delete_thread(self, thread_id: str) -> None:
+        await AgentCheckpoint.find({"thread_id": thread_id}).delete()
+
+
+class TieredCheckpointSaver(BaseCheckpointSaver[str]):
+    """
+    LangGraph checkpointer with an LRU/TTL-bounded hot tier and an optional cold store.
+
+    Args:
+        max_threads: Maximum number of thread/namespace entries kept in memory
+        ttl_seconds: Idle time after which an entry is dropped from memory
+        cold_store: Persistent store used for write-behind and hot misses (None to disable)
+    """
+
+    def __init__(
+        self,
+        max_threads: int = 512,
+        ttl_seconds: float = 1800,
+        cold_store: Optional[MongoCheckpointStore] = None,
+        **kwargs: Any,
+    ):
+        super().__init__(**kwargs)
+        self.max_threads = max_threads
+        self.ttl_seconds = ttl_seconds
+        self.cold_store = cold_store
+        self._records: "OrderedDict[ThreadKey, CheckpointRecord]" = OrderedDict()
+        # Evicted entries that have not reached the cold store yet
+        self._unflushed: Dict[ThreadKey, CheckpointRecord] = {}
+        self._dirty: set[ThreadKey] = set()
+        self._flush_task: Optional[asyncio.Task] = None
+        # Threads with a cold-store save in progress, and those of them deleted meanwhile
+        self._saving: Counter = Counter()
+        self._deleted_while_saving: set[str] = set()
+        self._stats = {
+            "hot_hits": 0,
+            "cold_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "cold_writes": 0,
+            "cold_write_errors": 0,
+        }
+
+    # Versions are the same random-suffixed strings MemorySaver uses
+    get_next_version = InMemorySaver.get_next_version
+
+    # -- serialization -------------------------------------------------------
+
+    def _pack(self, obj: Any) -> TypedBlob:
+        type_, data = self.serde.dumps_typed(obj)
+        if len(data) > COMPRESSION_THRESHOLD_BYTES:
+            return type_ + ZLIB_SUFFIX, zlib.compress(data, 1)
+        return type_, data
+
+    def _unpack(self, blob: TypedBlob) -> Any:
+        type_, data = blob
+        if type_.endswith(ZLIB_SUFFIX):
+            type_, data = type_[:-len(ZLIB_SUFFIX)], zlib.decompress(data)
+        return self.serde.loads_typed((type_, data))
+
+    # -- hot tier ------------------------------------------------------------
+
+    @staticmethod
+    def _key(config: RunnableConfig) -> ThreadKey:
+        configurable = config["configurable"]
+        return configurable["thread_id"], configurable.get("checkpoint_ns", "")
+
+    def _get_hot(self, key: ThreadKey) -> Optional[CheckpointRecord]:
+        record = self._records.get(key)
+        if record is None:
+            return self._unflushed.get(key)
+        if time.monotonic() - record.last_access > self.ttl_seconds:
+            self._drop(key, expired=True)
+            return self._unflushed.get(key)
+        record.last_access = time.monotonic()
+        self._records.move_to_end(key)
+        return record
+
+    def _set_hot(self, record: CheckpointRecord) -> None:
+        key = (record.thread_id, record.checkpoint_ns)
+        record.last_access = time.monotonic()
+        self._records[key] = record
+        self._records.move_to_end(key)
+        self._unflushed.pop(key, None)
+        self._evict()
+
+    def _drop(self, key: ThreadKey, expired: bool = False) -> None:
+        record = self._records.pop(key)
+        self._stats["expirations" if expired else "evictions"] += 1
+        if key in self._dirty:
+            self._unflushed[key] = record
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        # Entries are in LRU order, so expired ones sit at the front
+        while self._records:
+            key, record = next(iter(self._records.items()))
+            if now - record.last_access > self.ttl_seconds:
+                self._drop(key, expired=True)
+            elif len(self._records) > self.max_threads:
+                self._drop(key)
+            else:
+                break
+
+    async def _aget_record(self, key: ThreadKey, track: bool = True) -> Optional[CheckpointRecord]:
+        record = self._get_hot(key)
+        if record is not None:
+            if track:
+                self._stats["hot_hits"] += 1
+            return record
+        if self.cold_store is not None:
+            record = await self.cold_store.load(key)
+            if record is not None:
+                if track:
+                    self._stats["cold_hits"] += 1
+                self._set_hot(record)
+                return record
+        if track:
+            self._stats["misses"] += 1
+        return None
+
+    # -- cold tier write-behind ----------------------------------------------
+
+    def _mark_dirty(self, key: ThreadKey) -> None:
+        if self.cold_store is None:
+            return
+        self._dirty.add(key)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # No loop (sync caller); picked up by the next flush
+            return
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = loop.create_task(self._flush_dirty())
+
+    async def _flush_dirty(self) -> None:
+        while self._dirty:
+            keys = list(self._dirty)
+            self._dirty.clear()
+            for key in keys:
+                record = self._records.get(key) or self._unflushed.get(key)
+                if record is None:
+                    continue
+                self._saving[key[0]] += 1
+                try:
+                    await self.cold_store.save(record)
+                    self._stats["cold_writes"] += 1
+                except Exception as e:
+                    self._stats["cold_write_errors"] += 1
+                    print(f"Error persisting checkpoint for thread {key[0]}: {e}")
+                finally:
+                    await self._finish_save(key[0])
+                if key not in self._dirty:
+                    self._unflushed.pop(key, None)
+
+    async def _finish_save(self, thread_id: str) -> None:
+        """
+        After a save: if the thread was deleted while it was in flight, the save may have
+        landed after the delete and brought the checkpoint back, so delete it again.
+        Checkpoints the thread got after the deletion are saved again afterwards.
+        """
+        self._saving[thread_id] -= 1
+        if not self._saving[thread_id]:
+            del self._saving[thread_id]
+        if thread_id in self._deleted_while_saving:
+            if thread_id not in self._saving:
+                self._deleted_while_saving.discard(thread_id)
+            try:
+                await self.cold_store.delete_thread(thread_id)
+            except Exception as e:
+                self._stats["cold_write_errors"] += 1
+                print(f"Error deleting checkpoint of thread {thread_id}: {e}")
+            self._dirty.update(k for k in [*self._records, *self._unflushed] if k[0] == thread_id)
+
+    async def aflush(self) -> None:
+        """Persist every pending checkpoint to the cold store (e.g. on shutdown)."""
+        if self._flush_task is not None and not self._flush_task.done():
+            await self._flush_task
+        if self.cold_store is not None:
+            await self._flush_dirty()
+
+    # -- tuple building ------------------------------------------------------
+
+    def _to_tuple(self, record: CheckpointRecord) -> CheckpointTuple:
+        checkpoint: Checkpoint = self._unpack(record.checkpoint)
+        parent_config = None
+        if record.parent_checkpoint_id:
+            parent_config = {"configurable": {
+                "thread_id": record.thread_id,
+                "checkpoint_ns": record.checkpoint_ns,
+                "checkpoint_id": record.parent_checkpoint_id,
+            }}
+        return CheckpointTuple(
+            config={"configurable": {
+                "thread_id": record.thread_id,
+                "checkpoint_ns": record.checkpoint_ns,
+                "checkpoint_id": record.checkpoint_id,
+            }},
+            checkpoint={
+                **checkpoint,
+                "pending_sends": [self._unpack(s) for s in record.parent_sends],
+            },
+            metadata=self._unpack(record.metadata),
+            parent_config=parent_config,
+            pending_writes=[
+                (task_id, channel, self._unpack(value))
+                for task_id, channel, value, _ in record.writes.values()
+            ],
+        )
+
+    def _match(self, record: Optional[CheckpointRecord], config: RunnableConfig) -> Optional[CheckpointTuple]:
+        if record is None:
+            return None
+        checkpoint_id = get_checkpoint_id(config)
+        if checkpoint_id and checkpoint_id != record.checkpoint_id:
+            return None
+        return self._to_tuple(record)
+
+    def _build_record(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        previous: Optional[CheckpointRecord],
+    ) -> CheckpointRecord:
+        thread_id, checkpoint_ns = self._key(config)
+        parent_checkpoint_id = config["configurable"].get("checkpoint_id")
+        parent_sends: List[TypedBlob] = []
+        if previous is not None and parent_checkpoint_id and previous.checkpoint_id == parent_checkpoint_id:
+            sends = sorted(
+                ((*w, k[1]) for k, w in previous.writes.items() if w[1] == TASKS),
+                key=lambda w: (w[3], w[0], w[4]),
+            )
+            parent_sends = [s[2] for s in sends]
+
+        c = checkpoint.copy()
+        c.pop("pending_sends", None)  # type: ignore[misc]
+        return CheckpointRecord(
+            thread_id=thread_id,
+            checkpoint_ns=checkpoint_ns,
+            checkpoint_id=checkpoint["id"],
+            parent_checkpoint_id=parent_checkpoint_id,
+            checkpoint=self._pack(c),
+            metadata=self._pack(get_checkpoint_metadata(config, metadata)),
+            parent_sends=parent_sends,
+        )
+
+    @staticmethod
+    def _saved_config(record: CheckpointRecord) -> RunnableConfig:
+        return {"configurable": {
+            "thread_id": record.thread_id,
+            "checkpoint_ns": record.checkpoint_ns,
+            "checkpoint_id": record.checkpoint_id,
+        }}
+
+    def _apply_writes(
+        self,
+        record: CheckpointRecord,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str,
+    ) -> None:
+        existing = dict(record.writes)
+        for idx, (channel, value) in enumerate(writes):
+            inner_key = (task_id, WRITES_IDX_MAP.get(channel, idx))
+            if inner_key[1] >= 0 and inner_key in existing:
+                continue
+            record.writes[inner_key] = (task_id, channel, self._pack(value), task_path)
+
+    # -- BaseCheckpointSaver API ---------------------------------------------
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        key = self._key(config)
+        record = self._get_hot(key)
+        self._stats["hot_hits" if record is not None else "misses"] += 1
+        return self._match(record, config)
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return self._match(await self._aget_record(self._key(config)), config)
+
+    def _list(
+        self,
+        records: List[CheckpointRecord],
+        config: Optional[RunnableConfig],
+        filter: Optional[Dict[str, Any]],
+        before: Optional[RunnableConfig],
+        limit: Optional[int],
+    ) -> Iterator[CheckpointTuple]:
+        for record in records:
+            if limit is not None and limit <= 0:
+                break
+            if config and (checkpoint_id := get_checkpoint_id(config)) and checkpoint_id != record.checkpoint_id:
+                continue
+            if before and (before_id := get_checkpoint_id(before)) and record.checkpoint_id >= before_id:
+                continue
+            if filter:
+                metadata = self._unpack(record.metadata)
+                if not all(metadata.get(k) == v for k, v in filter.items()):
+                    continue
+            if limit is not None:
+                limit -= 1
+            yield self._to_tuple(record)
+
+    def _candidates(self, config: Optional[RunnableConfig]) -> List[CheckpointRecord]:
+        if not config:
+            return list(self._records.values())
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns")
+        return [
+            r for (t, ns), r in self._records.items()
+            if t == thread_id and (checkpoint_ns is None or ns == checkpoint_ns)
+        ]
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        yield from self._list(self._candidates(config), config, filter, before, limit)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        records = self._candidates(config)
+        if config and not records:
+            record = await self._aget_record(self._key(config))
+            records = [record] if record else []
+        for item in self._list(records, config, filter, before, limit):
+            yield item
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        key = self._key(config)
+        record = self._build_record(config, checkpoint, metadata, self._get_hot(key))
+        self._set_hot(record)
+        self._mark_dirty(key)
+        return self._saved_config(record)
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        key = self._key(config)
+        previous = await self._aget_record(key, track=False)
+        record = self._build_record(config, checkpoint, metadata, previous)
+        self._set_hot(record)
+        self._mark_dirty(key)
+        return self._saved_config(record)
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        key = self._key(config)
+        record = self._get_hot(key)
+        if record is None or record.checkpoint_id != config["configurable"]["checkpoint_id"]:
+            return
+        self._apply_writes(record, writes, task_id, task_path)
+        self._mark_dirty(key)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        key = self._key(config)
+        record = await self._aget_record(key, track=False)
+        if record is None or record.checkpoint_id != config["configurable"]["checkpoint_id"]:
+            return
+        self._apply_writes(record, writes, task_id, task_path)
+        self._mark_dirty(key)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        """Drop every checkpoint of a thread from both tiers."""
+        for key in [k for k in self._records if k[0] == thread_id]:
+            del self._records[key]
+        for key in [k for k in self._unflushed if k[0] == thread_id]:
+            del self._unflushed[key]
+        self._dirty = {k for k in self._dirty if k[0] != thread_id}
+        if self.cold_store is not None:
+            if thread_id in self._saving:
+                # The save in flight is undone once it completes (see `_finish_save`)
+                self._deleted_while_saving.add(thread_id)
+            await self.cold_store.delete_thread(thread_id)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._stats["hot_hits"] + self._stats["cold_hits"] + self._stats["misses"]
+        return {
+            **self._stats,
+            "hot_threads": len(self._records),
+            "pending_writes": len(self._dirty) + len(self._unflushed),
+            "hot_hit_rate": round(self._stats["hot_hits"] / lookups, 3) if lookups else 0.0,
+        }
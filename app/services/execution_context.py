@@ -0,0 +1,205 @@
+"""
+execution_context.py
+--------------------
+Request-scoped state for agent runs.
+
+`AgentService` is a single process-wide object shared by every request, so anything
+that belongs to one run (the user, the chat/thread, the LangGraph config and the
+messages captured for persistence) lives on an `ExecutionContext` that is created
+per request and passed through `stream()`, `run()` and `save_messages_to_db`.
+
+`AgentRunPool` bounds how many agent runs execute at once on a worker and applies
+admission control, so bursts queue briefly instead of piling up unbounded.
+`relay_until_disconnected` runs a stream in its own task so it can be cancelled as a
+whole when the client goes away; `RunCancellationStats` counts those runs and the
+tokens cancelling them saved.
+"""
+
+import asyncio
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, AsyncGenerator, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+from uuid import uuid4
+
+from models.run_history import Message as DBMessage
+
+
+@dataclass
+class ExecutionContext:
+    """Everything that belongs to a single agent run."""
+
+    user_id: str
+    chat_id: Optional[str] = None
+    run_id: str = field(default_factory=lambda: str(uuid4()))
+    config: Dict[str, Any] = field(default_factory=dict)
+    captured_messages: List[DBMessage] = field(default_factory=list)
+    started_at: datetime = field(default_factory=datetime.utcnow)
+    # Per-chat opt-out of the agent response cache
+    use_cache: bool = True
+    # Estimated LLM tokens spent by this run so far
+    tokens_used: int = 0
+
+    def __post_init__(self):
+        if not self.config:
+            # Fall back to the run id so runs without a chat never share a thread
+            thread_id = self.chat_id or self.run_id
+            self.config = {"configurable": {"thread_id": thread_id}}
+
+    @property
+    def thread_id(self) -> str:
+        return self.config["configurable"]["thread_id"]
+
+    def capture(self, message: DBMessage) -> None:
+        """Buffer a message for persistence at the end of the run."""
+        self.captured_messages.append(message)
+
+
+class AgentPoolSaturatedError(Exception):
+    """Raised when a run cannot be admitted to the pool."""
+
+
+class AgentRunPool:
+    """
+    Bounded concurrency pool with admission control for agent runs.
+
+    At most `max_concurrent` runs execute at once. Up to `max_waiting` further runs may
+    wait for a slot, each for at most `admission_timeout` seconds; anything beyond that
+    is rejected with `AgentPoolSaturatedError` so the endpoint can answer 503 right away.
+    """
+
+    def __init__(self, max_concurrent: int = 32, max_waiting: int = 64, admission_timeout: float = 10.0):
+        self.max_concurrent = max_concurrent
+        self.max_waiting = max_waiting
+        self.admission_timeout = admission_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._active = 0
+        self._waiting = 0
+        self._admitted = 0
+        self._rejected = 0
+
+    async def acquire(self) -> None:
+        """Wait for a free slot or raise `AgentPoolSaturatedError`."""
+        if self._semaphore.locked() and self._waiting >= self.max_waiting:
+            self._rejected += 1
+            raise AgentPoolSaturatedError(
+                f"Agent pool saturated ({self._active} running, {self._waiting} waiting)")
+
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.admission_timeout)
+        except asyncio.TimeoutError:
+            self._rejected += 1
+            raise AgentPoolSaturatedError(
+                f"Timed out after {self.admission_timeout}s waiting for an agent slot")
+        finally:
+            self._waiting -= 1
+
+        self._active += 1
+        self._admitted += 1
+
+    def release(self) -> None:
+        self._active -= 1
+        self._semaphore.release()
+
+    async def hold(self, generator: AsyncIterator[Any]) -> AsyncGenerator[Any, None]:
+        """
+        Relay an already admitted stream and release its slot once the stream ends.
+
+        `acquire()` must have been awaited beforehand, so that admission errors surface
+        before the streaming response is started.
+        """
+        try:
+            async for item in generator:
+                yield item
+        finally:
+            self.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_waiting": self.max_waiting,
+            "active": self._active,
+            "waiting": self._waiting,
+            "admitted": self._admitted,
+            "rejected": self._rejected,
+        }
+
+
+async def relay_until_disconnected(
+    events: AsyncIterator[Any],
+    is_disconnected: Callable[[], Awaitable[bool]],
+    poll_interval: float = 1.0,
+) -> AsyncGenerator[Any, None]:
+    """
+    Consume `events` in a separate task and relay its items.
+
+    When the response stops (Starlette cancels it on disconnect) or `is_disconnected()`
+    reports the client gone between items, the task is cancelled. Cancellation reaches
+    the agent graph and its running tool calls, and the stream's own cancellation
+    handling runs in a plain task, outside the response's cancel scope.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    finished = object()
+
+    async def produce() -> None:
+        try:
+            async for item in events:
+                queue.put_nowait(item)
+        finally:
+            queue.put_nowait(finished)
+
+    def report(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Error in relayed stream: {task.exception()}")
+
+    producer = asyncio.create_task(produce())
+    producer.add_done_callback(report)
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout=poll_interval)
+            except asyncio.TimeoutError:
+                if await is_disconnected():
+                    break
+                continue
+            if item is finished:
+                break
+            yield item
+    finally:
+        if not producer.done():
+            producer.cancel()
+
+
+class RunCancellationStats:
+    """
+    Counts completed and cancelled runs.
+
+    The tokens saved by a cancellation are estimated as the average tokens of a
+    completed run minus what the cancelled run had already spent.
+    """
+
+    def __init__(self):
+        self.completed = 0
+        self.completed_tokens = 0
+        self.cancelled = 0
+        self.tokens_saved = 0
+
+    def record_completed(self, tokens: int) -> None:
+        self.completed += 1
+        self.completed_tokens += tokens
+
+    def record_cancelled(self, tokens_used: int) -> int:
+        """Count a cancelled run and return the estimated tokens it saved."""
+        self.cancelled += 1
+        average = self.completed_tokens // self.completed if self.completed else 0
+        saved = max(0, average - tokens_used)
+        self.tokens_saved += saved
+        return saved
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "completed": self.completed,
+            "cancelled": self.cancelled,
+            "avg_tokens_per_run": self.completed_tokens // self.completed if self.completed else 0,
+            "estimated_tokens_saved": self.tokens_saved,
+        }
@@ -0,0 +1,443 @@
+"""
+mcp_pool.py
+-----------
+Managed pool of MCP server processes behind the agent's MCP tools.
+
+`MultiServerMCPClient` starts one stdio process per server during startup and routes
+every call through that single pipe, so a slow or hung server stalls all chats using
+it. `MCPProcessPool` instead keeps up to `workers` processes per server:
+
+- processes start lazily on the first tool call routed to the server, and another one
+  only when all running workers are busy;
+- calls are dispatched round-robin over ready workers, at most
+  `max_calls_per_worker` at a time each; further calls wait in a per-server queue;
+- a health check pings every running worker, and workers that crashed, failed a ping
+  or timed out on a call are stopped and restarted;
+- tool schemas are cached in a manifest file, so the agent can be built without
+  spawning any server; the manifest is refreshed when a server's entry file changes.
+
+Each worker owns its process from a dedicated task, so the anyio cancel scopes of the
+stdio transport are always entered and exited in the same task.
+"""
+
+import asyncio
+import json
+import os
+import time
+from contextlib import AsyncExitStack
+from typing import Any, Dict, List, Optional, Set
+
+from langchain_core.tools import BaseTool
+from langchain_mcp_adapters.tools import convert_mcp_tool_to_langchain_tool
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.sse import sse_client
+from mcp.client.stdio import stdio_client
+from mcp.types import Tool as MCPTool
+
+# Grace period for a worker to exit cleanly before its task is cancelled (killing the process)
+STOP_GRACE_SECONDS = 5.0
+
+
+class MCPWorkerError(Exception):
+    """Raised when no MCP worker can serve a call."""
+
+
+class MCPWorker:
+    """One MCP server process (or SSE connection) and its client session."""
+
+    def __init__(self, server_name: str, index: int, connection: Dict[str, Any]):
+        self.server_name = server_name
+        self.index = index
+        self.connection = connection
+        self.session: Optional[ClientSession] = None
+        self.in_flight = 0
+        self.calls = 0
+        self.failures = 0
+        self.started_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._ready: Optional[asyncio.Event] = None
+        self._stop: Optional[asyncio.Event] = None
+        self._error: Optional[BaseException] = None
+        self.starting = False
+        self.restarting = False
+
+    @property
+    def name(self) -> str:
+        return f"{self.server_name}#{self.index}"
+
+    @property
+    def spawned(self) -> bool:
+        """True once started and until stopped, even if the process has since exited."""
+        return self._task is not None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def ready(self) -> bool:
+        return self.running and self.session is not None
+
+    async def start(self, timeout: float) -> None:
+        """Spawn the server and wait until its session is initialized."""
+        self._ready = asyncio.Event()
+        self._stop = asyncio.Event()
+        self._error = None
+        self.starting = True
+        self._task = asyncio.create_task(self._serve(), name=f"mcp-worker-{self.name}")
+
+        ready_wait = asyncio.create_task(self._ready.wait())
+        try:
+            await asyncio.wait({ready_wait, self._task}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            ready_wait.cancel()
+            self.starting = False
+
+        if not self.ready:
+            error = self._error
+            await self.stop(grace=0)
+            raise MCPWorkerError(
+                f"MCP worker {self.name} failed to start: {error or f'timed out after {timeout}s'}")
+        self.started_at = time.monotonic()
+
+    async def _serve(self) -> None:
+        try:
+            async with AsyncExitStack() as stack:
+                if self.connection.get("transport", "stdio") == "sse":
+                    read, write = await stack.enter_async_context(sse_client(
+                        self.connection["url"], self.connection.get("headers")))
+                else:
+                    read, write = await stack.enter_async_context(stdio_client(StdioServerParameters(
+                        command=self.connection["command"],
+                        args=self.connection["args"],
+                        env=self.connection.get("env"),
+                    )))
+                session = await stack.enter_async_context(ClientSession(read, write))
+                await session.initialize()
+                self.session = session
+                self._ready.set()
+                await self._stop.wait()
+        except Exception as e:
+            self._error = e
+            print(f"MCP worker {self.name} exited with error: {e}")
+        finally:
+            self.session = None
+
+    async def stop(self, grace: float = STOP_GRACE_SECONDS) -> None:
+        """Close the session and the process; kill it if it does not exit within `grace` seconds."""
+        task = self._task
+        if task is None:
+            return
+        self._stop.set()
+        try:
+            await asyncio.wait_for(asyncio.shield(task), timeout=grace)
+        except asyncio.TimeoutError:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        self._task = None
+        self.session = None
+
+    async def call_tool(self, tool_name: str, arguments: Dict[str, Any], timeout: float):
+        self.in_flight += 1
+        self.calls += 1
+        try:
+            return await asyncio.wait_for(self.session.call_tool(tool_name, arguments), timeout=timeout)
+        finally:
+            self.in_flight -= 1
+
+    async def ping(self, timeout: float) -> None:
+        await asyncio.wait_for(self.session.send_ping(), timeout=timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "worker": self.name,
+            "ready": self.ready,
+            "in_flight": self.in_flight,
+            "calls": self.calls,
+            "failures": self.failures,
+            "uptime": round(time.monotonic() - self.started_at, 1) if self.ready and self.started_at else None,
+        }
+
+
+class MCPServerPool:
+    """Workers of one MCP server, with lazy start and round-robin dispatch."""
+
+    def __init__(
+        self,
+        server_name: str,
+        connection: Dict[str, Any],
+        workers: int = 2,
+        max_calls_per_worker: int = 1,
+        call_timeout: float = 60.0,
+        start_timeout: float = 30.0,
+    ):
+        self.server_name = server_name
+        self.connection = connection
+        self.workers = [MCPWorker(server_name, i, connection) for i in range(max(1, workers))]
+        self.max_calls_per_worker = max_calls_per_worker
+        self.call_timeout = call_timeout
+        self.start_timeout = start_timeout
+        self._slots = asyncio.Semaphore(len(self.workers) * max_calls_per_worker)
+        self._start_lock = asyncio.Lock()
+        self._restart_tasks: Set[asyncio.Task] = set()
+        self._next = 0
+        self._queued = 0
+        self._restarts = 0
+        self._timeouts = 0
+        self._errors = 0
+
+    async def _pick_worker(self) -> MCPWorker:
+        """Round-robin over ready workers with spare capacity, starting one if none has any."""
+        count = len(self.workers)
+        for offset in range(count):
+            worker = self.workers[(self._next + offset) % count]
+            if worker.ready and worker.in_flight < self.max_calls_per_worker:
+                self._next = (self._next + offset + 1) % count
+                return worker
+
+        async with self._start_lock:
+            # Another call may have started a worker while we waited for the lock
+            for worker in self.workers:
+                if worker.ready and worker.in_flight < self.max_calls_per_worker:
+                    return worker
+            for worker in self.workers:
+                if not worker.running:
+                    print(f"Starting MCP worker {worker.name}")
+                    await worker.start(self.start_timeout)
+                    return worker
+        raise MCPWorkerError(f"No MCP worker available for {self.server_name}")
+
+    async def call_tool(self, tool_name: str, arguments: Dict[str, Any]):
+        self._queued += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self._queued -= 1
+
+        try:
+            worker = await self._pick_worker()
+            try:
+                return await worker.call_tool(tool_name, arguments, self.call_timeout)
+            except asyncio.TimeoutError:
+                self._timeouts += 1
+                worker.failures += 1
+                # A hung server would stall every later call routed to it
+                self.restart(worker, f"{tool_name} timed out after {self.call_timeout}s")
+                raise MCPWorkerError(
+                    f"MCP tool {tool_name} on {worker.name} timed out after {self.call_timeout}s")
+            except Exception:
+                self._errors += 1
+                worker.failures += 1
+                if not worker.ready:
+                    self.restart(worker, "worker exited during a call")
+                raise
+        finally:
+            self._slots.release()
+
+    def restart(self, worker: MCPWorker, reason: str) -> None:
+        """Stop and start the worker again in the background."""
+        if worker.restarting:
+            return
+        print(f"Restarting MCP worker {worker.name}: {reason}")
+        worker.restarting = True
+        self._restarts += 1
+        task = asyncio.create_task(self._restart(worker))
+        self._restart_tasks.add(task)
+        task.add_done_callback(self._restart_tasks.discard)
+
+    async def _restart(self, worker: MCPWorker) -> None:
+        try:
+            async with self._start_lock:
+                await worker.stop()
+                await worker.start(self.start_timeout)
+        except Exception as e:
+            print(f"Error restarting MCP worker {worker.name}: {e}")
+        finally:
+            worker.restarting = False
+
+    async def check_health(self, ping_timeout: float) -> None:
+        for worker in self.workers:
+            if not worker.spawned or worker.starting or worker.restarting:
+                continue
+            if not worker.ready:
+                worker.failures += 1
+                self.restart(worker, "process exited")
+                continue
+            if worker.in_flight:
+                # Busy workers are covered by the call timeout
+                continue
+            try:
+                await worker.ping(ping_timeout)
+            except Exception as e:
+                worker.failures += 1
+                self.restart(worker, f"ping failed: {str(e) or 'timed out'}")
+
+    async def list_tools(self):
+        worker = await self._pick_worker()
+        result = await asyncio.wait_for(worker.session.list_tools(), timeout=self.call_timeout)
+        return result.tools
+
+    async def aclose(self) -> None:
+        for task in list(self._restart_tasks):
+            task.cancel()
+        await asyncio.gather(*self._restart_tasks, return_exceptions=True)
+        await asyncio.gather(*(worker.stop() for worker in self.workers), return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": [worker.stats() for worker in self.workers],
+            "ready": sum(1 for worker in self.workers if worker.ready),
+            "in_flight": sum(worker.in_flight for worker in self.workers),
+            "queue_depth": self._queued,
+            "restarts": self._restarts,
+            "timeouts": self._timeouts,
+            "errors": self._errors,
+        }
+
+
+class MCPProcessPool:
+    """
+    Pool of MCP servers exposed to the agent as LangChain tools.
+
+    Args:
+        connections: Same server configs as `MultiServerMCPClient`; a server may set
+            `workers` to override `workers_per_server` (e.g. 1 for stateful servers)
+        workers_per_server: Maximum number of processes per server
+        max_calls_per_worker: Concurrent calls sent down one worker's pipe
+        call_timeout: Seconds before a tool call is abandoned and its worker restarted
+        start_timeout: Seconds a server gets to start and initialize its session
+        health_interval: Seconds between liveness checks (0 disables them)
+        ping_timeout: Seconds a worker gets to answer a ping
+        manifest_path: JSON file caching tool schemas between restarts
+    """
+
+    def __init__(
+        self,
+        connections: Dict[str, Dict[str, Any]],
+        workers_per_server: int = 2,
+        max_calls_per_worker: int = 1,
+        call_timeout: float = 60.0,
+        start_timeout: float = 30.0,
+        health_interval: float = 30.0,
+        ping_timeout: float = 5.0,
+        manifest_path: Optional[str] = None,
+    ):
+        self.servers = {
+            name: MCPServerPool(
+                name,
+                connection,
+                workers=connection.get("workers", workers_per_server),
+                max_calls_per_worker=max_calls_per_worker,
+                call_timeout=call_timeout,
+                start_timeout=start_timeout,
+            )
+            for name, connection in connections.items()
+        }
+        self.health_interval = health_interval
+        self.ping_timeout = ping_timeout
+        self.manifest_path = manifest_path
+        self._health_task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _fingerprint(connection: Dict[str, Any]) -> str:
+        if connection.get("transport", "stdio") == "sse":
+            return connection["url"]
+        parts = [connection["command"], *connection["args"]]
+        entry = connection["args"][0] if connection["args"] else None
+        if entry and os.path.exists(entry):
+            parts.append(str(os.path.getmtime(entry)))
+        return "\x1f".join(parts)
+
+    def _read_manifest(self) -> Dict[str, Any]:
+        if not self.manifest_path or not os.path.exists(self.manifest_path):
+            return {}
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Error reading MCP tool manifest: {e}")
+            return {}
+
+    def _write_manifest(self, manifest: Dict[str, Any]) -> None:
+        if not self.manifest_path:
+            return
+        try:
+            tmp_path = f"{self.manifest_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+            os.replace(tmp_path, self.manifest_path)
+        except Exception as e:
+            print(f"Error writing MCP tool manifest: {e}")
+
+    async def get_tools(self) -> List[BaseTool]:
+        """
+        Build LangChain tools for every server.
+
+        Schemas come from the manifest when it matches the server's current build;
+        otherwise one worker is started to list them (and stays up for later calls).
+        """
+        manifest = self._read_manifest()
+        fingerprints = {name: self._fingerprint(server.connection) for name, server in self.servers.items()}
+        stale = [
+            name for name in self.servers
+            if manifest.get(name, {}).get("fingerprint") != fingerprints[name]
+        ]
+
+        # Servers missing from the manifest are started and listed concurrently
+        listed = await asyncio.gather(
+            *(self.servers[name].list_tools() for name in stale), return_exceptions=True)
+        for name, result in zip(stale, listed):
+            if isinstance(result, BaseException):
+                print(f"Error loading tools from MCP server {name}: {result}")
+                manifest.pop(name, None)
+                continue
+            manifest[name] = {
+                "fingerprint": fingerprints[name],
+                "tools": [
+                    {"name": t.name, "description": t.description or "", "input_schema": t.inputSchema}
+                    for t in result
+                ],
+            }
+        if stale:
+            self._write_manifest(manifest)
+
+        tools: List[BaseTool] = []
+        for name in self.servers:
+            if name in manifest:
+                tools.extend(self._make_tool(name, spec) for spec in manifest[name]["tools"])
+        return tools
+
+    def _make_tool(self, server_name: str, spec: Dict[str, Any]) -> BaseTool:
+        # The server stands in for the adapter's client session: it only needs `call_tool`
+        return convert_mcp_tool_to_langchain_tool(
+            self.servers[server_name],
+            MCPTool(name=spec["name"], description=spec["description"], inputSchema=spec["input_schema"]),
+        )
+
+    def start_health_checks(self) -> None:
+        if self.health_interval > 0 and self._health_task is None:
+            self._health_task = asyncio.create_task(self._health_loop(), name="mcp-health-check")
+
+    async def _health_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.health_interval)
+            for server in self.servers.values():
+                try:
+                    await server.check_health(self.ping_timeout)
+                except Exception as e:
+                    print(f"Error checking MCP server {server.server_name}: {e}")
+
+    async def aclose(self) -> None:
+        if self._health_task is not None:
+            self._health_task.cancel()
+            await asyncio.gather(self._health_task, return_exceptions=True)
+            self._health_task = None
+        await asyncio.gather(*(server.aclose() for server in self.servers.values()), return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        servers = {name: server.stats() for name, server in self.servers.items()}
+        return {
+            "servers": servers,
+            "queue_depth": sum(s["queue_depth"] for s in servers.values()),
+            "in_flight": sum(s["in_flight"] for s in servers.values()),
+        }
@@ -0,0 +1,279 @@
+"""
+message_queue.py
+----------------
+Write-behind persistence of chat messages.
+
+`save_messages_to_db` used to `find_one` the whole `ChatSession` and `save()` it back on
+every turn, on the streaming path. `MessageWriteQueue` replaces that with appends to
+the bucketed message store (see `message_store`):
+
+- "buffered" mode: appends are queued in memory, coalesced per chat and written
+  together when `max_batch` messages are pending or `flush_interval` seconds have
+  passed (one session update per chat, one `bulk_write` for all buckets). The request
+  does not wait for Mongo.
+- "sync" mode: the append is written right away and awaited.
+
+New chats are created by their first append. Appends to existing chats never create a
+session, so a chat_id owned by another user is never written to. Listeners added with
+`add_listener()` are called with (chat_id, user_id) once an append is stored and
+counted. `aclose()` flushes whatever is pending and is called from the app lifespan on
+shutdown.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config import settings
+from models.run_history import ChatSession, Message as DBMessage
+from services import message_store
+from services.analytics_cache import analytics_cache
+from services.analytics_rollups import RollupBatch
+
+# Batches that keep failing are dropped after this many attempts
+MAX_FLUSH_ATTEMPTS = 3
+
+
+@dataclass
+class PendingAppend:
+    chat_id: str
+    user_id: str
+    messages: List[Dict[str, Any]] = field(default_factory=list)
+    updated_at: Optional[datetime] = None
+    # Fields of a chat that does not exist yet (inserted on the first flush)
+    create: Optional[Dict[str, Any]] = None
+    # Index of the first message once reserved on the session (kept across retries)
+    start: Optional[int] = None
+    created: bool = False
+    missing: bool = False
+    # Whether the messages were counted on the session (see `message_store.publish`)
+    published: bool = False
+    attempts: int = 0
+
+
+class MessageWriteQueue:
+    """
+    In-process write-behind queue for chat message appends.
+
+    Args:
+        mode: "buffered" (write-behind) or "sync" (write through, awaited)
+        max_batch: Pending messages that trigger a flush
+        flush_interval: Maximum seconds an append waits in the queue
+    """
+
+    def __init__(self, mode: str = "buffered", max_batch: int = 200, flush_interval: float = 0.5):
+        if mode not in ("buffered", "sync"):
+            raise ValueError(f"Unsupported message write mode: {mode}")
+        self.mode = mode
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._pending: "OrderedDict[Tuple[str, str], PendingAppend]" = OrderedDict()
+        # Failed appends, written before newer ones on the next flush
+        self._retry: List[PendingAppend] = []
+        self._pending_messages = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self._closed = False
+        self._listeners: List[Callable[[str, str], None]] = []
+        self._stats = {
+            "appends": 0,
+            "messages": 0,
+            "flushes": 0,
+            "writes": 0,
+            "errors": 0,
+            "dropped": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "total_flush_ms": 0.0,
+        }
+
+    @staticmethod
+    def new_chat_fields(title: str, agent_name: str, metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """Fields written once when a chat is created by its first append."""
+        session = ChatSession(title=title, agent_name=agent_name, user_id="", metadata=metadata)
+        return session.model_dump(exclude={
+            "id", "revision_id", "chat_id", "user_id", "updated_at",
+            "message_count", "reserved_count", "role_counts", "last_message"})
+
+    def add_listener(self, listener: Callable[[str, str], None]) -> None:
+        """Call `listener(chat_id, user_id)` after each append to a chat is written."""
+        self._listeners.append(listener)
+
+    async def append(
+        self,
+        chat_id: str,
+        user_id: str,
+        messages: List[DBMessage],
+        create: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """Queue (or, in sync mode, write) messages to append to a chat."""
+        if not messages and not create:
+            return
+        key = (chat_id, user_id)
+        docs = [message.model_dump() for message in messages]
+        self._stats["appends"] += 1
+        self._stats["messages"] += len(docs)
+
+        if self.mode == "sync" or self._closed:
+            item = PendingAppend(chat_id, user_id, docs, datetime.utcnow(), create)
+            await self._write([item])
+            return
+
+        item = self._pending.get(key)
+        if item is None:
+            item = self._pending[key] = PendingAppend(chat_id, user_id)
+        item.messages.extend(docs)
+        item.updated_at = datetime.utcnow()
+        if create and item.create is None:
+            item.create = create
+        self._pending_messages += len(docs)
+
+        self._ensure_flusher()
+        if self._pending_messages >= self.max_batch:
+            self._wakeup.set()
+
+    def _ensure_flusher(self) -> None:
+        if self._flusher is None or self._flusher.done():
+            self._wakeup = asyncio.Event()
+            self._flusher = asyncio.create_task(self._flush_loop(), name="message-write-queue")
+
+    async def _flush_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Write everything pending in one bulk write."""
+        async with self._flush_lock:
+            if not self._pending and not self._retry:
+                return
+            batch = self._retry + list(self._pending.values())
+            self._retry = []
+            self._pending.clear()
+            self._pending_messages = 0
+            await self._write(batch)
+
+    @staticmethod
+    async def _reserve(item: PendingAppend) -> None:
+        if item.start is None and not item.missing:
+            item.start, item.created = await message_store.reserve(
+                item.chat_id, item.user_id, item.messages, item.updated_at, item.create)
+            item.missing = item.start is None
+
+    @staticmethod
+    async def _publish(item: PendingAppend) -> None:
+        if item.start is not None and not item.published:
+            await message_store.publish(item.chat_id, item.user_id, item.messages, item.updated_at)
+            item.published = True
+
+    async def _write(self, batch: List[PendingAppend]) -> None:
+        started = time.perf_counter()
+        try:
+            await asyncio.gather(*(self._reserve(item) for item in batch))
+            updates = []
+            for item in batch:
+                if item.start is not None:
+                    updates.extend(message_store.bucket_updates(
+                        item.chat_id, item.user_id, item.start, item.messages, item.updated_at))
+            await message_store.write_buckets(updates)
+            # Only once the messages can be read
+            await asyncio.gather(*(self._publish(item) for item in batch))
+        except Exception as e:
+            self._stats["errors"] += 1
+            print(f"Error writing {len(batch)} chat appends: {e}")
+            if self.mode == "sync":
+                raise
+            self._requeue(batch)
+            return
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self._stats["last_flush_ms"] = round(elapsed_ms, 2)
+            self._stats["max_flush_ms"] = round(max(self._stats["max_flush_ms"], elapsed_ms), 2)
+            self._stats["total_flush_ms"] += elapsed_ms
+            self._stats["flushes"] += 1
+
+        self._stats["writes"] += len(batch)
+        missing = sum(1 for item in batch if item.missing)
+        if missing:
+            print(f"Chat session not found for {missing} of {len(batch)} chat appends")
+        await self._update_rollups(batch)
+        self._notify(batch)
+
+    async def _update_rollups(self, batch: List[PendingAppend]) -> None:
+        """Count the written chats and messages in the analytics rollups (drift is fixed by a rebuild) and drop cached analytics."""
+        rollups = RollupBatch()
+        for item in batch:
+            if item.missing:
+                continue
+            if item.created:
+                rollups.add_chat(item.user_id, item.create.get("created_at") or item.updated_at)
+            rollups.add_messages(item.user_id, item.messages)
+        try:
+            await rollups.apply()
+        except Exception as e:
+            self._stats["errors"] += 1
+            print(f"Error updating analytics rollups: {e}")
+        for user_id in {item.user_id for item in batch if not item.missing}:
+            analytics_cache.invalidate(user_id)
+
+    def _notify(self, batch: List[PendingAppend]) -> None:
+        for item in batch:
+            if item.missing:
+                continue
+            for listener in self._listeners:
+                try:
+                    listener(item.chat_id, item.user_id)
+                except Exception as e:
+                    print(f"Error notifying about chat {item.chat_id}: {e}")
+
+    def _requeue(self, batch: List[PendingAppend]) -> None:
+        """
+        Keep a failed batch for the next flush. Appends that already reserved indexes keep
+        them, pushes that already reached their bucket are skipped when written again, and
+        appends already published are not counted twice.
+        """
+        for item in batch:
+            if item.missing:
+                continue
+            item.attempts += 1
+            if item.attempts >= MAX_FLUSH_ATTEMPTS:
+                self._stats["dropped"] += len(item.messages)
+                print(f"Dropping {len(item.messages)} messages for chat {item.chat_id} after {item.attempts} attempts")
+                continue
+            self._retry.append(item)
+            self._pending_messages += len(item.messages)
+
+    async def aclose(self) -> None:
+        """Stop the background flusher and write everything still pending."""
+        self._closed = True
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        flushes = self._stats["flushes"]
+        return {
+            **{k: v for k, v in self._stats.items() if k != "total_flush_ms"},
+            "mode": self.mode,
+            "queue_depth": self._pending_messages,
+            "pending_chats": len(self._pending) + len(self._retry),
+            "avg_flush_ms": round(self._stats["total_flush_ms"] / flushes, 2) if flushes else 0.0,
+        }
+
+
+# Shared by every writer in the process; flushed by the app lifespan on shutdown
+message_write_queue = MessageWriteQueue(
+    mode=settings.MESSAGE_WRITE_MODE,
+    max_batch=settings.MESSAGE_WRITE_MAX_BATCH,
+    flush_interval=settings.MESSAGE_WRITE_FLUSH_INTERVAL_SECONDS,
+)
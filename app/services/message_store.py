@@ -0,0 +1,203 @@
+"""
+message_store.py
+----------------
+Bucketed, append-only storage of chat messages.
+
+Messages are not embedded in `ChatSession`. The messages of a chat are numbered from 0
+and stored in `MessageBucket` documents of `BUCKET_SIZE` consecutive messages, keyed by
+(chat_id, seq). An append:
+
+1. reserves its index range on the session with one `$inc` of `reserved_count` (and
+   creates the session when `create` fields are given);
+2. `$push`es the messages into the bucket(s) covering that range, creating them by
+   upsert. The push sorts by index, so concurrent appends stay in order, and it only
+   applies if the bucket does not hold its first index yet, so a batch retried after a
+   partly failed write does not store any message twice;
+3. publishes the messages by updating the session's `message_count`, `role_counts`
+   and `last_message`. Readers (chat pages, history hydration, the summarizer) go by
+   `message_count`, so they never see a count that includes messages not yet in their
+   buckets.
+
+Both steps touch small documents whatever the length of the chat, and reads of a chat's
+tail only fetch the last bucket or two.
+"""
+
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from models.run_history import ChatSession, MessageBucket
+
+BUCKET_SIZE = 100
+
+DUPLICATE_KEY = 11000
+
+
+async def reserve(
+    chat_id: str,
+    user_id: str,
+    docs: List[Dict[str, Any]],
+    updated_at: datetime,
+    create: Optional[Dict[str, Any]] = None,
+) -> Tuple[Optional[int], bool]:
+    """
+    Reserve indexes for `docs` on the chat session (they are counted by `publish`).
+
+    Returns:
+        Tuple containing:
+        - The index of the first message, or None if the chat does not exist for this
+          user (and `create` was not given)
+        - Whether the session was created by this call
+    """
+    update: Dict[str, Any] = {
+        "$inc": {"reserved_count": len(docs)},
+        "$set": {"updated_at": updated_at},
+    }
+    if create:
+        update["$setOnInsert"] = create
+    before = await ChatSession.get_motor_collection().find_one_and_update(
+        {"chat_id": chat_id, "user_id": user_id},
+        update,
+        projection={"_id": 0, "chat_id": 1, "reserved_count": 1},
+        upsert=create is not None,
+        return_document=ReturnDocument.BEFORE,
+    )
+    if before is None:
+        return (0, True) if create is not None else (None, False)
+    return before.get("reserved_count") or 0, False
+
+
+async def publish(chat_id: str, user_id: str, docs: List[Dict[str, Any]], updated_at: datetime) -> None:
+    """Count stored messages on the chat session, making them visible to readers."""
+    if not docs:
+        return
+    roles = Counter(doc.get("role", "unknown") for doc in docs)
+    await ChatSession.get_motor_collection().update_one(
+        {"chat_id": chat_id, "user_id": user_id},
+        {
+            "$inc": {"message_count": len(docs), **{f"role_counts.{role}": n for role, n in roles.items()}},
+            "$set": {"updated_at": updated_at, "last_message": docs[-1]},
+        },
+    )
+
+
+def bucket_updates(
+    chat_id: str,
+    user_id: str,
+    start: int,
+    docs: List[Dict[str, Any]],
+    updated_at: datetime,
+) -> List[UpdateOne]:
+    """
+    Bucket upserts that store `docs` at indexes start, start + 1, ... Each one is
+    skipped by a bucket that already has its first index (see `write_buckets`).
+    """
+    by_seq: Dict[int, List[Dict[str, Any]]] = {}
+    for offset, doc in enumerate(docs):
+        index = start + offset
+        by_seq.setdefault(index // BUCKET_SIZE, []).append({**doc, "index": index})
+    return [
+        UpdateOne(
+            {"chat_id": chat_id, "seq": seq, "messages.index": {"$ne": group[0]["index"]}},
+            {
+                "$push": {"messages": {"$each": group, "$sort": {"index": 1}}},
+                "$inc": {"message_count": len(group)},
+                "$set": {"updated_at": updated_at},
+                "$setOnInsert": {"user_id": user_id, "created_at": updated_at},
+            },
+            upsert=True,
+        )
+        for seq, group in by_seq.items()
+    ]
+
+
+async def write_buckets(updates: List[UpdateOne]) -> None:
+    """
+    Apply bucket updates. An update whose bucket exists but already holds its messages
+    does not match, and its upsert fails with a duplicate key, as does an upsert that
+    raced another one creating the bucket. Those are retried once against the now
+    existing bucket; a duplicate key on the retry means the messages are already stored.
+    """
+    if not updates:
+        return
+    collection = MessageBucket.get_motor_collection()
+    try:
+        await collection.bulk_write(updates, ordered=False)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(error.get("code") != DUPLICATE_KEY for error in errors):
+            raise
+        try:
+            await collection.bulk_write([updates[error["index"]] for error in errors], ordered=False)
+        except BulkWriteError as retry_error:
+            if any(error.get("code") != DUPLICATE_KEY for error in retry_error.details.get("writeErrors", [])):
+                raise
+
+
+async def read_messages(
+    chat_id: str,
+    start: int = 0,
+    end: Optional[int] = None,
+    fields: Optional[List[str]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Messages of a chat with start <= index < end, in order.
+
+    Args:
+        chat_id: The chat
+        start: First index
+        end: Index after the last one (None for all remaining messages)
+        fields: Message fields to return (all when None); `index` is always included
+    """
+    seq_filter: Dict[str, int] = {"$gte": start // BUCKET_SIZE}
+    if end is not None:
+        if end <= start:
+            return []
+        seq_filter["$lte"] = (end - 1) // BUCKET_SIZE
+    projection: Dict[str, int] = {"_id": 0}
+    if fields:
+        projection.update({f"messages.{name}": 1 for name in {*fields, "index"}})
+    else:
+        projection["messages"] = 1
+
+    cursor = MessageBucket.get_motor_collection().find(
+        {"chat_id": chat_id, "seq": seq_filter}, projection).sort("seq", 1)
+    messages = []
+    async for bucket in cursor:
+        for message in bucket.get("messages", []):
+            index = message.get("index", 0)
+            if index >= start and (end is None or index < end):
+                messages.append(message)
+    return messages
+
+
+async def find_message_index(chat_id: str, message_id: str) -> Optional[int]:
+    """Index of a message in its chat, or None if the chat has no such message."""
+    bucket = await MessageBucket.get_motor_collection().find_one(
+        {"chat_id": chat_id, "messages.message_id": message_id},
+        {"_id": 0, "messages": {"$elemMatch": {"message_id": message_id}}},
+    )
+    if not bucket or not bucket.get("messages"):
+        return None
+    return bucket["messages"][0].get("index")
+
+
+async def first_index_since(chat_id: str, timestamp: datetime, inclusive: bool = True) -> Optional[int]:
+    """Index of the first message at (or, if not inclusive, after) `timestamp`; None if there is none."""
+    condition = {"$gte" if inclusive else "$gt": timestamp}
+    bucket = await MessageBucket.get_motor_collection().find_one(
+        {"chat_id": chat_id, "messages.timestamp": condition},
+        {"_id": 0, "messages": {"$elemMatch": {"timestamp": condition}}},
+        sort=[("seq", 1)],
+    )
+    if not bucket or not bucket.get("messages"):
+        return None
+    return bucket["messages"][0].get("index")
+
+
+async def delete_messages(chat_id: str) -> None:
+    """Remove all message buckets of a chat."""
+    await MessageBucket.get_motor_collection().delete_many({"chat_id": chat_id})
@@ -0,0 +1,214 @@
+"""
+publish_queue.py
+----------------
+Batched publishing of generated articles to the Hugo blog.
+
+`publish_article` writes one `Posts/<slug>/index.md` and returns its link. Called once
+per article, a burst of articles (e.g. from the scheduler) made the Hugo watcher
+rebuild the site once per file. `PublishQueue` groups publishes instead:
+
+- articles published within `batch_window` seconds (or until `max_batch` are pending)
+  are written together, each atomically (see `publish_article`); a second publish of
+  the same slug in one window replaces the first;
+- after each batch the site is built once: by `build_command` if one is configured
+  (e.g. `docker exec hugo_builder hugo`), otherwise by the Hugo container's watcher,
+  which picks up the whole batch in one incremental rebuild. Batches never overlap,
+  so publishes that arrive during a build go into the next one;
+- `publish()` returns the article link as soon as its file is written; the time until
+  the batch is built (publish-to-live latency) is reported by `stats()`.
+
+`aclose()` publishes whatever is pending and is called from the app lifespan on shutdown.
+"""
+
+import asyncio
+import shlex
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import settings
+from utils.helpers import publish_article
+
+
+@dataclass
+class PendingPublish:
+    content_dir: str
+    article: Dict[str, Any]
+    enqueued_at: float
+    # Callers waiting for the article link (several if the slug was published again)
+    waiters: List[asyncio.Future] = field(default_factory=list)
+    link: Optional[str] = None
+
+
+class PublishQueue:
+    """
+    In-process queue that publishes articles in batches, one site build per batch.
+
+    Args:
+        batch_window: Maximum seconds a publish waits for others to batch with
+        max_batch: Pending articles that trigger a publish right away
+        build_command: Shell-style command building the site after a batch ("" relies on the Hugo watcher)
+        build_timeout: Seconds a build may take before it is killed
+    """
+
+    def __init__(self, batch_window: float = 2.0, max_batch: int = 20, build_command: str = "", build_timeout: float = 120.0):
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.build_command = build_command
+        self.build_timeout = build_timeout
+        self._pending: "OrderedDict[Tuple[str, str], PendingPublish]" = OrderedDict()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self._closed = False
+        self._stats = {
+            "publishes": 0,
+            "coalesced": 0,
+            "batches": 0,
+            "written": 0,
+            "write_errors": 0,
+            "builds": 0,
+            "build_failures": 0,
+            "last_build_ms": 0.0,
+            "live": 0,
+            "last_publish_to_live_ms": 0.0,
+            "max_publish_to_live_ms": 0.0,
+            "total_publish_to_live_ms": 0.0,
+        }
+
+    async def publish(self, content_dir: str, article: Dict[str, Any]) -> Optional[str]:
+        """Queue an article and return its link once written (None if it could not be)."""
+        if not article:
+            return None
+        self._stats["publishes"] += 1
+        key = (content_dir, str(article.get("slug", "")).lower())
+        waiter = asyncio.get_running_loop().create_future()
+
+        item = self._pending.get(key)
+        if item is None:
+            item = self._pending[key] = PendingPublish(content_dir, article, time.monotonic())
+        else:
+            item.article = article
+            self._stats["coalesced"] += 1
+        item.waiters.append(waiter)
+
+        if self._closed:
+            await self.flush()
+        else:
+            self._ensure_flusher()
+            if len(self._pending) >= self.max_batch:
+                self._wakeup.set()
+        # The batch is published even if this caller goes away
+        return await asyncio.shield(waiter)
+
+    def _ensure_flusher(self) -> None:
+        if self._flusher is None or self._flusher.done():
+            self._wakeup = asyncio.Event()
+            self._flusher = asyncio.create_task(self._flush_loop(), name="publish-queue")
+
+    async def _flush_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.batch_window)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Write everything pending, then build the site once."""
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            batch = list(self._pending.values())
+            self._pending.clear()
+            self._stats["batches"] += 1
+
+            try:
+                links = await asyncio.to_thread(self._write_files, batch)
+            except Exception as e:
+                links = [None] * len(batch)
+                print(f"Error writing {len(batch)} articles: {e}")
+            for item, link in zip(batch, links):
+                item.link = link
+                for waiter in item.waiters:
+                    if not waiter.done():
+                        waiter.set_result(link)
+
+            written = [item for item in batch if item.link]
+            self._stats["written"] += len(written)
+            self._stats["write_errors"] += len(batch) - len(written)
+            if written and await self._build():
+                self._record_live(written)
+
+    @staticmethod
+    def _write_files(batch: List[PendingPublish]) -> List[Optional[str]]:
+        return [publish_article(item.content_dir, item.article) for item in batch]
+
+    async def _build(self) -> bool:
+        """Build the site; without a build command the Hugo watcher does it on its own."""
+        if not self.build_command:
+            return True
+        started = time.perf_counter()
+        self._stats["builds"] += 1
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *shlex.split(self.build_command),
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+            )
+            try:
+                output, _ = await asyncio.wait_for(process.communicate(), timeout=self.build_timeout)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+                raise TimeoutError(f"timed out after {self.build_timeout}s")
+            if process.returncode != 0:
+                raise RuntimeError(
+                    f"exit code {process.returncode}: {output.decode(errors='replace')[-500:]}")
+            return True
+        except Exception as e:
+            self._stats["build_failures"] += 1
+            print(f"Error building blog: {e}")
+            return False
+        finally:
+            self._stats["last_build_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+    def _record_live(self, items: List[PendingPublish]) -> None:
+        now = time.monotonic()
+        for item in items:
+            latency_ms = (now - item.enqueued_at) * 1000
+            self._stats["live"] += 1
+            self._stats["last_publish_to_live_ms"] = round(latency_ms, 2)
+            self._stats["max_publish_to_live_ms"] = round(max(self._stats["max_publish_to_live_ms"], latency_ms), 2)
+            self._stats["total_publish_to_live_ms"] += latency_ms
+        print(f"Published {len(items)} articles, live after {self._stats['last_publish_to_live_ms']}ms")
+
+    async def aclose(self) -> None:
+        """Stop the background flusher and publish everything still pending."""
+        self._closed = True
+        if self._flusher is not None:
+            # Under the lock, so a batch being written and built is not cut short
+            async with self._flush_lock:
+                self._flusher.cancel()
+                await asyncio.gather(self._flusher, return_exceptions=True)
+                self._flusher = None
+        await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        live = self._stats["live"]
+        return {
+            **{k: v for k, v in self._stats.items() if k != "total_publish_to_live_ms"},
+            "pending": len(self._pending),
+            "avg_publish_to_live_ms": round(self._stats["total_publish_to_live_ms"] / live, 2) if live else 0.0,
+        }
+
+
+# Shared by every publisher in the process; flushed by the app lifespan on shutdown
+publish_queue = PublishQueue(
+    batch_window=settings.BLOG_PUBLISH_BATCH_WINDOW_SECONDS,
+    max_batch=settings.BLOG_PUBLISH_MAX_BATCH,
+    build_command=settings.BLOG_BUILD_COMMAND,
+    build_timeout=settings.BLOG_BUILD_TIMEOUT_SECONDS,
+)
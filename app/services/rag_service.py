@@ -7,15 +7,14 @@ perform similarity search, and answer questions using a retriever and LLM.
 
 References:
 - LangChain QA Chat History Tutorial: https://python.langchain.com/docs/tutorials/qa_chat_history/
+
+FAISS, the document loaders (unstructured for PDFs), the splitter and the QA chain are
+imported on first use, so importing this module stays cheap at app startup.
 """
 
-from typing import List, Optional, Callable, Dict, Any, Union
+from typing import TYPE_CHECKING, List, Optional, Callable, Dict, Any, Union
 from pathlib import Path
-from langchain_community.vectorstores import FAISS
 from langchain_openai import OpenAIEmbeddings
-from langchain_community.document_loaders import TextLoader, UnstructuredPDFLoader, WebBaseLoader
-from langchain.text_splitter import CharacterTextSplitter
-from langchain.chains import RetrievalQA
 from langchain_core.documents import Document
 from langchain_core.language_models import BaseLanguageModel
 import os
@@ -24,6 +23,9 @@ import requests
 
 from config import settings
 
+if TYPE_CHECKING:
+    from langchain_community.vectorstores import FAISS
+
 
 class FAISSRAGService:
     """
@@ -33,7 +35,7 @@ class FAISSRAGService:
 
     def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 100):
         self.embeddings = OpenAIEmbeddings(api_key=settings.OPENAI_API_KEY)
-        self.vector_store: Optional[FAISS] = None
+        self.vector_store: Optional["FAISS"] = None
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
         # Loader registry: extension or type -> loader function
@@ -97,16 +99,19 @@ class FAISSRAGService:
         return docs
 
     def _load_txt(self, path: str) -> List[Document]:
+        from langchain_community.document_loaders import TextLoader
         loader = TextLoader(path)
         docs = loader.load()
         return self._split_docs(docs)
 
     def _load_pdf(self, path: str) -> List[Document]:
+        from langchain_community.document_loaders import UnstructuredPDFLoader
         loader = UnstructuredPDFLoader(path)
         docs = loader.load()
         return self._split_docs(docs)
 
     def _load_url(self, url: str) -> List[Document]:
+        from langchain_community.document_loaders import WebBaseLoader
         loader = WebBaseLoader(url)
         docs = loader.load()
         return self._split_docs(docs)
@@ -115,22 +120,25 @@ class FAISSRAGService:
         return self._split_docs([Document(page_content=text)])
 
     def _split_docs(self, docs: List[Document]) -> List[Document]:
+        from langchain.text_splitter import CharacterTextSplitter
         splitter = CharacterTextSplitter(
             chunk_size=self.chunk_size, chunk_overlap=self.chunk_overlap)
         return splitter.split_documents(docs)
 
-    def build_vector_store(self, docs: List[Document]):
-        self.vector_store = FAISS.from_documents(docs, self.embeddings)
+    def build_vector_store(self, docs: List[Document], ids: Optional[List[str]] = None):
+        from langchain_community.vectorstores import FAISS
+        self.vector_store = FAISS.from_documents(docs, self.embeddings, ids=ids)
         self.documents = docs  # Track all docs in memory
 
-    def add_documents(self, docs: List[Document]):
+    def add_documents(self, docs: List[Document], ids: Optional[List[str]] = None):
+        """Add documents, optionally under explicit vector store ids (see `remove_documents`)."""
         if not hasattr(self, 'documents') or self.documents is None:
             self.documents = []
         self.documents.extend(docs)
         if not self.vector_store:
-            self.build_vector_store(self.documents)
+            self.build_vector_store(self.documents, ids=ids)
         else:
-            self.vector_store.add_documents(docs)
+            self.vector_store.add_documents(docs, ids=ids)
 
     def similarity_search(self, query: str, k: int = 5) -> List[Document]:
         if not self.vector_store:
@@ -138,6 +146,20 @@ class FAISSRAGService:
                 "Vector store not initialized. Call build_vector_store or add_documents first.")
         return self.vector_store.similarity_search(query, k=k)
 
+    def similarity_search_with_score(self, query: str, k: int = 5, filter: Optional[Dict[str, Any]] = None) -> List[tuple]:
+        """Return (document, relevance score in [0, 1]) pairs, best first."""
+        if not self.vector_store:
+            return []
+        return self.vector_store.similarity_search_with_relevance_scores(query, k=k, filter=filter)
+
+    def remove_documents(self, ids: List[str]) -> None:
+        """Remove documents added under explicit ids without rebuilding the index."""
+        if not self.vector_store or not ids:
+            return
+        self.vector_store.delete(ids)
+        removed = set(ids)
+        self.documents = [doc for doc in self.documents if doc.metadata.get('doc_id') not in removed]
+
     def delete_document(self, doc_id: str) -> bool:
         """Delete a document by its doc_id and rebuild the vector store."""
         if not hasattr(self, 'documents') or self.documents is None:
@@ -159,6 +181,7 @@ class FAISSRAGService:
         return self.vector_store.as_retriever()
 
     def get_qa_chain(self, llm: BaseLanguageModel, chain_type: str = "stuff"):
+        from langchain.chains import RetrievalQA
         retriever = self.get_retriever()
         return RetrievalQA.from_chain_type(llm=llm, retriever=retriever, chain_type=chain_type)
 
@@ -167,6 +190,7 @@ class FAISSRAGService:
             self.vector_store.save_local(path)
 
     def load_index(self, path: str):
+        from langchain_community.vectorstores import FAISS
         self.vector_store = FAISS.load_local(path, self.embeddings)
 
 # Example usage:
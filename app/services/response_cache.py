@@ -0,0 +1,192 @@
+"""
+response_cache.py
+-----------------
+Response cache in front of the agent LLM.
+
+Scheduled and user prompts repeat a lot, and each one otherwise costs a full ReAct
+round trip. `ResponseCache` stores the final assistant reply of a
+turn under a key built from the user, the normalized prompt and a hash of the
+conversation history that preceded it, so a cached answer is only reused for the
+same user in the same context.
+
+- Exact tier: in-memory LRU bounded by entry count, with a TTL.
+- Semantic tier (optional): prompts are embedded into a FAISS index through
+  `FAISSRAGService`; a miss on the exact tier falls back to the most similar prompt
+  of the same user with the same history hash above `similarity_threshold`.
+
+Hits are replayed by `AgentService` through the normal SSE path.
+"""
+
+import asyncio
+import hashlib
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence
+
+from langchain_core.documents import Document
+from langchain_core.messages import BaseMessage
+
+# Roles from stored history tuples and from LangChain messages hash the same way
+_ROLE_ALIASES = {"user": "human", "assistant": "ai"}
+
+
+@dataclass
+class CachedResponse:
+    content: str
+    created_at: float = field(default_factory=time.monotonic)
+    hits: int = 0
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    return re.sub(r"\s+", " ", prompt).strip().lower().rstrip("?!. ")
+
+
+def history_hash(messages: Sequence[Any]) -> str:
+    """Hash the conversation preceding a prompt (LangChain messages or (role, content) tuples)."""
+    digest = hashlib.sha1()
+    for message in messages:
+        if isinstance(message, BaseMessage):
+            role, content = message.type, message.content
+        else:
+            role, content = message[0], message[1]
+        digest.update(f"{_ROLE_ALIASES.get(role, role)}\x1f{content}\x1e".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class SemanticPromptIndex:
+    """Embedding-similarity lookup of cached prompts, backed by `FAISSRAGService`."""
+
+    def __init__(self, rag_service=None, similarity_threshold: float = 0.95):
+        if rag_service is None:
+            from services.rag_service import FAISSRAGService
+            rag_service = FAISSRAGService()
+        self.rag_service = rag_service
+        self.similarity_threshold = similarity_threshold
+
+    async def add(self, key: str, prompt: str, history: str, scope: str) -> None:
+        doc = Document(page_content=prompt, metadata={"doc_id": key, "history_hash": history, "scope": scope})
+        await asyncio.to_thread(self.rag_service.add_documents, [doc], [key])
+
+    async def find(self, prompt: str, history: str, scope: str) -> Optional[str]:
+        results = await asyncio.to_thread(
+            self.rag_service.similarity_search_with_score, prompt, 1, {"history_hash": history, "scope": scope})
+        if results and results[0][1] >= self.similarity_threshold:
+            return results[0][0].metadata["doc_id"]
+        return None
+
+    def remove(self, keys: List[str]) -> None:
+        self.rag_service.remove_documents(keys)
+
+
+class ResponseCache:
+    """
+    Exact (and optionally semantic) cache of final agent replies.
+
+    Args:
+        max_entries: Maximum number of cached replies
+        ttl_seconds: Lifetime of a cached reply
+        semantic_index: Optional `SemanticPromptIndex` used on exact misses
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_seconds: float = 900,
+        semantic_index: Optional[SemanticPromptIndex] = None,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.semantic_index = semantic_index
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._stats = {
+            "hits": 0,
+            "semantic_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "errors": 0,
+        }
+
+    @staticmethod
+    def make_key(prompt: str, history: str, scope: str) -> str:
+        return hashlib.sha1(f"{scope}\x1d{history}\x1d{normalize_prompt(prompt)}".encode("utf-8")).hexdigest()
+
+    def _lookup(self, key: str) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry.created_at > self.ttl_seconds:
+            self._remove([key])
+            self._stats["expirations"] += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _remove(self, keys: List[str]) -> None:
+        for key in keys:
+            self._entries.pop(key, None)
+        if self.semantic_index is not None and keys:
+            try:
+                self.semantic_index.remove(keys)
+            except Exception as e:
+                self._stats["errors"] += 1
+                print(f"Error removing prompts from semantic cache index: {e}")
+
+    async def aget(self, prompt: str, history: str, scope: str) -> Optional[CachedResponse]:
+        """Return the cached reply for this prompt and history within `scope` (the user), or None."""
+        entry = self._lookup(self.make_key(prompt, history, scope))
+        if entry is not None:
+            self._stats["hits"] += 1
+            entry.hits += 1
+            return entry
+
+        if self.semantic_index is not None:
+            try:
+                key = await self.semantic_index.find(normalize_prompt(prompt), history, scope)
+            except Exception as e:
+                self._stats["errors"] += 1
+                print(f"Error searching semantic cache index: {e}")
+                key = None
+            entry = self._lookup(key) if key else None
+            if entry is not None:
+                self._stats["semantic_hits"] += 1
+                entry.hits += 1
+                return entry
+
+        self._stats["misses"] += 1
+        return None
+
+    async def aset(self, prompt: str, history: str, scope: str, response: CachedResponse) -> None:
+        key = self.make_key(prompt, history, scope)
+        is_new = key not in self._entries
+        self._entries[key] = response
+        self._entries.move_to_end(key)
+        self._stats["stores"] += 1
+
+        evicted = []
+        while len(self._entries) > self.max_entries:
+            evicted.append(next(iter(self._entries)))
+            self._entries.popitem(last=False)
+        if evicted:
+            self._stats["evictions"] += len(evicted)
+            self._remove(evicted)
+
+        if self.semantic_index is not None and is_new:
+            try:
+                await self.semantic_index.add(key, normalize_prompt(prompt), history, scope)
+            except Exception as e:
+                self._stats["errors"] += 1
+                print(f"Error indexing prompt in semantic cache: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._stats["hits"] + self._stats["semantic_hits"] + self._stats["misses"]
+        hits = self._stats["hits"] + self._stats["semantic_hits"]
+        return {
+            **self._stats,
+            "entries": len(self._entries),
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+        }
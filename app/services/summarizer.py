@@ -0,0 +1,146 @@
+"""
+summarizer.py
+-------------
+Rolling conversation summarization for long chats.
+
+After a turn's messages are written (the message write queue calls it),
+`ConversationSummarizer.schedule()` checks the chat in a background task. Once the
+messages not yet covered by `ChatSession.summary` pass `trigger_tokens`, everything
+except the most recent `keep_recent` messages is folded into the stored summary. The next time the thread is hydrated, `get_chat_messages`
+seeds the agent with the summary plus the recent tail instead of the raw history.
+
+The LLM is injectable, so tests can pass a local stand-in chat model.
+"""
+
+import asyncio
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from langchain_core.language_models import BaseChatModel
+from langchain_openai import ChatOpenAI
+
+from config import settings
+from models.run_history import ChatSession
+from services import message_store
+from utils.tokens import count_message_tokens
+
+SUMMARY_SYSTEM_PROMPT = """
+You maintain a running summary of a conversation between a user and an AI assistant.
+Merge the existing summary with the new messages into one concise summary.
+Keep facts, decisions, user preferences, open questions, article titles and links.
+Drop greetings and filler. Write in third person, at most 300 words.
+""".strip()
+
+
+class ConversationSummarizer:
+    """
+    Compacts long chats into a summary stored on the `ChatSession`, off the request path.
+
+    Args:
+        llm: Chat model used for summarization (defaults to gpt-4o-mini at temperature 0)
+        trigger_tokens: Unsummarized tokens that trigger a new summary
+        keep_recent: Number of most recent messages that are never summarized
+        on_compacted: Called with the chat_id after a new summary is stored
+    """
+
+    def __init__(
+        self,
+        llm: Optional[BaseChatModel] = None,
+        trigger_tokens: int = 4000,
+        keep_recent: int = 10,
+        on_compacted: Optional[Callable[[str], Awaitable[None]]] = None,
+    ):
+        self._llm = llm
+        self.trigger_tokens = trigger_tokens
+        self.keep_recent = keep_recent
+        self.on_compacted = on_compacted
+        self._in_flight: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._stats = {"runs": 0, "summaries": 0, "errors": 0, "skipped": 0}
+
+    @property
+    def llm(self) -> BaseChatModel:
+        if self._llm is None:
+            self._llm = ChatOpenAI(
+                api_key=settings.OPENAI_API_KEY, model="gpt-4o-mini", temperature=0)
+        return self._llm
+
+    def schedule(self, chat_id: Optional[str], user_id: str) -> None:
+        """Check the chat for compaction in a background task (one at a time per chat)."""
+        if not chat_id or chat_id in self._in_flight:
+            return
+        self._in_flight.add(chat_id)
+        task = asyncio.create_task(self._run(chat_id, user_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, chat_id: str, user_id: str) -> None:
+        try:
+            await self.maybe_summarize(chat_id, user_id)
+        except Exception as e:
+            self._stats["errors"] += 1
+            print(f"Error summarizing chat {chat_id}: {e}")
+        finally:
+            self._in_flight.discard(chat_id)
+
+    async def maybe_summarize(self, chat_id: str, user_id: str) -> bool:
+        """
+        Fold older messages into the chat summary if the unsummarized part is too long.
+
+        Returns:
+            bool: True if a new summary was stored
+        """
+        self._stats["runs"] += 1
+        session = await ChatSession.get_motor_collection().find_one(
+            {"chat_id": chat_id, "user_id": user_id},
+            {"_id": 0, "message_count": 1, "summary": 1, "summary_message_count": 1},
+        )
+        if not session:
+            return False
+
+        start = session.get("summary_message_count") or 0
+        end = (session.get("message_count") or 0) - self.keep_recent
+        if end <= start:
+            self._stats["skipped"] += 1
+            return False
+        # Only the unsummarized messages are read from their buckets
+        messages: List[Dict[str, Any]] = await message_store.read_messages(
+            chat_id, start, fields=["role", "content"])
+        pending = sum(count_message_tokens(m.get("content")) for m in messages)
+        if pending < self.trigger_tokens:
+            self._stats["skipped"] += 1
+            return False
+
+        transcript = "\n".join(
+            f"{m.get('role', 'unknown')}: {m.get('content', '')}" for m in messages if m["index"] < end)
+        existing = session.get("summary") or "(none)"
+        response = await self.llm.ainvoke([
+            ("system", SUMMARY_SYSTEM_PROMPT),
+            ("human", f"Existing summary:\n{existing}\n\nNew messages:\n{transcript}"),
+        ])
+
+        # Only store it if nobody else moved the summary forward in the meantime
+        update = await ChatSession.get_motor_collection().update_one(
+            {"chat_id": chat_id, "user_id": user_id, "summary_message_count": session.get("summary_message_count")},
+            {"$set": {
+                "summary": response.content,
+                "summary_message_count": end,
+                "summary_updated_at": datetime.utcnow(),
+            }},
+        )
+        if not update.modified_count:
+            return False
+
+        self._stats["summaries"] += 1
+        print(f"Summarized messages {start}-{end} of chat {chat_id}")
+        if self.on_compacted:
+            await self.on_compacted(chat_id)
+        return True
+
+    async def drain(self) -> None:
+        """Wait for running summarizations (e.g. on shutdown)."""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, "in_flight": len(self._in_flight)}
@@ -0,0 +1,355 @@
+"""
+tool_cache.py
+-------------
+TTL cache in front of idempotent agent tools.
+
+The agent often repeats the same web search or YouTube lookup within minutes, across
+users and scheduled runs, and each repeat costs latency and paid API quota.
+`ToolResultCache.wrap_tools()` replaces every tool that has a `ToolCachePolicy` with a
+`CachedTool` that:
+
+- keys results on the tool name and its normalized arguments (whitespace collapsed,
+  keys sorted, optionally case-folded);
+- keeps them for the tool's own TTL in an LRU bounded by entry count and size;
+- optionally spills evicted, still-valid results to disk and reads them back;
+- runs concurrent identical calls once and shares the result (single-flight).
+
+Failed calls (exceptions or error tool messages) are never cached.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import pickle
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.messages import ToolMessage
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import BaseTool
+
+
+@dataclass
+class ToolCachePolicy:
+    ttl_seconds: float
+    # Fold case of string arguments (fine for search queries, not for URLs)
+    case_insensitive: bool = False
+
+
+DEFAULT_TOOL_POLICIES: Dict[str, ToolCachePolicy] = {
+    "tavily_search": ToolCachePolicy(ttl_seconds=600, case_insensitive=True),
+    "download_youtube_url": ToolCachePolicy(ttl_seconds=86400),
+    "get_amazon_product_urls": ToolCachePolicy(ttl_seconds=3600, case_insensitive=True),
+}
+
+
+def build_policies(ttl_overrides: Optional[Dict[str, float]] = None) -> Dict[str, ToolCachePolicy]:
+    """Default policies with per-tool TTL overrides; a TTL of 0 disables caching for that tool."""
+    policies = dict(DEFAULT_TOOL_POLICIES)
+    for name, ttl in (ttl_overrides or {}).items():
+        policies[name] = replace(policies[name], ttl_seconds=ttl) if name in policies else ToolCachePolicy(ttl)
+    return {name: policy for name, policy in policies.items() if policy.ttl_seconds > 0}
+
+
+@dataclass
+class _Entry:
+    value: Any
+    expires_at: float
+    size: int
+
+
+def normalize_arguments(value: Any, case_insensitive: bool = False) -> Any:
+    """Canonical form of tool arguments for cache keys."""
+    if isinstance(value, str):
+        value = re.sub(r"\s+", " ", value).strip()
+        return value.lower() if case_insensitive else value
+    if isinstance(value, dict):
+        return {
+            str(k): normalize_arguments(v, case_insensitive)
+            for k, v in sorted(value.items(), key=lambda item: str(item[0])) if v is not None
+        }
+    if isinstance(value, (list, tuple)):
+        return [normalize_arguments(v, case_insensitive) for v in value]
+    return value
+
+
+class ToolResultCache:
+    """
+    Shared result cache for all wrapped tools.
+
+    Args:
+        policies: Tool name -> `ToolCachePolicy`; tools without a policy are not wrapped
+        max_entries: Maximum number of results kept in memory
+        max_bytes: Maximum pickled size of the results kept in memory
+        disk_dir: Directory for results evicted from memory (disabled when None)
+        max_disk_entries: Maximum number of spilled results; the oldest are removed first
+    """
+
+    def __init__(
+        self,
+        policies: Optional[Dict[str, ToolCachePolicy]] = None,
+        max_entries: int = 512,
+        max_bytes: int = 32 * 1024 * 1024,
+        disk_dir: Optional[str] = None,
+        max_disk_entries: int = 4096,
+    ):
+        self.policies = dict(DEFAULT_TOOL_POLICIES if policies is None else policies)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_entries = max_disk_entries
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._stats = {
+            "hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "shared": 0,
+            "stores": 0,
+            "evictions": 0,
+            "spills": 0,
+            "errors": 0,
+        }
+
+    def make_key(self, tool_name: str, arguments: Dict[str, Any]) -> str:
+        policy = self.policies[tool_name]
+        normalized = normalize_arguments(arguments, policy.case_insensitive)
+        payload = json.dumps(normalized, sort_keys=True, default=str)
+        return hashlib.sha1(f"{tool_name}\x1d{payload}".encode("utf-8")).hexdigest()
+
+    def _lookup(self, key: str) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.time():
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _drop(self, key: str) -> Optional[_Entry]:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+        return entry
+
+    def _store(self, key: str, value: Any, ttl_seconds: float) -> None:
+        try:
+            size = len(pickle.dumps(value))
+        except Exception as e:
+            self._stats["errors"] += 1
+            print(f"Tool result for {key} is not cacheable: {e}")
+            return
+        if size > self.max_bytes:
+            return
+
+        self._drop(key)
+        self._entries[key] = _Entry(value=value, expires_at=time.time() + ttl_seconds, size=size)
+        self._bytes += size
+        self._stats["stores"] += 1
+
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            evicted_key, evicted = next(iter(self._entries.items()))
+            self._drop(evicted_key)
+            self._stats["evictions"] += 1
+            if self.disk_dir and evicted.expires_at > time.time():
+                self._spill(evicted_key, evicted)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.pkl")
+
+    def _spill(self, key: str, entry: _Entry) -> None:
+        try:
+            tmp_path = f"{self._disk_path(key)}.tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump((entry.expires_at, entry.value), f)
+            os.replace(tmp_path, self._disk_path(key))
+            self._stats["spills"] += 1
+            self._prune_disk()
+        except Exception as e:
+            self._stats["errors"] += 1
+            print(f"Error spilling tool result to disk: {e}")
+
+    def _prune_disk(self) -> None:
+        files = [os.path.join(self.disk_dir, name) for name in os.listdir(self.disk_dir) if name.endswith(".pkl")]
+        if len(files) <= self.max_disk_entries:
+            return
+        files.sort(key=os.path.getmtime)
+        for path in files[:len(files) - self.max_disk_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _load_from_disk(self, key: str) -> Optional[Tuple[float, Any]]:
+        path = self._disk_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as f:
+                expires_at, value = pickle.load(f)
+        except Exception as e:
+            self._stats["errors"] += 1
+            print(f"Error reading spilled tool result: {e}")
+            return None
+        if expires_at <= time.time():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return expires_at, value
+
+    async def get_or_call(
+        self,
+        tool_name: str,
+        arguments: Dict[str, Any],
+        call: Callable[[], Awaitable[Tuple[Any, bool]]],
+    ) -> Any:
+        """
+        Return the cached result for these arguments, or run `call` once for all
+        concurrent callers. `call` returns (result, cacheable).
+        """
+        key = self.make_key(tool_name, arguments)
+        entry = self._lookup(key)
+        if entry is not None:
+            self._stats["hits"] += 1
+            return entry.value
+
+        if self.disk_dir:
+            spilled = await asyncio.to_thread(self._load_from_disk, key)
+            if spilled is not None:
+                return self._restore(key, spilled)
+
+        pending = self._in_flight.get(key)
+        while pending is not None:
+            try:
+                result = await asyncio.shield(pending)
+                self._stats["shared"] += 1
+                return result
+            except asyncio.CancelledError:
+                # Only the leading call was cancelled (e.g. its client went away): retry
+                if not pending.cancelled() or asyncio.current_task().cancelling():
+                    raise
+            pending = self._in_flight.get(key)
+
+        self._stats["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result, cacheable = await call()
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                # Waiters re-raise it; don't warn about an unretrieved exception
+                future.exception()
+            raise
+        finally:
+            self._in_flight.pop(key, None)
+
+        if cacheable:
+            self._store(key, result, self.policies[tool_name].ttl_seconds)
+        future.set_result(result)
+        return result
+
+    def get_or_call_sync(
+        self,
+        tool_name: str,
+        arguments: Dict[str, Any],
+        call: Callable[[], Tuple[Any, bool]],
+    ) -> Any:
+        """
+        Synchronous `get_or_call`, for tools invoked with `invoke`. It shares the cached
+        results, but concurrent identical calls are not merged.
+        """
+        key = self.make_key(tool_name, arguments)
+        entry = self._lookup(key)
+        if entry is not None:
+            self._stats["hits"] += 1
+            return entry.value
+
+        if self.disk_dir:
+            spilled = self._load_from_disk(key)
+            if spilled is not None:
+                return self._restore(key, spilled)
+
+        self._stats["misses"] += 1
+        result, cacheable = call()
+        if cacheable:
+            self._store(key, result, self.policies[tool_name].ttl_seconds)
+        return result
+
+    def _restore(self, key: str, spilled: Tuple[float, Any]) -> Any:
+        """Bring a result read back from disk into memory."""
+        expires_at, value = spilled
+        self._stats["disk_hits"] += 1
+        self._store(key, value, expires_at - time.time())
+        return value
+
+    def wrap_tools(self, tools: List[BaseTool]) -> List[BaseTool]:
+        """Wrap every tool that has a cache policy; return the others unchanged."""
+        return [CachedTool.wrap(tool, self) if tool.name in self.policies else tool for tool in tools]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._stats["hits"] + self._stats["disk_hits"] + self._stats["shared"] + self._stats["misses"]
+        saved = lookups - self._stats["misses"]
+        return {
+            **self._stats,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "in_flight": len(self._in_flight),
+            "hit_rate": round(saved / lookups, 3) if lookups else 0.0,
+        }
+
+
+class CachedTool(BaseTool):
+    """A tool that serves repeated calls from a `ToolResultCache`."""
+
+    tool: BaseTool
+    cache: Any
+
+    @classmethod
+    def wrap(cls, tool: BaseTool, cache: ToolResultCache) -> "CachedTool":
+        return cls(
+            name=tool.name,
+            description=tool.description,
+            args_schema=tool.args_schema,
+            response_format=tool.response_format,
+            return_direct=tool.return_direct,
+            handle_tool_error=tool.handle_tool_error,
+            handle_validation_error=tool.handle_validation_error,
+            tool=tool,
+            cache=cache,
+        )
+
+    def _run(self, *args: Any, config: RunnableConfig, run_manager=None, **kwargs: Any) -> Any:
+        def call() -> Tuple[Any, bool]:
+            return self._result(self.tool.invoke(self._tool_call(kwargs), config))
+
+        return self.cache.get_or_call_sync(self.name, kwargs, call)
+
+    async def _arun(self, *args: Any, config: RunnableConfig, run_manager=None, **kwargs: Any) -> Any:
+        async def call() -> Tuple[Any, bool]:
+            return self._result(await self.tool.ainvoke(self._tool_call(kwargs), config))
+
+        return await self.cache.get_or_call(self.name, kwargs, call)
+
+    def _tool_call(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        # Invoke through a tool call so content_and_artifact tools keep their artifact
+        return {"name": self.name, "args": arguments, "id": "cached-tool-call", "type": "tool_call"}
+
+    def _result(self, message: Any) -> Tuple[Any, bool]:
+        """(result, cacheable) of the wrapped tool's output."""
+        if not isinstance(message, ToolMessage):
+            return message, True
+        result = (message.content, message.artifact) if self.response_format == "content_and_artifact" else message.content
+        return result, message.status != "error"
@@ -0,0 +1,72 @@
+"""
+tool_node.py
+------------
+Tool node of the agent graph with per-tool timeouts.
+
+The agent graph is built with `create_react_agent(version="v2")`, which sends every
+tool call of an AIMessage to its own task. The tasks of one step run concurrently,
+capped by the run config's `max_concurrency`, and each finished task is emitted as its
+own `updates` chunk, so `AgentService.stream()` forwards every tool result as a
+`tool_messages` event as soon as it is ready.
+
+`TimedToolNode` bounds each call by its tool's timeout, so one slow tool cannot hold
+the step back indefinitely. A call that times out is answered with an error
+`ToolMessage` the model can react to.
+"""
+
+import asyncio
+from typing import Any, Dict, Literal, Optional, Sequence
+
+from langchain_core.messages import ToolMessage
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import BaseTool
+from langgraph.prebuilt import ToolNode
+
+# Seconds per tool; tools not listed use the node's default timeout
+DEFAULT_TOOL_TIMEOUTS: Dict[str, float] = {
+    "generate_article": 180,
+}
+
+
+class TimedToolNode(ToolNode):
+    """
+    `ToolNode` that gives every tool call a time limit.
+
+    Args:
+        tools: Tools available to the agent
+        timeouts: Tool name -> timeout in seconds (0 disables the limit for that tool)
+        default_timeout: Timeout for tools not in `timeouts`
+    """
+
+    def __init__(
+        self,
+        tools: Sequence[BaseTool],
+        timeouts: Optional[Dict[str, float]] = None,
+        default_timeout: float = 60.0,
+        **kwargs: Any,
+    ):
+        super().__init__(tools, **kwargs)
+        self.timeouts = {**DEFAULT_TOOL_TIMEOUTS, **(timeouts or {})}
+        self.default_timeout = default_timeout
+        self.timed_out = 0
+
+    async def _arun_one(
+        self,
+        call: Dict[str, Any],
+        input_type: Literal["list", "dict", "tool_calls"],
+        config: RunnableConfig,
+    ) -> ToolMessage:
+        timeout = self.timeouts.get(call["name"], self.default_timeout)
+        if not timeout:
+            return await super()._arun_one(call, input_type, config)
+        try:
+            return await asyncio.wait_for(super()._arun_one(call, input_type, config), timeout=timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            print(f"Tool {call['name']} timed out after {timeout:g}s")
+            return ToolMessage(
+                content=f"Error: {call['name']} did not finish within {timeout:g} seconds.",
+                name=call["name"],
+                tool_call_id=call["id"],
+                status="error",
+            )
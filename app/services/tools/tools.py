@@ -1,23 +1,35 @@
+import asyncio
 from datetime import datetime
-import os
+import httpx
 import requests
 from typing import Annotated, Dict, Optional
 from langchain_core.messages import ToolMessage
+from langchain_core.runnables import Runnable
 from langchain_core.tools import InjectedToolCallId, tool
+from langchain_core.utils.function_calling import convert_to_openai_function
 from langchain_openai import ChatOpenAI
 from langgraph.prebuilt import InjectedState
 from langgraph.types import Command
 from pydantic import BaseModel, Field
 
-from utils.helpers import error_handler, extract_json_from_string, publish_article
+from services.article_index import get_article_index
+from services.article_stream import ARTICLE_DELTA, ArticleDeltas, article_stream_writer, as_dict
+from services.publish_queue import publish_queue
+from utils.helpers import blog_content_dir, error_handler, extract_json_from_string
 from config import settings
 
 
 class ArticleFormat(BaseModel):
+    # The model writes the fields in this order; title and summary come first so they
+    # can be shown while the content is still being generated
     title: str = Field(
         ...,
         description="SEO-optimized title of the generated article (70-80 characters)"
     )
+    summary: str = Field(
+        ...,
+        description="Summarizes the content or serves as a teaser to encourage readers to visit the page"
+    )
     content: str = Field(
         ...,
         description="Complete markdown content of the generated article"
@@ -30,10 +42,6 @@ class ArticleFormat(BaseModel):
         ...,
         description="Meta description for SEO (150-160 characters)"
     )
-    summary: str = Field(
-        ...,
-        description="Summarizes the content or serves as a teaser to encourage readers to visit the page"
-    )
     keywords: list[str] = Field(
         ..., description="Primary and secondary keywords for SEO optimization (min: 2, max: 4)"
     )
@@ -55,18 +63,68 @@ class ResponseFormat(BaseModel):
     )
 
 
+# Structured-output article model, created on first use and shared by all calls so the
+# OpenAI client and its HTTP connection pool are reused. It is given the JSON schema of
+# `ResponseFormat` rather than the model class, so streaming it yields the partial
+# response as a growing dict (with the class it only yields the finished response).
+_article_llm: Optional[Runnable] = None
+
+
+def get_article_llm() -> Runnable:
+    global _article_llm
+    if _article_llm is None:
+        llm = ChatOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            model="gpt-4o-mini",
+            temperature=0.7,
+            timeout=settings.ARTICLE_LLM_TIMEOUT_SECONDS,
+            http_async_client=httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=settings.ARTICLE_LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.ARTICLE_LLM_MAX_CONNECTIONS,
+                ),
+                timeout=settings.ARTICLE_LLM_TIMEOUT_SECONDS,
+            ),
+        )
+        _article_llm = llm.with_structured_output(convert_to_openai_function(ResponseFormat))
+    return _article_llm
+
+
+def set_article_llm(llm: Optional[Runnable]) -> None:
+    """
+    Replace the article model (e.g. with a local stand-in); None resets it. The runnable
+    streams `ResponseFormat` as dicts or models, partial ones first.
+    """
+    global _article_llm
+    _article_llm = llm
+
+
 @tool
 @error_handler
-def generate_article(context: str, tool_call_id: Annotated[str, InjectedToolCallId],) -> Dict:
+async def generate_article(context: str, tool_call_id: Annotated[str, InjectedToolCallId], allow_duplicate: bool = False) -> Dict:
     """
     Generate a well-structured SEO-optimized article on the given context.
+    If the blog already has an article covering the context, its link is returned instead.
 
     Args:
         context: (string) The context which the article will be based on
+        allow_duplicate: (bool) Write a new article even if a similar one is already published
 
     Returns:
         dict: A dictionary containing the article details in the correct format
     """
+    CONTENT_DIR = blog_content_dir()
+
+    # Skip the generation when the topic is already covered
+    if not allow_duplicate and settings.ARTICLE_DUPLICATE_THRESHOLD > 0:
+        similar = await asyncio.to_thread(get_article_index(CONTENT_DIR).find_similar, context)
+        if similar:
+            return (
+                f"A similar article is already published at {similar.link} (\"{similar.title}\", "
+                f"{similar.score:.0%} of this context is covered). Share it with the user, or call "
+                f"generate_article again with allow_duplicate=true if a new article is really needed."
+            )
+
     article_prompt = [
         ("system", f"""
             You are a highly skilled SEO-focused content creator with extensive experience in writing blog posts that not only rank well on search engines but also provide genuine value to readers. You have a strong understanding of technical subjects and can break down complex information into easily digestible formats while ensuring the content is structured properly in Markdown.
@@ -89,34 +147,30 @@ If you require any additional information or clarifications to create a comprehe
          )
     ]
 
-    llm = ChatOpenAI(
-        api_key=settings.OPENAI_API_KEY, model="gpt-4o-mini", temperature=0.7)
-
-    llm = llm.with_structured_output(ResponseFormat)
-
     article_prompt.append(
         ("human", f"Generate an article for this context:\n{context}"))
-    response: ResponseFormat = llm.invoke(article_prompt)
 
-    response = response.model_dump()
+    # Stream the structured output and forward the article as it is written
+    write = article_stream_writer()
+    deltas = ArticleDeltas(tool_call_id)
+    partial = None
+    async for partial in get_article_llm().astream(article_prompt):
+        for event in deltas.update(as_dict(as_dict(partial).get("article"))):
+            write({ARTICLE_DELTA: event})
+
+    response = ResponseFormat.model_validate(as_dict(partial)).model_dump()
 
     if response.get("message_to_user"):
         return response.get("message_to_user")
     else:
-        # Dir for storing blog markdown files (For Docker & Local)
         article = response.get('article')
         if not article:
             return "I'm sorry, I don't have enough context to generate an article."
-
-        CONTENT_DIR = "/app/blog/content"
-        if not os.path.exists(CONTENT_DIR):
-            CONTENT_DIR = os.path.join(
-                os.path.dirname(os.getcwd()), "blog", "content")
-
-        # print(f"Content directory: {CONTENT_DIR}")
+        for event in deltas.finish(article):
+            write({ARTICLE_DELTA: event})
 
         if article.get('content'):
-            articleLink = publish_article(CONTENT_DIR, article)
+            articleLink = await publish_queue.publish(CONTENT_DIR, article)
             article['link'] = articleLink
 
         message = "Your article has been published"
@@ -0,0 +1,58 @@
+"""
+Shared test setup. The tests run against an in-memory Mongo (mongomock-motor) with
+local stand-in models, so they need no services or API keys. Run from the app directory:
+    pip install -r requirements-dev.txt
+    python -m pytest tests
+"""
+
+import asyncio
+import os
+from typing import Any, Awaitable, Callable
+
+import pytest
+
+# Settings are read at import time; the tests never reach these services
+for name in (
+    "MONGODB_URL", "MONGODB_DB", "OPENAI_API_KEY", "GROQ_API_KEY", "BRAVE_SEARCH_API_KEY",
+    "TAVILY_SEARCH_API_KEY", "TWITTER_USERNAME", "TWITTER_EMAIL", "TWITTER_PASSWORD",
+    "TWITTER_USER_AGENT", "SCRAPER_API_KEY",
+):
+    os.environ.setdefault(name, "test")
+
+import mongomock.collection
+from beanie import init_beanie
+from mongomock_motor import AsyncMongoMockClient
+
+# mongomock's bulk update builder does not take the `sort` argument newer pymongo passes
+_add_update = mongomock.collection.BulkOperationBuilder.add_update
+
+
+def _add_update_without_sort(self, *args, sort=None, **kwargs):
+    return _add_update(self, *args, **kwargs)
+
+
+mongomock.collection.BulkOperationBuilder.add_update = _add_update_without_sort
+
+
+async def init_test_db():
+    from models.analytics import AnalyticsRollup
+    from models.checkpoint import AgentCheckpoint
+    from models.run_history import ChatSession, Message, MessageBucket
+
+    client = AsyncMongoMockClient()
+    await init_beanie(
+        database=client["test"],
+        document_models=[Message, ChatSession, MessageBucket, AgentCheckpoint, AnalyticsRollup],
+    )
+    return client
+
+
+@pytest.fixture
+def run_with_db() -> Callable[[Callable[[], Awaitable[Any]]], Any]:
+    """Run an async test body on a fresh event loop and an empty in-memory database."""
+    def run(body: Callable[[], Awaitable[Any]]) -> Any:
+        async def main():
+            await init_test_db()
+            return await body()
+        return asyncio.run(main())
+    return run
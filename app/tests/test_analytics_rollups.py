@@ -0,0 +1,64 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+import httpx
+from fastapi import FastAPI
+
+from api.endpoints import agent as agent_endpoints
+from models.analytics import AnalyticsRollup
+from models.run_history import ChatSession, Message, MessageBucket
+from services import analytics_rollups
+from services.message_queue import MessageWriteQueue
+
+
+async def rollups():
+    docs = await AnalyticsRollup.get_motor_collection().find({}, {"_id": 0, "updated_at": 0}).to_list(None)
+    return sorted(docs, key=lambda doc: doc["date"])
+
+
+async def create_chat(chat_id: str, roles) -> None:
+    create = MessageWriteQueue.new_chat_fields(title=chat_id, agent_name="a", metadata={})
+    await MessageWriteQueue(mode="sync").append(
+        chat_id, "u", [Message(role=role, content=role) for role in roles], create=create)
+
+
+def test_deleted_chats_are_taken_out_of_the_rollups(run_with_db):
+    async def body():
+        await create_chat("kept", ["user", "assistant"])
+        await create_chat("deleted", ["user", "assistant", "user"])
+        assert [(r["chats_created"], r["messages"]) for r in await rollups()] == [(2, 5)]
+
+        async def adelete_thread(thread_id):
+            pass
+
+        app = FastAPI()
+        app.include_router(agent_endpoints.router)
+        app.state.agent_service = SimpleNamespace(checkpointer=SimpleNamespace(adelete_thread=adelete_thread))
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as http:
+            response = await http.delete("/chats/deleted", headers={"user-id": "u"})
+        assert response.status_code == 200
+
+        incremental = await rollups()
+        assert [(r["chats_created"], r["messages"], r["messages_by_role"]) for r in incremental] == [
+            (1, 2, {"user": 1, "assistant": 1})]
+        await analytics_rollups.rebuild("u")
+        assert await rollups() == incremental
+    run_with_db(body)
+
+
+def test_rebuild_counts_records_without_timestamps(run_with_db):
+    async def body():
+        day = datetime(2026, 3, 4, 10)
+        await ChatSession.get_motor_collection().insert_one(
+            {"chat_id": "c1", "user_id": "u", "title": "t", "agent_name": "a", "updated_at": day})
+        await MessageBucket.get_motor_collection().insert_one({
+            "chat_id": "c1", "user_id": "u", "seq": 0, "created_at": day, "updated_at": day, "message_count": 2,
+            "messages": [{"role": "user", "content": "a", "index": 0},
+                         {"role": "assistant", "content": "b", "index": 1, "timestamp": day}],
+        })
+
+        assert await analytics_rollups.rebuild("u") == 1
+        [rollup] = await rollups()
+        assert rollup["date"] == datetime(2026, 3, 4)
+        assert (rollup["chats_created"], rollup["chat_hours"], rollup["messages"]) == (1, {"10": 1}, 2)
+    run_with_db(body)
@@ -0,0 +1,57 @@
+import json
+import os
+
+from services.article_index import INDEX_FILE, ArticleIndex
+
+POST_WORDS = [f"postword{i}" for i in range(800)]
+
+
+def context(shared: int, total: int = 20) -> str:
+    """A context sharing its first `shared` of `total` content words with the post."""
+    return " ".join(POST_WORDS[:shared] + [f"otherword{i}" for i in range(total - shared)])
+
+
+def indexed_post(tmp_path) -> ArticleIndex:
+    index = ArticleIndex(str(tmp_path), threshold=0.6)
+    index.add("long-post", "Long post", "https://blog/long-post", " ".join(POST_WORDS))
+    index.add("other-post", "Other post", "https://blog/other-post", "unrelated words entirely")
+    return index
+
+
+def test_partial_overlap_below_threshold_is_not_similar(tmp_path):
+    index = indexed_post(tmp_path)
+
+    # 4 of 20 words are in the post, 11 of 20 still fall short of 0.6
+    assert index.find_similar(context(shared=4)) is None
+    assert index.find_similar(context(shared=11)) is None
+
+
+def test_containment_is_exact(tmp_path):
+    index = indexed_post(tmp_path)
+
+    similar = index.find_similar(context(shared=12))
+    assert similar.slug == "long-post"
+    assert similar.score == 0.6
+    assert index.find_similar(context(shared=15)).score == 0.75
+
+
+def test_reindexed_post_drops_its_old_words(tmp_path):
+    index = indexed_post(tmp_path)
+    index.add("long-post", "Long post", "https://blog/long-post", " ".join(f"newword{i}" for i in range(800)))
+
+    assert index.find_similar(context(shared=20)) is None
+
+
+def test_saved_index_is_reloaded_and_old_formats_rebuilt(tmp_path):
+    indexed_post(tmp_path)
+    assert ArticleIndex(str(tmp_path)).find_similar(context(shared=15)).score == 0.75
+
+    post_dir = os.path.join(tmp_path, "Posts", "long-post")
+    os.makedirs(post_dir)
+    with open(os.path.join(post_dir, "index.md"), "w", encoding="utf-8") as f:
+        f.write('---\ntitle: "Long post"\n---\n' + " ".join(POST_WORDS))
+    with open(os.path.join(tmp_path, INDEX_FILE), "w", encoding="utf-8") as f:
+        json.dump({"num_perm": 128, "seed": 1, "posts": {}}, f)
+
+    similar = ArticleIndex(str(tmp_path)).find_similar(context(shared=15))
+    assert (similar.slug, similar.title, similar.score) == ("long-post", "Long post", 0.75)
@@ -0,0 +1,68 @@
+from datetime import datetime
+
+import pytest
+
+from migrations.bucket_chat_messages import migrate_session
+from models.run_history import ChatSession, MessageBucket
+from services import message_store
+
+
+def legacy_message(message_id: str, role: str = "user"):
+    return {"message_id": message_id, "role": role, "content": message_id, "timestamp": datetime.utcnow(), "metadata": {}}
+
+
+async def insert_legacy_session(chat_id: str, embedded, appended=()):
+    """A session from before the upgrade, plus messages appended to buckets by the new version."""
+    now = datetime.utcnow()
+    await ChatSession.get_motor_collection().insert_one({
+        "chat_id": chat_id, "user_id": "u", "title": "t", "agent_name": "a", "metadata": {},
+        "created_at": now, "updated_at": now, "messages": [legacy_message(m) for m in embedded],
+    })
+    if appended:
+        await MessageBucket.get_motor_collection().insert_one({
+            "chat_id": chat_id, "user_id": "u", "seq": 0, "created_at": now, "updated_at": now,
+            "messages": [{**legacy_message(m), "index": i} for i, m in enumerate(appended)],
+            "message_count": len(appended),
+        })
+    return await ChatSession.get_motor_collection().find_one({"chat_id": chat_id})
+
+
+async def migrated_ids(chat_id: str):
+    return [m["message_id"] for m in await message_store.read_messages(chat_id)]
+
+
+def test_migration_keeps_post_upgrade_appends(run_with_db):
+    async def body():
+        session = await insert_legacy_session("c1", ["m0", "m1", "m2"], appended=["p0"])
+
+        assert await migrate_session(session) == 4
+        assert await migrated_ids("c1") == ["m0", "m1", "m2", "p0"]
+        migrated = await ChatSession.get_motor_collection().find_one({"chat_id": "c1"})
+        assert "messages" not in migrated and migrated["message_count"] == migrated["reserved_count"] == 4
+        assert migrated["last_message"]["message_id"] == "p0"
+    run_with_db(body)
+
+
+def test_interrupted_migration_can_be_rerun(run_with_db, monkeypatch):
+    async def body():
+        session = await insert_legacy_session("c1", ["m0", "m1", "m2"], appended=["p0"])
+
+        # The buckets are written, then the run dies before the session is updated
+        collection_type = type(ChatSession.get_motor_collection())
+        update_one = collection_type.update_one
+
+        async def crash(self, *args, **kwargs):
+            raise ConnectionError("connection lost")
+
+        monkeypatch.setattr(collection_type, "update_one", crash)
+        with pytest.raises(ConnectionError):
+            await migrate_session(session)
+        monkeypatch.setattr(collection_type, "update_one", update_one)
+
+        session = await ChatSession.get_motor_collection().find_one({"chat_id": "c1"})
+        assert "messages" in session
+        assert await migrate_session(session) == 4
+        assert await migrated_ids("c1") == ["m0", "m1", "m2", "p0"]
+        migrated = await ChatSession.get_motor_collection().find_one({"chat_id": "c1"})
+        assert migrated["message_count"] == 4 and migrated["role_counts"] == {"user": 4}
+    run_with_db(body)
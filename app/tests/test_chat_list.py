@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta
+
+import httpx
+from fastapi import FastAPI
+
+from api.endpoints import agent as agent_endpoints
+from models.run_history import ChatSession
+from utils.pagination import NEXT_CURSOR_HEADER
+
+
+async def create_chats(count: int):
+    start = datetime(2026, 1, 1)
+    await ChatSession.get_motor_collection().insert_many([
+        {"chat_id": f"c{i}", "user_id": "u", "title": f"t{i}", "agent_name": "a", "is_active": True, "metadata": {},
+         "created_at": start, "updated_at": start + timedelta(minutes=i), "message_count": 0}
+        for i in range(count)
+    ])
+
+
+def client() -> httpx.AsyncClient:
+    app = FastAPI()
+    app.include_router(agent_endpoints.router)
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+def test_unpaged_request_returns_every_chat(run_with_db):
+    async def body():
+        await create_chats(120)
+        async with client() as http:
+            response = await http.get("/chats", headers={"user-id": "u"})
+        chats = response.json()
+        assert len(chats) == 120 and chats[0]["chat_id"] == "c119"
+        assert NEXT_CURSOR_HEADER not in response.headers
+    run_with_db(body)
+
+
+def test_cursor_pages_cover_every_chat_once(run_with_db):
+    async def body():
+        await create_chats(120)
+        seen, cursor = [], None
+        async with client() as http:
+            while True:
+                params = {"limit": 50, **({"cursor": cursor} if cursor else {})}
+                response = await http.get("/chats", headers={"user-id": "u"}, params=params)
+                seen += [chat["chat_id"] for chat in response.json()]
+                cursor = response.headers.get(NEXT_CURSOR_HEADER)
+                if not cursor:
+                    break
+        assert seen == [f"c{i}" for i in range(119, -1, -1)]
+    run_with_db(body)
@@ -0,0 +1,60 @@
+import asyncio
+
+from langgraph.checkpoint.base import empty_checkpoint
+
+from models.checkpoint import AgentCheckpoint
+from services.checkpointer import MongoCheckpointStore, TieredCheckpointSaver
+
+CONFIG = {"configurable": {"thread_id": "t1", "checkpoint_ns": ""}}
+
+
+class GatedStore(MongoCheckpointStore):
+    """Cold store whose saves wait until the test lets them through."""
+
+    def __init__(self):
+        self.started = asyncio.Event()
+        self.gate = asyncio.Event()
+
+    async def save(self, record):
+        self.started.set()
+        await self.gate.wait()
+        await super().save(record)
+
+
+async def cold_checkpoint_ids():
+    return [doc.checkpoint_id for doc in await AgentCheckpoint.find({"thread_id": "t1"}).to_list()]
+
+
+def test_save_in_flight_does_not_restore_a_deleted_thread(run_with_db):
+    async def body():
+        store = GatedStore()
+        saver = TieredCheckpointSaver(cold_store=store)
+        await saver.aput(CONFIG, empty_checkpoint(), {}, {})
+        await store.started.wait()
+
+        # The delete lands first, then the save that was already on its way
+        await saver.adelete_thread("t1")
+        store.gate.set()
+        await saver.aflush()
+
+        assert await cold_checkpoint_ids() == []
+        assert await saver.aget_tuple(CONFIG) is None
+    run_with_db(body)
+
+
+def test_checkpoints_written_after_the_delete_are_kept(run_with_db):
+    async def body():
+        store = GatedStore()
+        saver = TieredCheckpointSaver(cold_store=store)
+        await saver.aput(CONFIG, empty_checkpoint(), {}, {})
+        await store.started.wait()
+
+        await saver.adelete_thread("t1")
+        # The next turn starts the thread over while the old save is still in flight
+        newer = empty_checkpoint()
+        await saver.aput(CONFIG, newer, {}, {})
+        store.gate.set()
+        await saver.aflush()
+
+        assert await cold_checkpoint_ids() == [newer["id"]]
+    run_with_db(body)
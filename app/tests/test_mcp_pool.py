@@ -0,0 +1,42 @@
+import asyncio
+
+import pytest
+from langchain_core.tools import ToolException
+from mcp.types import CallToolResult, ImageContent, TextContent
+
+from services.mcp_pool import MCPProcessPool
+
+SPEC = {
+    "name": "download_youtube_url",
+    "description": "Download a transcript",
+    "input_schema": {"type": "object", "properties": {"url": {"type": "string"}}, "required": ["url"]},
+}
+
+
+def pool_tool(result: CallToolResult):
+    pool = MCPProcessPool({"youtube": {"command": "node", "args": ["index.js"], "transport": "stdio"}})
+    calls = []
+
+    async def call_tool(tool_name, arguments):
+        calls.append((tool_name, arguments))
+        return result
+
+    pool.servers["youtube"].call_tool = call_tool
+    return pool._make_tool("youtube", SPEC), calls
+
+
+def test_tool_calls_are_routed_to_the_server_pool():
+    image = ImageContent(type="image", data="aGk=", mimeType="image/png")
+    tool, calls = pool_tool(CallToolResult(content=[TextContent(type="text", text="transcript"), image]))
+
+    message = asyncio.run(tool.ainvoke(
+        {"type": "tool_call", "id": "call-1", "name": SPEC["name"], "args": {"url": "https://youtu.be/x"}}))
+    assert calls == [("download_youtube_url", {"url": "https://youtu.be/x"})]
+    assert (message.content, message.artifact) == ("transcript", [image])
+
+
+def test_tool_errors_are_raised():
+    tool, _ = pool_tool(CallToolResult(content=[TextContent(type="text", text="no such video")], isError=True))
+
+    with pytest.raises(ToolException, match="no such video"):
+        asyncio.run(tool.ainvoke({"url": "https://youtu.be/x"}))
@@ -0,0 +1,91 @@
+from datetime import datetime
+
+from pymongo.errors import BulkWriteError
+
+from models.run_history import ChatSession, Message, MessageBucket
+from services import message_store
+from services.message_queue import MessageWriteQueue
+from services.message_store import BUCKET_SIZE
+
+
+def messages(prefix: str, count: int):
+    return [Message(message_id=f"{prefix}{i}", role="user", content=f"{prefix}{i}") for i in range(count)]
+
+
+async def stored(chat_id: str):
+    ids = [m["message_id"] for m in await message_store.read_messages(chat_id)]
+    buckets = await MessageBucket.get_motor_collection().find({"chat_id": chat_id}).to_list(None)
+    return ids, sum(bucket["message_count"] for bucket in buckets)
+
+
+def test_rewriting_bucket_updates_is_a_no_op(run_with_db):
+    async def body():
+        docs = [m.model_dump() for m in messages("m", BUCKET_SIZE + 5)]
+        updates = message_store.bucket_updates("c1", "u", 0, docs, datetime.utcnow())
+        await message_store.write_buckets(updates)
+        await message_store.write_buckets(updates)
+
+        ids, count = await stored("c1")
+        assert ids == [f"m{i}" for i in range(BUCKET_SIZE + 5)]
+        assert count == BUCKET_SIZE + 5
+    run_with_db(body)
+
+
+def test_partly_failed_flush_is_retried_without_duplicates(run_with_db, monkeypatch):
+    async def body():
+        queue = MessageWriteQueue(mode="buffered", flush_interval=60)
+        create = MessageWriteQueue.new_chat_fields(title="t", agent_name="a", metadata={})
+        await queue.append("healthy", "u", messages("h", 3), create=create)
+        await queue.append("other", "u", messages("o", 2), create=create)
+
+        # The unordered bulk write applies every bucket update, but reports an error for one
+        collection_type = type(MessageBucket.get_motor_collection())
+        bulk_write = collection_type.bulk_write
+
+        async def partly_failing(self, requests, **kwargs):
+            await bulk_write(self, requests, **kwargs)
+            raise BulkWriteError({"writeErrors": [{"index": 1, "code": 50, "errmsg": "operation exceeded time limit"}]})
+
+        monkeypatch.setattr(collection_type, "bulk_write", partly_failing)
+        await queue.flush()
+        monkeypatch.setattr(collection_type, "bulk_write", bulk_write)
+        assert queue.stats()["pending_chats"] == 2
+
+        await queue.flush()
+        assert await stored("healthy") == (["h0", "h1", "h2"], 3)
+        assert await stored("other") == (["o0", "o1"], 2)
+        session = await ChatSession.get_motor_collection().find_one({"chat_id": "healthy"})
+        assert session["message_count"] == 3
+        await queue.aclose()
+    run_with_db(body)
+
+
+def test_messages_are_counted_only_once_stored(run_with_db, monkeypatch):
+    async def body():
+        queue = MessageWriteQueue(mode="buffered", flush_interval=60)
+        create = MessageWriteQueue.new_chat_fields(title="t", agent_name="a", metadata={})
+        await queue.append("c1", "u", messages("m", 2), create=create)
+        await queue.flush()
+        await queue.append("c1", "u", messages("n", 3))
+
+        write_buckets = message_store.write_buckets
+
+        async def failing(updates):
+            raise ConnectionError("connection lost")
+
+        # The indexes are reserved, but the count readers go by does not include them yet
+        monkeypatch.setattr(message_store, "write_buckets", failing)
+        await queue.flush()
+        session = await ChatSession.get_motor_collection().find_one({"chat_id": "c1"})
+        assert (session["message_count"], session["reserved_count"]) == (2, 5)
+        assert session["last_message"]["message_id"] == "m1"
+        assert await stored("c1") == (["m0", "m1"], 2)
+
+        monkeypatch.setattr(message_store, "write_buckets", write_buckets)
+        await queue.flush()
+        session = await ChatSession.get_motor_collection().find_one({"chat_id": "c1"})
+        assert (session["message_count"], session["reserved_count"]) == (5, 5)
+        assert session["last_message"]["message_id"] == "n2"
+        assert await stored("c1") == (["m0", "m1", "n0", "n1", "n2"], 5)
+        await queue.aclose()
+    run_with_db(body)
@@ -0,0 +1,53 @@
+import asyncio
+from types import SimpleNamespace
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from services.agent_service import AgentService
+from services.execution_context import ExecutionContext
+from services.response_cache import ResponseCache
+
+
+def store(cache: ResponseCache, user_id: str, messages) -> None:
+    service = SimpleNamespace(response_cache=cache)
+    asyncio.run(AgentService._store_cached_response(
+        service, "what is hugo?", "history", ExecutionContext(user_id=user_id), {"messages": messages}))
+
+
+def test_replies_are_cached_per_user():
+    cache = ResponseCache()
+    store(cache, "alice", [HumanMessage("what is hugo?"), AIMessage("A static site generator.")])
+
+    assert asyncio.run(cache.aget("What is Hugo", "history", "alice")).content == "A static site generator."
+    assert asyncio.run(cache.aget("what is hugo?", "history", "bob")) is None
+
+
+def test_turns_that_called_tools_are_not_cached():
+    cache = ResponseCache()
+    store(cache, "alice", [
+        HumanMessage("an earlier prompt"),
+        AIMessage("", tool_calls=[{"id": "call-1", "name": "tavily_search", "args": {}}]),
+        ToolMessage("results", tool_call_id="call-1"),
+        AIMessage("An earlier answer."),
+        HumanMessage("what is hugo?"),
+        AIMessage("", tool_calls=[{"id": "call-2", "name": "generate_article", "args": {}}]),
+        ToolMessage("Your article has been published", tool_call_id="call-2"),
+        AIMessage("Your article on Hugo is published."),
+    ])
+
+    assert asyncio.run(cache.aget("what is hugo?", "history", "alice")) is None
+    assert cache.stats()["stores"] == 0
+
+
+def test_tools_of_earlier_turns_do_not_prevent_caching():
+    cache = ResponseCache()
+    store(cache, "alice", [
+        HumanMessage("an earlier prompt"),
+        AIMessage("", tool_calls=[{"id": "call-1", "name": "tavily_search", "args": {}}]),
+        ToolMessage("results", tool_call_id="call-1"),
+        AIMessage("An earlier answer."),
+        HumanMessage("what is hugo?"),
+        AIMessage("A static site generator."),
+    ])
+
+    assert asyncio.run(cache.aget("what is hugo?", "history", "alice")).content == "A static site generator."
@@ -0,0 +1,40 @@
+from types import SimpleNamespace
+
+import httpx
+from fastapi import FastAPI
+from langchain_core.messages import AIMessage
+
+from api.endpoints import agent as agent_endpoints
+from models.run_history import ChatSession
+from services import message_store
+from services.execution_context import AgentRunPool
+from services.message_queue import message_write_queue
+
+
+def client(contexts: list) -> httpx.AsyncClient:
+    async def run(message, context):
+        contexts.append(context)
+        return {"messages": [AIMessage(f"reply to {message}")]}
+
+    app = FastAPI()
+    app.include_router(agent_endpoints.router)
+    app.state.agent_service = SimpleNamespace(run=run, run_pool=AgentRunPool(max_concurrent=1), agent_name="agent")
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+def test_runs_of_a_user_are_stored_in_one_chat(run_with_db):
+    async def body():
+        contexts = []
+        async with client(contexts) as http:
+            for prompt in ("first", "second"):
+                response = await http.post("/run", headers={"user-id": "u"}, json={"message": prompt})
+                assert response.json() == {"response": f"reply to {prompt}"}
+        await message_write_queue.flush()
+
+        # Storage follows the agent thread, which is one per user
+        assert {(c.chat_id, c.thread_id) for c in contexts} == {("u", "u")}
+        sessions = await ChatSession.find({"user_id": "u"}).to_list()
+        assert [(s.chat_id, s.title, s.message_count) for s in sessions] == [("u", "first", 4)]
+        messages = await message_store.read_messages("u", fields=["content"])
+        assert [m["content"] for m in messages] == ["first", "reply to first", "second", "reply to second"]
+    run_with_db(body)
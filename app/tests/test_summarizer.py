@@ -0,0 +1,135 @@
+from typing import Any, Awaitable, Callable, List, Optional
+from uuid import uuid4
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langgraph.checkpoint.base import empty_checkpoint
+
+from models.run_history import ChatSession, Message
+from services.agent_service import AgentService
+from services.message_queue import MessageWriteQueue
+from services.summarizer import ConversationSummarizer
+
+
+class StandInChatModel(BaseChatModel):
+    """Local stand-in for the summarization model: records its prompts and replies with a fixed summary."""
+    reply: str = "stand-in summary"
+    prompts: List[List[BaseMessage]] = []
+    # Awaited before replying, to interleave other writes with a running summarization
+    before_reply: Optional[Callable[[], Awaitable[Any]]] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "stand-in"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        self.prompts.append(messages)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.reply))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if self.before_reply:
+            await self.before_reply()
+        return self._generate(messages)
+
+
+async def create_chat(user_id: str, count: int) -> str:
+    chat_id = str(uuid4())
+    messages = [
+        Message(message_id=f"m{i}", role="user" if i % 2 == 0 else "assistant", content=f"message {i} " + "word " * 50)
+        for i in range(count)
+    ]
+    create = MessageWriteQueue.new_chat_fields(title="t", agent_name="agent", metadata={})
+    await MessageWriteQueue(mode="sync").append(chat_id, user_id, messages, create=create)
+    return chat_id
+
+
+async def session_summary(chat_id: str):
+    return await ChatSession.get_motor_collection().find_one(
+        {"chat_id": chat_id}, {"summary": 1, "summary_message_count": 1})
+
+
+def test_skips_below_trigger(run_with_db):
+    async def body():
+        chat_id = await create_chat("u", 10)
+        llm = StandInChatModel()
+        summarizer = ConversationSummarizer(llm=llm, trigger_tokens=100_000, keep_recent=3)
+
+        assert await summarizer.maybe_summarize(chat_id, "u") is False
+        assert llm.prompts == []
+        assert summarizer.stats()["skipped"] == 1
+        assert (await session_summary(chat_id)).get("summary") is None
+    run_with_db(body)
+
+
+def test_folds_all_but_recent_messages(run_with_db):
+    async def body():
+        chat_id = await create_chat("u", 10)
+        llm = StandInChatModel()
+        summarizer = ConversationSummarizer(llm=llm, trigger_tokens=10, keep_recent=3)
+
+        assert await summarizer.maybe_summarize(chat_id, "u") is True
+        transcript = llm.prompts[0][-1].content
+        assert "message 6 " in transcript and "message 7 " not in transcript
+        session = await session_summary(chat_id)
+        assert session["summary"] == "stand-in summary"
+        assert session["summary_message_count"] == 7
+
+        # Only the kept tail is left unsummarized, so there is nothing new to fold
+        assert await summarizer.maybe_summarize(chat_id, "u") is False
+        assert len(llm.prompts) == 1
+    run_with_db(body)
+
+
+def test_does_not_overwrite_a_newer_summary(run_with_db):
+    async def body():
+        chat_id = await create_chat("u", 10)
+
+        async def concurrent_summary():
+            await ChatSession.get_motor_collection().update_one(
+                {"chat_id": chat_id}, {"$set": {"summary": "newer summary", "summary_message_count": 5}})
+
+        llm = StandInChatModel(before_reply=concurrent_summary)
+        summarizer = ConversationSummarizer(llm=llm, trigger_tokens=10, keep_recent=3)
+
+        assert await summarizer.maybe_summarize(chat_id, "u") is False
+        session = await session_summary(chat_id)
+        assert session["summary"] == "newer summary"
+        assert session["summary_message_count"] == 5
+        assert summarizer.stats()["summaries"] == 0
+    run_with_db(body)
+
+
+def test_chats_are_checked_once_their_messages_are_written(run_with_db):
+    async def body():
+        queue = MessageWriteQueue(mode="buffered", flush_interval=60)
+        written = []
+        queue.add_listener(lambda chat_id, user_id: written.append((chat_id, user_id)))
+        create = MessageWriteQueue.new_chat_fields(title="t", agent_name="agent", metadata={})
+        await queue.append("c1", "u", [Message(role="user", content="hi")], create=create)
+
+        assert written == []
+        await queue.flush()
+        assert written == [("c1", "u")]
+        await queue.aclose()
+    run_with_db(body)
+
+
+def test_compaction_waits_for_the_running_turn(run_with_db):
+    async def body():
+        service = AgentService()
+        config = {"configurable": {"thread_id": "c1", "checkpoint_ns": ""}}
+        await service.checkpointer.aput(config, empty_checkpoint(), {}, {})
+
+        async with service._running("c1"):
+            await service._drop_compacted_thread("c1")
+            assert await service.checkpointer.aget_tuple(config) is not None
+            # The turn ends by checkpointing the history it started with
+            await service.checkpointer.aput(config, empty_checkpoint(), {}, {})
+        assert await service.checkpointer.aget_tuple(config) is None
+
+        # Without a running turn the checkpoint is dropped right away
+        await service.checkpointer.aput(config, empty_checkpoint(), {}, {})
+        await service._drop_compacted_thread("c1")
+        assert await service.checkpointer.aget_tuple(config) is None
+    run_with_db(body)
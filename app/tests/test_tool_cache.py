@@ -0,0 +1,49 @@
+import asyncio
+
+from langchain_core.tools import tool
+
+from services.tool_cache import ToolCachePolicy, ToolResultCache
+
+calls = []
+
+
+@tool
+def lookup(query: str) -> str:
+    """Look something up."""
+    calls.append(query)
+    return f"result for {query}"
+
+
+def wrapped_lookup():
+    calls.clear()
+    cache = ToolResultCache(policies={"lookup": ToolCachePolicy(ttl_seconds=60, case_insensitive=True)})
+    return cache, cache.wrap_tools([lookup])[0]
+
+
+def test_sync_invoke_is_cached():
+    cache, cached = wrapped_lookup()
+
+    assert cached.invoke({"query": "Hugo  builds"}) == "result for Hugo  builds"
+    assert cached.invoke({"query": "hugo builds"}) == "result for Hugo  builds"
+    assert calls == ["Hugo  builds"]
+    assert cache.stats()["hits"] == 1
+
+
+def test_sync_and_async_invocations_share_results():
+    cache, cached = wrapped_lookup()
+
+    assert asyncio.run(cached.ainvoke({"query": "mongo"})) == "result for mongo"
+    assert cached.invoke({"query": "mongo"}) == "result for mongo"
+    assert calls == ["mongo"]
+
+
+def test_sync_errors_are_not_cached():
+    cache, cached = wrapped_lookup()
+    failing = cache.wrap_tools([lookup.model_copy(update={"func": lambda query: 1 / 0})])[0]
+
+    for _ in range(2):
+        try:
+            failing.invoke({"query": "x"})
+        except ZeroDivisionError:
+            pass
+    assert cache.stats()["misses"] == 2 and cache.stats()["entries"] == 0
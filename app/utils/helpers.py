@@ -1,9 +1,11 @@
 from datetime import datetime
 import functools
+import inspect
 import json
 import os
 import random
 import re
+import tempfile
 import traceback
 from typing import Callable, Optional, TypeVar, ParamSpec
 from langchain_core.runnables import RunnableLambda
@@ -12,6 +14,8 @@ from rich.console import Console
 from rich.table import Table
 from rich.panel import Panel
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from services.article_index import get_article_index
+from utils.sse_encoder import sse_encoder
 
 console = Console()
 
@@ -29,21 +33,35 @@ def error_handler(func: Callable[P, R]) -> Callable[P, R]:
     Returns:
         Wrapped function with error handling
     """
+    def report(e: Exception) -> None:
+        console.print(f"\n[red]{'='*50}[/red]")
+        console.print(
+            f"[red bold]Error in function:[/red bold] [yellow]{func.__name__}[/yellow]")
+        console.print(
+            f"[red bold]Error type:[/red bold] [yellow]{type(e).__name__}[/yellow]")
+        console.print(
+            f"[red bold]Error message:[/red bold] [yellow]{str(e)}[/yellow]")
+        console.print("\n[red bold]Traceback:[/red bold]")
+        console.print(f"[yellow]{traceback.format_exc()}[/yellow]")
+        console.print(f"[red]{'='*50}[/red]\n")
+
+    # Coroutine functions keep an async wrapper, so callers (e.g. @tool) still see them as async
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            try:
+                return await func(*args, **kwargs)
+            except Exception as e:
+                report(e)
+                raise
+        return async_wrapper
+
     @functools.wraps(func)
     def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
         try:
             return func(*args, **kwargs)
         except Exception as e:
-            console.print(f"\n[red]{'='*50}[/red]")
-            console.print(
-                f"[red bold]Error in function:[/red bold] [yellow]{func.__name__}[/yellow]")
-            console.print(
-                f"[red bold]Error type:[/red bold] [yellow]{type(e).__name__}[/yellow]")
-            console.print(
-                f"[red bold]Error message:[/red bold] [yellow]{str(e)}[/yellow]")
-            console.print("\n[red bold]Traceback:[/red bold]")
-            console.print(f"[yellow]{traceback.format_exc()}[/yellow]")
-            console.print(f"[red]{'='*50}[/red]\n")
+            report(e)
             raise
     return wrapper
 
@@ -140,8 +158,7 @@ def pretty_print_messages(messages):
 
 def sse_format(event_type: str, chunk):
     """Helper function to format messages for SSE."""
-    data = json.dumps({"type": event_type, "data": chunk})
-    return f"data: {data}\n\n"
+    return sse_encoder.encode(event_type, chunk)
 
 
 @error_handler
@@ -173,14 +190,25 @@ def format_list(items):
     return "\n- " + "\n- ".join([f'"{item}"' for item in items]) + "\n"
 
 
+def blog_content_dir() -> str:
+    """Dir for storing blog markdown files (For Docker & Local)."""
+    content_dir = "/app/blog/content"
+    if not os.path.exists(content_dir):
+        content_dir = os.path.join(os.path.dirname(os.getcwd()), "blog", "content")
+    return content_dir
+
+
 @error_handler
 def publish_article(CONTENT_DIR, res: dict):
     """
     Publish the article extracted from the agent output.
     This method writes the article to a Markdown file in the content directory.
+    The file is written under a temporary name and renamed into place, so the Hugo
+    watcher never sees a partially written article.
     
     The content directory is mapped to /converge/blog/content inside the Docker container.
     If CONTENT_DIR is not absolute, it is resolved relative to /converge/blog/content.
+    Blocking; async callers go through `services.publish_queue`.
     """
     # Inside Docker, /converge/blog/content is the canonical content directory
     base_content_dir = '/converge/blog/content'
@@ -206,8 +234,11 @@ def publish_article(CONTENT_DIR, res: dict):
 
     file_path = os.path.join(posts_dir, 'index.md')
 
+    tmp_path = None
     try:
-        with open(file_path, "w", encoding="utf-8") as f:
+        # Hugo ignores dotfiles, so the temporary file is never rendered
+        fd, tmp_path = tempfile.mkstemp(prefix=".index.md.", suffix=".tmp", dir=posts_dir)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
             # Write the article content to the file.
             front_matter = f"""---
 title: "{sanitize_text(article_data['title'])}"
@@ -222,14 +253,28 @@ categories: {format_list(article_data.get('categories', []))}
 ---
 """.strip()
 
-            f.write(front_matter + "\n\n" + article_data['content'])
+            text = front_matter + "\n\n" + article_data['content']
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, file_path)
         article_link = f"https://blog.sleebit.com/posts/{article_data['slug'].lower()}"
         print(f"Article published successfully at {article_link}")
-        return article_link
     except Exception as e:
         print(f"Error publishing article: {e}")
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
         return None
 
+    # Keep the near-duplicate index current; the article is published either way
+    try:
+        get_article_index(CONTENT_DIR).add(
+            article_folder_dir_name, article_data['title'], article_link, text)
+    except Exception as e:
+        print(f"Error indexing article: {e}")
+    return article_link
+
 
 @error_handler
 def is_article_output(text: str):
@@ -1,57 +1,59 @@
+from dataclasses import dataclass
 from datetime import datetime
 from typing import List, Dict, Any, Tuple, Optional
 from uuid import uuid4
 
 from models.run_history import Message as DBMessage, ChatSession
+from services.execution_context import ExecutionContext
+from services import message_store
+from services.message_queue import MessageWriteQueue, message_write_queue
+from utils.tokens import count_message_tokens
 
 
 async def save_messages_to_db(
-    user_id: str,
-    chat_id: str,
+    context: ExecutionContext,
     prompt: str,
-    messages: List[DBMessage],
-    agent_name: str
+    agent_name: str,
+    create_missing: bool = False
 ) -> None:
     """
-    Save messages to the database.
+    Save the messages captured on an execution context to the database.
+
+    The messages are appended to the chat's message buckets through the shared
+    `MessageWriteQueue`; in buffered mode they reach Mongo within
+    `MESSAGE_WRITE_FLUSH_INTERVAL_SECONDS`. A new chat gets its chat_id right away and is
+    created by its first flush.
     
     Args:
-        user_id: The ID of the user
-        chat_id: The ID of the chat session (if any)
+        context: The execution context of the run (user, chat and captured messages)
         prompt: The initial prompt
-        messages: The list of messages to save
         agent_name: The name of the agent
+        create_missing: Create the chat given by `context.chat_id` if it does not exist yet
+            (otherwise appends to a missing chat are dropped)
     """
+    user_id = context.user_id
+    chat_id = context.chat_id
+    messages = context.captured_messages
+    title = prompt[:50] + "..." if len(prompt) > 50 else prompt
     try:
         if chat_id:
-            # Find existing chat session
-            existing_session = await ChatSession.find_one(
-                {"chat_id": chat_id, "user_id": user_id}
-            )
-            if not existing_session:
-                print(f"Chat session not found: {chat_id}")
-                return
-            
-            existing_session.messages.extend(messages)
-            existing_session.updated_at = datetime.utcnow()
-            await existing_session.save()
-            print(f"Messages appended to existing chat session {existing_session.chat_id}")
+            create = MessageWriteQueue.new_chat_fields(
+                title=title,
+                agent_name=agent_name,
+                metadata={"initial_prompt": prompt},
+            ) if create_missing else None
+            await message_write_queue.append(chat_id, user_id, messages, create=create)
         else:
             # Create new chat session
-            title = prompt[:50] + "..." if len(prompt) > 50 else prompt
             chat_id = str(uuid4())
-            chat_session = ChatSession(
-                chat_id=chat_id,
+            create = MessageWriteQueue.new_chat_fields(
                 title=title,
-                messages=messages,
                 agent_name=agent_name,
-                user_id=user_id,
                 metadata={"initial_prompt": prompt},
-                created_at=datetime.utcnow(),
-                updated_at=datetime.utcnow()
             )
-            await chat_session.insert()
-            print(f"New chat session created with ID {chat_session.chat_id}")
+            await message_write_queue.append(chat_id, user_id, messages, create=create)
+            context.chat_id = chat_id
+            print(f"New chat session created with ID {chat_id}")
     except Exception as e:
         print(f"Error saving messages to database: {e}")
 
@@ -94,22 +96,51 @@ def create_assistant_message(chunk: Dict[str, Any]) -> DBMessage:
     )
 
 
-async def get_chat_messages(chat_id: str, user_id: str) -> Tuple[List[Tuple[str, str]], Dict[str, Any]]:
+SUMMARY_PREFIX = "Summary of the earlier conversation:"
+
+
+@dataclass
+class HistoryWindow:
     """
-    Fetch messages for a chat session and convert them to agent format.
+    How much chat history is hydrated into the agent when a thread has no checkpoint.
+
+    Attributes:
+        max_messages: Only the last N messages are fetched from Mongo
+        token_budget: The fetched tail is further cut to fit this many tokens (None for no limit)
+    """
+    max_messages: int = 40
+    token_budget: Optional[int] = 6000
+
+
+async def get_chat_messages(
+    chat_id: str,
+    user_id: str,
+    window: Optional[HistoryWindow] = None
+) -> Tuple[List[Tuple[str, str]], Dict[str, Any]]:
+    """
+    Fetch the most recent messages of a chat session and convert them to agent format.
+
+    Only the last `window.max_messages` messages are read (from the chat's last message
+    buckets), and the tail is trimmed to `window.token_budget` tokens counted locally. When the
+    session has a rolling summary, it is returned first as a system message and the
+    messages it covers are skipped.
     
     Args:
         chat_id: The ID of the chat session
         user_id: The ID of the user
+        window: The history window (defaults to `HistoryWindow()`)
         
     Returns:
         Tuple containing:
         - List of (role, content) tuples for agent consumption
-        - Dictionary with metadata like success status and message count
+        - Dictionary with metadata like success status, message and token counts
     """
+    window = window or HistoryWindow()
     result = {
         "success": False,
         "message_count": 0,
+        "token_count": 0,
+        "truncated": False,
         "error": None
     }
     
@@ -117,24 +148,47 @@ async def get_chat_messages(chat_id: str, user_id: str) -> Tuple[List[Tuple[str,
         if not chat_id or not user_id:
             return [], result
             
-        # Find existing chat session
-        existing_session = await ChatSession.find_one(
-            {"chat_id": chat_id, "user_id": user_id}
+        existing_session = await ChatSession.get_motor_collection().find_one(
+            {"chat_id": chat_id, "user_id": user_id},
+            {"_id": 0, "summary": 1, "summary_message_count": 1, "message_count": 1},
         )
-        
-        if not existing_session or not existing_session.messages:
+        if not existing_session or not existing_session.get("message_count"):
+            return [], result
+
+        # Messages already covered by the summary are replaced by it
+        total = existing_session["message_count"]
+        tail_start = max(total - window.max_messages, 0)
+        summary = existing_session.get("summary")
+        if summary:
+            tail_start = max(tail_start, existing_session.get("summary_message_count") or 0)
+        tail = await message_store.read_messages(
+            chat_id, tail_start, total, fields=["role", "content"])
+        if not tail and not summary:
             return [], result
             
-        # Convert DB messages to agent messages format
+        # Walk newest to oldest until the token budget is spent
         agent_messages = []
-        for msg in existing_session.messages:
-            if msg.role == "user":
-                agent_messages.append(("user", msg.content))
-            elif msg.role == "assistant":
-                agent_messages.append(("assistant", msg.content))
+        token_count = 0
+        for msg in reversed(tail):
+            role = msg.get("role")
+            if role not in ("user", "assistant"):
+                continue
+            content = msg.get("content", "")
+            tokens = count_message_tokens(content)
+            if window.token_budget is not None and agent_messages and token_count + tokens > window.token_budget:
+                result["truncated"] = True
+                break
+            agent_messages.append((role, content))
+            token_count += tokens
+        agent_messages.reverse()
+
+        if summary:
+            agent_messages.insert(0, ("system", f"{SUMMARY_PREFIX}\n{summary}"))
+            token_count += count_message_tokens(summary)
         
         result["success"] = True
         result["message_count"] = len(agent_messages)
+        result["token_count"] = token_count
         return agent_messages, result
         
     except Exception as e:
@@ -0,0 +1,50 @@
+"""
+pagination.py
+-------------
+Opaque cursors for keyset-paginated endpoints.
+
+A cursor is the sort key of the last item of a page, JSON-encoded and base64url'd, so
+clients pass it back as-is and the next page starts with an indexed range query
+instead of a skip.
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict
+
+from bson import ObjectId
+
+# Response header carrying the cursor of the next page (absent on the last page)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"$dt": value.isoformat()}
+    if isinstance(value, ObjectId):
+        return {"$oid": str(value)}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict) and "$dt" in value:
+        return datetime.fromisoformat(value["$dt"])
+    if isinstance(value, dict) and "$oid" in value:
+        return ObjectId(value["$oid"])
+    return value
+
+
+def encode_cursor(key: Dict[str, Any]) -> str:
+    payload = json.dumps({k: _encode_value(v) for k, v in key.items()}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """Decode a cursor from `encode_cursor`; raises ValueError if it is malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return {k: _decode_value(v) for k, v in payload.items()}
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
@@ -0,0 +1,167 @@
+"""
+sse_encoder.py
+--------------
+Fast JSON encoding of agent stream chunks for Server-Sent Events.
+
+`make_serializable` walks the whole `__dict__` of every LangChain message before
+`json.dumps` walks the result again. `SSEEncoder` instead:
+
+- dispatches on the message class and copies only a whitelist of fields, so private
+  and bulky attributes (tool artifacts, raw provider payloads) are never walked;
+- falls back to a generic walk for other objects with cycle and depth guards;
+- uses orjson when it is installed and the standard library otherwise.
+
+The output keeps the shape the frontend already consumes (`type`, `content`,
+`additional_kwargs.tool_calls`, ...).
+"""
+
+from dataclasses import fields, is_dataclass
+from datetime import date, datetime
+from enum import Enum
+import json
+from typing import Any, Dict, Tuple
+
+from langchain_core.messages import (
+    AIMessage,
+    AIMessageChunk,
+    BaseMessage,
+    HumanMessage,
+    SystemMessage,
+    ToolMessage,
+)
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+MAX_DEPTH = 32
+CYCLE_MARKER = "<cycle>"
+DEPTH_MARKER = "<max depth>"
+
+_COMMON_FIELDS = ("content", "type", "id", "name")
+_AI_FIELDS = _COMMON_FIELDS + (
+    "additional_kwargs", "tool_calls", "invalid_tool_calls", "usage_metadata", "response_metadata")
+
+# Fields copied per message class; anything else on the message is never walked
+MESSAGE_FIELDS: Dict[type, Tuple[str, ...]] = {
+    AIMessage: _AI_FIELDS,
+    AIMessageChunk: _AI_FIELDS,
+    ToolMessage: _COMMON_FIELDS + ("tool_call_id", "status"),
+    HumanMessage: _COMMON_FIELDS,
+    SystemMessage: _COMMON_FIELDS,
+}
+
+_SCALARS = (str, int, float, bool, type(None))
+
+
+class SSEEncoder:
+    """
+    Encode stream chunks to JSON-compatible data and SSE frames.
+
+    Args:
+        max_depth: Nesting depth after which values are replaced by a marker
+        use_orjson: Use orjson when available (falls back to the json module)
+    """
+
+    def __init__(self, max_depth: int = MAX_DEPTH, use_orjson: bool = True):
+        self.max_depth = max_depth
+        self.use_orjson = use_orjson and orjson is not None
+
+    def to_jsonable(self, obj: Any) -> Any:
+        """Convert `obj` into plain dicts, lists and scalars."""
+        return self._convert(obj, 0, set())
+
+    def _convert(self, obj: Any, depth: int, path: set) -> Any:
+        if isinstance(obj, _SCALARS):
+            return obj
+        if depth >= self.max_depth:
+            return DEPTH_MARKER
+
+        obj_id = id(obj)
+        if obj_id in path:
+            return CYCLE_MARKER
+        path.add(obj_id)
+        try:
+            return self._convert_container(obj, depth + 1, path)
+        finally:
+            path.discard(obj_id)
+
+    def _convert_container(self, obj: Any, depth: int, path: set) -> Any:
+        obj_type = type(obj)
+        if obj_type is dict:
+            return {self._key(k): self._convert(v, depth, path) for k, v in obj.items()}
+        if obj_type is list or obj_type is tuple:
+            return [self._convert(item, depth, path) for item in obj]
+
+        message_fields = MESSAGE_FIELDS.get(obj_type)
+        if message_fields is None and isinstance(obj, BaseMessage):
+            message_fields = self._message_fields(obj_type)
+        if message_fields is not None:
+            return {
+                name: self._convert(getattr(obj, name, None), depth, path)
+                for name in message_fields
+            }
+
+        if isinstance(obj, dict):
+            return {self._key(k): self._convert(v, depth, path) for k, v in obj.items()}
+        if isinstance(obj, (list, tuple, set, frozenset)):
+            return [self._convert(item, depth, path) for item in obj]
+        if isinstance(obj, (datetime, date)):
+            return obj.isoformat()
+        if isinstance(obj, Enum):
+            return self._convert(obj.value, depth, path)
+        if isinstance(obj, (bytes, bytearray)):
+            return f"<{len(obj)} bytes>"
+        if isinstance(obj, BaseModel):
+            return {
+                name: self._convert(getattr(obj, name, None), depth, path)
+                for name in type(obj).model_fields if not name.startswith("_")
+            }
+        if is_dataclass(obj) and not isinstance(obj, type):
+            return {
+                f.name: self._convert(getattr(obj, f.name), depth, path)
+                for f in fields(obj) if not f.name.startswith("_")
+            }
+        if callable(obj):
+            return repr(obj)
+        if hasattr(obj, "__dict__"):
+            return {
+                key: repr(value) if callable(value) else self._convert(value, depth, path)
+                for key, value in vars(obj).items() if not key.startswith("_")
+            }
+        return str(obj)
+
+    @staticmethod
+    def _message_fields(message_type: type) -> Tuple[str, ...]:
+        # Subclasses (e.g. ToolMessageChunk) share the whitelist of their closest base
+        for base in message_type.__mro__:
+            if base in MESSAGE_FIELDS:
+                fields_ = MESSAGE_FIELDS[base]
+                break
+        else:
+            fields_ = _COMMON_FIELDS
+        MESSAGE_FIELDS[message_type] = fields_
+        return fields_
+
+    @staticmethod
+    def _key(key: Any) -> Any:
+        return key if isinstance(key, str) else str(key)
+
+    def _default(self, obj: Any) -> Any:
+        return self.to_jsonable(obj)
+
+    def dumps(self, obj: Any) -> str:
+        """Serialize `obj` to a JSON string, converting unsupported objects on the fly."""
+        if self.use_orjson:
+            return orjson.dumps(obj, default=self._default, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+        return json.dumps(obj, default=self._default)
+
+    def encode(self, event_type: str, data: Any) -> str:
+        """Build one SSE frame for the given event."""
+        return f"data: {self.dumps({'type': event_type, 'data': data})}\n\n"
+
+
+# Shared process-wide instance; the encoder keeps no per-request state
+sse_encoder = SSEEncoder()
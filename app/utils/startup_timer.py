@@ -0,0 +1,68 @@
+"""
+startup_timer.py
+----------------
+Per-phase timing of application startup.
+
+Phases may overlap (the lifespan runs independent steps concurrently), so each phase
+records its start offset as well as its duration. The breakdown is printed once the
+app is up and exposed through `/runtime-stats`, so cold start regressions are visible.
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Dict, Iterator, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class StartupTimer:
+    """Records named startup phases relative to a common origin."""
+
+    def __init__(self, origin: Optional[float] = None):
+        self.origin = origin if origin is not None else time.perf_counter()
+        self.phases: List[Dict[str, Any]] = []
+        self.ready_at: Optional[float] = None
+
+    def record(self, name: str, started: float, ended: float, error: Optional[str] = None) -> None:
+        self.phases.append({
+            "phase": name,
+            "start_ms": round((started - self.origin) * 1000, 1),
+            "duration_ms": round((ended - started) * 1000, 1),
+            "error": error,
+        })
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time the enclosed block (sync or async code) as one phase."""
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.record(name, started, time.perf_counter(), error=str(e))
+            raise
+        self.record(name, started, time.perf_counter())
+
+    async def run(self, name: str, awaitable: Awaitable[T]) -> T:
+        """Await `awaitable` as one phase; use with `asyncio.gather` for concurrent phases."""
+        with self.phase(name):
+            return await awaitable
+
+    def mark_ready(self) -> None:
+        self.ready_at = time.perf_counter()
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "total_ms": round((self.ready_at - self.origin) * 1000, 1) if self.ready_at else None,
+            "phases": sorted(self.phases, key=lambda p: p["start_ms"]),
+        }
+
+    def print_report(self) -> None:
+        report = self.report()
+        print(f"Startup finished in {report['total_ms']} ms")
+        for p in report["phases"]:
+            status = f" (failed: {p['error']})" if p["error"] else ""
+            print(f"  {p['phase']:<24} +{p['start_ms']:>8} ms  {p['duration_ms']:>8} ms{status}")
+
+
+# Shared process-wide timer; main.py resets its origin to the start of its own imports
+startup_timer = StartupTimer()
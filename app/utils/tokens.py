@@ -0,0 +1,38 @@
+import functools
+from typing import Optional
+
+# Rough per-message overhead of the chat format (role, separators)
+MESSAGE_TOKEN_OVERHEAD = 4
+
+
+@functools.lru_cache(maxsize=8)
+def _get_encoding(model: str):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        # Encoding files could not be loaded (e.g. offline); cached so we don't retry per call
+        return None
+
+
+def count_tokens(text: Optional[str], model: str = "gpt-4o-mini") -> int:
+    """
+    Count tokens locally with tiktoken, falling back to ~4 characters per token
+    when tiktoken (or its encoding files) is unavailable.
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(content: Optional[str], model: str = "gpt-4o-mini") -> int:
+    return count_tokens(content, model) + MESSAGE_TOKEN_OVERHEAD
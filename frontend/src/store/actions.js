@@ -135,7 +135,11 @@ export default {
           "user-id": state?.auth?.user?._id || "1" || "", // Ensure it's never undefined
           Accept: "text/event-stream",
         },
-        body: JSON.stringify({ prompt: userPrompt, chat_id: chatId }),
+        body: JSON.stringify({
+          prompt: userPrompt,
+          chat_id: chatId,
+          stream_mode: "tokens",
+        }),
         credentials: "include",
         signal: signal,
       })